@@ -1,15 +1,26 @@
+from contextlib import contextmanager
+import operator
+import sys
+
 import numpy as np
 
+from GuruDiff.precision import get_dtype, resolve
+from GuruDiff.validation import domain
+
 class Var:
     """Forward mode variable"""
     
-    def __init__(self, a, da=None):
+    __slots__ = ("_val", "_der")
+    
+    def __init__(self, a, da=None, dtype=None):
         """Returns a forward mode variable.
         
         Parameters:
         ===========
         a (int, float, or array): Function value(s)
         da (int, float, array, or None): Derivative value(s); by default, set to None
+        dtype (np.float32, np.float64, or None): Floating point dtype; by 
+          default, set by the precision policy (see `GuruDiff.precision`)
         
         Attributes:
         ===========
@@ -20,6 +31,8 @@ class Var:
         ========
         Var: Forward mode variable
         """
+        dtype = resolve(dtype)
+        
         # Set function value(s)
         self._val = np.asarray(a)
         
@@ -44,23 +57,52 @@ class Var:
                     jac.append(np.zeros(n))
             
             # Reset attributes
-            self._val = np.asarray(vals).astype(float).flatten()
-            self._der = np.asarray(jac).astype(float)
+            self._val = np.asarray(vals).astype(dtype).flatten()
+            self._der = np.asarray(jac).astype(dtype) if _grad else None
             
         else:
-            self._val = self._val.astype(float)
+            self._val = self._val.astype(dtype)
             
             # Set derivative value if none specified by the user
-            if da is None:
+            if not _grad:
+                self._der = None
+            elif da is None:
                 if n == 1:
-                    self._der = np.asarray(1.)
+                    self._der = np.asarray(1., dtype=dtype)
                 else:
-                    self._der = np.ones(n)
+                    self._der = np.ones(n, dtype=dtype)
             else: 
-                self._der = np.asarray(da).astype(float)
+                self._der = np.asarray(da).astype(dtype)
+    
+    @classmethod
+    def _make(cls, val, der):
+        """Returns a forward mode variable built directly from its attributes.
+        
+        Operators and elementary functions produce values and derivatives 
+        that are already float arrays, so they bypass the normalization done
+        by `__init__`. No copies are made: the new variable may share its 
+        buffers with the variables it was computed from.
+        
+        Parameters:
+        ===========
+        val (array): Function value(s)
+        der (array): Derivative value(s)
+        
+        Returns:
+        ========
+        Var: Forward mode variable
+        """
+        new = object.__new__(cls)
+        new._val = val
+        new._der = der
+        return new
                 
     def __repr__(self):
         """Returns relevant information about a forward mode variable."""
+        # Variables computed under `no_grad`
+        if self._der is None:
+            return f"Function value(s):\n{self._val}"
+        
         # Simple scalar variables
         if self._val.size == 1 and self._der.size == 1:
             return f"Function value:\n{self._val}\nDerivative value:\n{self._der}"
@@ -87,11 +129,61 @@ class Var:
     
     @val.setter
     def val(self, a):
-        self._val = a
+        self._val = np.asarray(a, dtype=self._val.dtype)
         
     @der.setter
     def der(self, da):
-        self._der = da
+        self._der = np.asarray(da, dtype=self._val.dtype)
+    
+    def __getitem__(self, index):
+        """Returns the entries of a forward mode variable selected by index.
+        
+        In vector mode the derivative holds one tangent per direction along an
+        extra leading axis, i.e. `der.shape == (n_dirs,) + val.shape`, so the
+        index is applied to the trailing axes of the derivative.
+        """
+        der = self._der
+        if der is None:
+            return self._make(self._val[index], None)
+        if np.ndim(der) > np.ndim(self._val):
+            if not isinstance(index, tuple):
+                index = (index,)
+            return self._make(self._val[index], der[(slice(None),) + index])
+        return self._make(self._val[index], der[index])
+    
+    def _aligned(self, other):
+        """Returns the derivatives of two forward mode variables with their 
+        direction axes aligned for broadcasting (see `_lift`)."""
+        n_self, n_other = self._val.ndim, other._val.ndim
+        if n_self == n_other:
+            return self._der, other._der
+        ndim = max(n_self, n_other)
+        return _lift(self._der, n_self, ndim), _lift(other._der, n_other, ndim)
+    
+    def _lifted(self, other):
+        """Returns a constant operand and the derivative of this variable with
+        its direction axis aligned for broadcasting against it."""
+        if type(other) is float or type(other) is int:
+            return other, self._der
+        other = np.asarray(other)
+        return other, _lift(self._der, self._val.ndim, other.ndim)
+    
+    def _chain(self, y, dy, d2=None):
+        """Returns the result of an elementary function applied to this 
+        variable.
+        
+        Parameters:
+        ===========
+        y (array): Function value(s) at self.val
+        dy (array): First derivative value(s) at self.val
+        d2 (callable): Second derivative as a function of (val, y, dy); only 
+          used by second order variables
+        
+        Returns:
+        ========
+        Var: Forward mode variable
+        """
+        return self._make(y, dy*self._der)
     
     # ====================
     # Operator overloading
@@ -102,7 +194,9 @@ class Var:
         The negative of a forward mode variable is defined as a new forward mode
         variable with the input's attributes multiplied by a negative. 
         """
-        return Var(-self._val, -self._der)
+        if not _grad:
+            return self._make(-self._val, None)
+        return self._make(-self._val, -self._der)
     
     def __add__(self, other):
         """Returns the sum of two forward mode variables.
@@ -110,12 +204,15 @@ class Var:
         The sum of two forward mode variables is defined as a new forward mode 
         variable whose attributes are the sum of the input attributes.
         """
-        try:
-            return Var(self._val + other._val, self._der + other._der)
+        if not _grad:
+            return self._make(self._val + _value(other), None)
+        if isinstance(other, Var):
+            der, other_der = self._aligned(other)
+            return self._make(self._val + other._val, der + other_der)
         
         # Handles cases where other is not an instance of Var.
-        except AttributeError:
-            return Var(self._val + other, self._der)
+        other, der = self._lifted(other)
+        return self._make(self._val + other, der)
         
     def __radd__(self, other):
         """Returns the sum of two forward mode variables."""
@@ -128,11 +225,22 @@ class Var:
         forward mode variable whose attributes are the difference of the input
         attributes.
         """
-        return self.__add__(-other)
+        if not _grad:
+            return self._make(self._val - _value(other), None)
+        if isinstance(other, Var):
+            der, other_der = self._aligned(other)
+            return self._make(self._val - other._val, der - other_der)
+        
+        # Handles cases where other is not an instance of Var.
+        other, der = self._lifted(other)
+        return self._make(self._val - other, der)
     
     def __rsub__(self, other):
         """Returns the difference between two forward mode variables."""
-        return -self.__sub__(other)
+        if not _grad:
+            return self._make(other - self._val, None)
+        other, der = self._lifted(other)
+        return self._make(other - self._val, -der)
     
     def __mul__(self, other):
         """Returns the product of two forward mode variables.
@@ -142,12 +250,15 @@ class Var:
         and whose derivative value is calculated according to the product rule 
         of differentiation.
         """
-        try:
-            return Var(self._val*other._val, self._val*other._der + self._der*other._val)
+        if not _grad:
+            return self._make(self._val*_value(other), None)
+        if isinstance(other, Var):
+            der, other_der = self._aligned(other)
+            return self._make(self._val*other._val, self._val*other_der + der*other._val)
         
         # Handles cases where other is not an instance of Var.
-        except AttributeError:
-            return Var(other*self._val, other*self._der)
+        other, der = self._lifted(other)
+        return self._make(other*self._val, other*der)
     
     def __rmul__(self, other):
         """Returns the product of two forward mode variables."""
@@ -161,28 +272,171 @@ class Var:
         and whose derivative value is calculated according to the quotient rule 
         of differentiation.
         """
-        try: 
-            return Var(self._val/other._val, (self._der*other._val - self._val*other._der)/other._val**2)
+        if not _grad:
+            return self._make(self._val/_value(other), None)
+        if isinstance(other, Var):
+            der, other_der = self._aligned(other)
+            return self._make(self._val/other._val, (der*other._val - self._val*other_der)/other._val**2)
         
         # Handles cases where other is not an instance of Var.
-        except AttributeError:
-            return Var(self._val/other, self._der/other)
+        other, der = self._lifted(other)
+        return self._make(self._val/other, der/other)
             
     def __rtruediv__(self, other):
         """Returns the quotient of two forward mode variables."""
-        try: 
-            return Var(other._val/self._val, (other._der*self._val - other._val*self._der)/self._val**2)
-        
-        # Handles cases where other is not an instance of Var.
-        except AttributeError:
-            return Var(other/self._val, -other*self._der/self._val**2)
+        # Only reached when other is not an instance of Var.
+        if not _grad:
+            return self._make(other/self._val, None)
+        other, der = self._lifted(other)
+        return self._make(other/self._val, -other*der/self._val**2)
     
     def __pow__(self, p):
         """Returns a new forward mode variable raised to some power, p."""
-        try:
+        if not _grad:
+            return self._make(self._val ** _value(p), None)
+        if isinstance(p, Var):
             return Var([self._val**p._val], [p._val*self._val**(p._val-1) * self._der, np.log(self._val) * self._val ** p._val * p._der])
-        except AttributeError:
-            return Var(self._val ** p, p * self._val ** (p - 1) * self._der)
+        p, der = self._lifted(p)
+        return self._make(self._val ** p, p * self._val ** (p - 1) * der)
+
+    def __rpow__(self, base):
+        """Returns a constant base (scalar or array) raised to the power of a
+        forward mode variable."""
+        return exp(self, base)
+
+    # ====================
+    # NumPy protocols
+    # ====================
+    
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Applies a NumPy ufunc to forward mode variables.
+        
+        The supported ufuncs (see `_UFUNCS`) route to the elementary functions
+        and operators of this module, e.g. np.sin(x) returns sin(x) and 
+        array * x returns x.__rmul__(array). Other ufuncs, ufunc methods such
+        as reduce, and keywords such as out return NotImplemented, so NumPy 
+        raises a TypeError instead of building an object array.
+        """
+        rule = _UFUNCS.get(ufunc)
+        if rule is None or method != "__call__" or kwargs:
+            return NotImplemented
+        return rule(*inputs)
+    
+    def __array_function__(self, func, types, args, kwargs):
+        """Applies a NumPy function to forward mode variables.
+        
+        The supported functions (see `_ARRAY_FUNCTIONS`) propagate the 
+        derivatives with vectorized NumPy calls; others return NotImplemented,
+        so NumPy raises a TypeError.
+        """
+        rule = _ARRAY_FUNCTIONS.get(func)
+        if rule is None:
+            return NotImplemented
+        return rule(*args, **kwargs)
+
+    # ====================
+    # In-place operators
+    # ====================
+
+    # The in-place operators update the value and derivative buffers of this
+    # variable directly when no other object can observe them, i.e. when both
+    # are writeable float arrays that own their memory and are referenced by
+    # this variable only, and the variable itself is bound to a single name
+    # (so that `b = a; a += 1` leaves b unchanged). Otherwise (e.g. buffers shared with the variables
+    # they were computed from, views, read-only or broadcast arrays, NumPy
+    # scalars, results of a larger shape) they fall back to the binary
+    # operator, so the first update of a shared variable copies and the
+    # following ones are done in place.
+
+    def _updatable(self, der=True):
+        """Returns whether the buffers of this variable can be written in
+        place (the derivative buffer is only checked if `der` is True)."""
+        if _refcount(self) > _OWNED_SELF_REFS:
+            return False
+        if _refcount(self._val) > _OWNED_REFS or not _owns(self._val):
+            return False
+        return not der or (_refcount(self._der) <= _OWNED_REFS and _owns(self._der))
+
+    def _absorbs(self, shape, der=None, other_der=None):
+        """Returns whether combining this variable with an operand of the 
+        given shape (and, if given, their aligned derivatives) keeps the 
+        shapes of its buffers."""
+        own = self._val.shape
+        if shape != own and _broadcast_shape(own, shape) != own:
+            return False
+        return (der is None or der.shape == other_der.shape
+                or _broadcast_shape(der.shape, other_der.shape) == der.shape)
+
+    def _arrays(self):
+        """Returns this variable with NumPy scalar buffers replaced by arrays
+        of their own, so that it can be updated in place afterwards."""
+        if isinstance(self._val, np.generic):
+            self._val = np.array(self._val)
+        if isinstance(self._der, np.generic):
+            self._der = np.array(self._der)
+        return self
+
+    def __iadd__(self, other):
+        """Adds other to this forward mode variable in place."""
+        if isinstance(other, Var):
+            if other is not self and self._updatable():
+                der, other_der = self._aligned(other)
+                if self._absorbs(other._val.shape, der, other_der):
+                    np.add(self._val, other._val, out=self._val)
+                    np.add(der, other_der, out=der)
+                    return self
+        elif self._updatable(der=False) and self._absorbs(np.shape(other)):
+            np.add(self._val, other, out=self._val)
+            return self
+        return self.__add__(other)._arrays()
+
+    def __isub__(self, other):
+        """Subtracts other from this forward mode variable in place."""
+        if isinstance(other, Var):
+            if other is not self and self._updatable():
+                der, other_der = self._aligned(other)
+                if self._absorbs(other._val.shape, der, other_der):
+                    np.subtract(self._val, other._val, out=self._val)
+                    np.subtract(der, other_der, out=der)
+                    return self
+        elif self._updatable(der=False) and self._absorbs(np.shape(other)):
+            np.subtract(self._val, other, out=self._val)
+            return self
+        return self.__sub__(other)._arrays()
+
+    def __imul__(self, other):
+        """Multiplies this forward mode variable by other in place."""
+        if isinstance(other, Var):
+            if other is not self and self._updatable():
+                der, other_der = self._aligned(other)
+                if self._absorbs(other._val.shape, der, other_der):
+                    # Product rule, using the value before it is updated
+                    np.multiply(der, other._val, out=der)
+                    der += self._val*other_der
+                    np.multiply(self._val, other._val, out=self._val)
+                    return self
+        elif self._updatable() and self._absorbs(np.shape(other)):
+            np.multiply(self._val, other, out=self._val)
+            np.multiply(self._der, other, out=self._der)
+            return self
+        return self.__mul__(other)._arrays()
+
+    def __itruediv__(self, other):
+        """Divides this forward mode variable by other in place."""
+        if isinstance(other, Var):
+            if other is not self and self._updatable():
+                der, other_der = self._aligned(other)
+                if self._absorbs(other._val.shape, der, other_der):
+                    # Quotient rule, written as (der - (val/other)*other_der)/other
+                    np.divide(self._val, other._val, out=self._val)
+                    der -= self._val*other_der
+                    np.divide(der, other._val, out=der)
+                    return self
+        elif self._updatable() and self._absorbs(np.shape(other)):
+            np.divide(self._val, other, out=self._val)
+            np.divide(self._der, other, out=self._der)
+            return self
+        return self.__truediv__(other)._arrays()
 
     # ====================
     # Comparison operators
@@ -209,6 +463,447 @@ class Var:
         """Checks that two forward mode variables are not equal."""
         return not self.__eq__(other)
 
+# Exponents for which ndarray.__pow__ calls a faster ufunc than np.power
+_POWERS = {2: np.square, 0.5: np.sqrt, -1: np.reciprocal, 1: np.positive}
+
+def _refcount(a):
+    """Returns the reference count of a, as seen from a method reading it
+    off a variable."""
+    return sys.getrefcount(a)
+
+def _owns(a):
+    """Returns whether a is a writeable float array owning its memory."""
+    return type(a) is np.ndarray and a.base is None and a.dtype.kind == "f" and a.flags.writeable
+
+def _broadcast_shape(*shapes):
+    """Returns the shape that arrays of the given shapes broadcast to, 
+    without allocating them (np.broadcast_shapes needs NumPy 1.20)."""
+    return np.broadcast(*[np.broadcast_to(0., shape) for shape in shapes]).shape
+
+class _Probe(Var):
+    """Variable recording the reference count of itself seen by 
+    `Var._updatable`, and never computing anything."""
+    def _updatable(self, der=True):
+        _Probe.refs = _refcount(self)
+        return False
+
+    def __add__(self, other):
+        return self
+
+def _self_refs():
+    """Returns the reference count of a variable bound to a single local 
+    name, as seen by `Var._updatable` during an in-place operator."""
+    probe = _Probe._make(np.zeros(1), None)
+    probe += 0.0
+    return _Probe.refs
+
+# Number of references to a buffer held by a single variable, and to a 
+# variable bound to a single name, measured on probes so that the in-place
+# operators do not depend on interpreter details.
+_probe = Var._make(np.zeros(1), None)
+_OWNED_REFS = _refcount(_probe._val)
+_OWNED_SELF_REFS = _self_refs()
+del _probe
+
+class VarArray(Var):
+    """Vector of forward mode variables stored as a structure of arrays
+    
+    A VarArray holds m function values and their derivatives with respect to
+    n inputs in two arrays, instead of m separate Var objects. The 
+    derivatives are stored in the vector mode layout, of shape (n, m), so 
+    every operator and elementary function applies to all m entries at once; 
+    the Jacobian of shape (m, n) is available as `jac`.
+    
+    Operations mixing a VarArray with a Var return a VarArray, and indexing
+    a single entry returns a Var.
+    """
+    
+    __slots__ = ()
+    
+    def __init__(self, a, jac=None, dtype=None):
+        """Returns a vector of forward mode variables.
+        
+        Parameters:
+        ===========
+        a (array): Function values, of shape (m,)
+        jac (array or None): Jacobian, of shape (m, n); by default, the 
+          identity, i.e. the entries of a are the independent inputs
+        dtype (np.float32, np.float64, or None): Floating point dtype; by 
+          default, set by the precision policy
+        
+        Returns:
+        ========
+        VarArray: Vector of forward mode variables
+        """
+        dtype = resolve(dtype)
+        self._val = np.array(a, dtype=dtype)
+        if not _grad:
+            self._der = None
+        elif jac is None:
+            self._der = np.eye(self._val.size, dtype=dtype).reshape((self._val.size,) + self._val.shape)
+        else:
+            self._der = np.ascontiguousarray(np.moveaxis(np.asarray(jac, dtype=dtype), -1, 0))
+    
+    def __repr__(self):
+        """Returns the values and the Jacobian of a VarArray."""
+        if self._der is None:
+            return Var.__repr__(self)
+        return f"Function values:\n{self._val}\nJacobian:\n{self.jac}"
+    
+    @property
+    def jac(self):
+        """Jacobian, of shape val.shape + (n,)."""
+        return np.moveaxis(self._der, 0, -1)
+    
+    @property
+    def shape(self):
+        return self._val.shape
+    
+    def __len__(self):
+        return len(self._val)
+    
+    def __getitem__(self, index):
+        """Returns the entries selected by index, as a Var for a single entry
+        and as a VarArray otherwise."""
+        if not isinstance(index, tuple):
+            index = (index,)
+        val = self._val[index]
+        der = None if self._der is None else self._der[(slice(None),) + index]
+        if np.ndim(val) == 0:
+            return Var._make(val, der)
+        return self._make(val, der)
+    
+    @classmethod
+    def stack(cls, items, n=None):
+        """Returns a VarArray holding a sequence of variables and constants.
+        
+        Parameters:
+        ===========
+        items (list or tuple): Forward mode variables in vector mode, with 
+          derivatives of shape (n,), and constants
+        n (int or None): Number of inputs; by default, taken from the first
+          variable in items
+        
+        Returns:
+        ========
+        VarArray: Values and derivatives of items, with zero derivatives 
+          for the constants
+        """
+        if not _grad:
+            dtype = next((item._val.dtype for item in items if isinstance(item, Var)), get_dtype())
+            return cls._make(np.array([_value(item) for item in items], dtype=dtype), None)
+        if n is None:
+            n = next((np.shape(item._der)[0] for item in items if isinstance(item, Var)), 0)
+        val, der = _collect(list(items), n)
+        return cls._make(val, der)
+    
+    @classmethod
+    def concatenate(cls, arrays):
+        """Returns the concatenation of VarArrays along their first axis.
+        
+        Parameters:
+        ===========
+        arrays (list or tuple): VarArrays with derivatives with respect to 
+          the same n inputs
+        
+        Returns:
+        ========
+        VarArray: Concatenated values and derivatives
+        """
+        val = np.concatenate([a._val for a in arrays])
+        if not _grad:
+            return cls._make(val, None)
+        return cls._make(val, np.concatenate([a._der for a in arrays], axis=1))
+    
+    def _promoted(self, result):
+        """Returns the result of an operation with a Var as a VarArray."""
+        return self._make(result._val, result._der)
+    
+    # Reflected operators are redefined so that Python calls them before the
+    # Var operators of a left operand, which would return a plain Var.
+    def __radd__(self, other):
+        return self.__add__(other)
+    
+    def __rsub__(self, other):
+        if isinstance(other, Var):
+            return self._promoted(Var.__sub__(other, self))
+        return Var.__rsub__(self, other)
+    
+    def __rmul__(self, other):
+        return self.__mul__(other)
+    
+    def __rtruediv__(self, other):
+        if isinstance(other, Var):
+            return self._promoted(Var.__truediv__(other, self))
+        return Var.__rtruediv__(self, other)
+
+class HyperDual:
+    """Second order forward mode variable
+    
+    A hyper-dual variable propagates, along with its value(s), two blocks of 
+    first derivatives and the block of their mixed second derivatives:
+    
+    - der: derivatives along n directions, of shape (n,) + val.shape
+    - tan: derivatives along k directions, of shape (k,) + val.shape
+    - hes: mixed second derivatives, of shape (n, k) + val.shape
+    
+    Seeding both blocks with the identity yields the gradient and the full 
+    Hessian in one pass (see `hessian`); seeding `tan` with a single 
+    direction v yields the Hessian-vector product H v (see `hvp`). When both 
+    blocks are the same array, it is propagated only once.
+    """
+    
+    __slots__ = ("_val", "_der", "_tan", "_hes")
+    
+    # NumPy ufuncs route to the elementary functions, as for Var
+    __array_ufunc__ = Var.__array_ufunc__
+    
+    def __init__(self, a, da=None, dt=None, dtype=None):
+        """Returns a second order forward mode variable.
+        
+        Parameters:
+        ===========
+        a (int, float, or array): Function value(s)
+        da (array or None): First block of seed directions, of shape 
+          (n,) + val.shape, or val.shape for a single direction; by default, 
+          a single direction of ones
+        dt (array or None): Second block of seed directions; by default, the
+          same as da
+        dtype (np.float32, np.float64, or None): Floating point dtype; by 
+          default, set by the precision policy
+        
+        Returns:
+        ========
+        HyperDual: Second order forward mode variable
+        """
+        self._val = np.asarray(a, dtype=resolve(dtype))
+        self._der = self._seed(da)
+        self._tan = self._der if dt is None else self._seed(dt)
+        self._hes = np.zeros(self._der.shape[:1] + self._tan.shape, dtype=self._val.dtype)
+    
+    def _seed(self, d):
+        """Returns a block of seed directions for this variable."""
+        if d is None:
+            return np.ones((1,) + self._val.shape, dtype=self._val.dtype)
+        d = np.asarray(d, dtype=self._val.dtype)
+        return d[np.newaxis] if d.ndim == self._val.ndim else d
+    
+    @classmethod
+    def _make(cls, val, der, tan, hes):
+        """Returns a second order variable built directly from its blocks 
+        (see `Var._make`)."""
+        new = object.__new__(cls)
+        new._val = val
+        new._der = der
+        new._tan = tan
+        new._hes = hes
+        return new
+    
+    def __repr__(self):
+        """Returns relevant information about a second order variable."""
+        return f"Function value(s):\n{self._val}\nGradient:\n{self._der}\nHessian:\n{self._hes}"
+    
+    @property
+    def val(self):
+        return self._val
+    
+    @property
+    def der(self):
+        return self._der
+    
+    @property
+    def tan(self):
+        return self._tan
+    
+    @property
+    def hes(self):
+        return self._hes
+    
+    def __getitem__(self, index):
+        """Returns the entries of a second order variable selected by index."""
+        if not isinstance(index, tuple):
+            index = (index,)
+        one, two = (slice(None),) + index, (slice(None), slice(None)) + index
+        der = self._der[one]
+        tan = der if self._tan is self._der else self._tan[one]
+        return self._make(self._val[index], der, tan, self._hes[two])
+    
+    def _blocks(self, ndim):
+        """Returns the derivative blocks aligned with a result of `ndim` value
+        axes (see `_lift`)."""
+        n = self._val.ndim
+        if n == ndim:
+            return self._der, self._tan, self._hes
+        der = _lift(self._der, n, ndim)
+        tan = der if self._tan is self._der else _lift(self._tan, n, ndim)
+        return der, tan, _lift(self._hes, n, ndim)
+    
+    def _chain(self, y, dy, d2):
+        """Returns the result of an elementary function applied to this 
+        variable (see `Var._chain`)."""
+        der = dy*self._der
+        if self._tan is self._der:
+            tan = der
+            outer = self._der[:, np.newaxis]*self._der[np.newaxis]
+        else:
+            tan = dy*self._tan
+            outer = self._der[:, np.newaxis]*self._tan[np.newaxis]
+        return self._make(y, der, tan, dy*self._hes + d2(self._val, y, dy)*outer)
+    
+    def _scale(self, val, c):
+        """Returns a variable with value(s) `val` and all derivative blocks 
+        of this variable multiplied by the constant c."""
+        der = c*self._der
+        tan = der if self._tan is self._der else c*self._tan
+        return self._make(val, der, tan, c*self._hes)
+    
+    # ====================
+    # Operator overloading
+    # ====================
+    def __neg__(self):
+        """Returns the negative of a second order variable."""
+        return self._scale(-self._val, -1.)
+    
+    def __add__(self, other):
+        """Returns the sum of two second order variables."""
+        if isinstance(other, HyperDual):
+            ndim = max(self._val.ndim, other._val.ndim)
+            der, tan, hes = self._blocks(ndim)
+            o_der, o_tan, o_hes = other._blocks(ndim)
+            der_sum = der + o_der
+            tan_sum = der_sum if tan is der and o_tan is o_der else tan + o_tan
+            return self._make(self._val + other._val, der_sum, tan_sum, hes + o_hes)
+        other = np.asarray(other)
+        val = self._val + other
+        der, tan, hes = self._blocks(val.ndim)
+        return self._make(val, der, tan, hes)
+    
+    def __radd__(self, other):
+        """Returns the sum of two second order variables."""
+        return self.__add__(other)
+    
+    def __sub__(self, other):
+        """Returns the difference between two second order variables."""
+        if isinstance(other, HyperDual):
+            return self.__add__(-other)
+        return self.__add__(-np.asarray(other, dtype=self._val.dtype))
+    
+    def __rsub__(self, other):
+        """Returns the difference between two second order variables."""
+        return (-self).__add__(other)
+    
+    def __mul__(self, other):
+        """Returns the product of two second order variables.
+        
+        The mixed second derivatives follow the product rule 
+        (uv)'' = u v'' + v u'' + u' v'^T + v' u'^T.
+        """
+        if isinstance(other, HyperDual):
+            u, v = self._val, other._val
+            ndim = max(u.ndim, v.ndim)
+            du, tu, hu = self._blocks(ndim)
+            dv, tv, hv = other._blocks(ndim)
+            der = u*dv + v*du
+            tan = der if tu is du and tv is dv else u*tv + v*tu
+            hes = u*hv + v*hu + du[:, np.newaxis]*tv[np.newaxis] + dv[:, np.newaxis]*tu[np.newaxis]
+            return self._make(u*v, der, tan, hes)
+        other = np.asarray(other)
+        val = self._val*other
+        der, tan, hes = self._blocks(val.ndim)
+        return HyperDual._make(self._val, der, tan, hes)._scale(val, other)
+    
+    def __rmul__(self, other):
+        """Returns the product of two second order variables."""
+        return self.__mul__(other)
+    
+    def _reciprocal(self):
+        """Returns 1/self."""
+        r = 1/self._val
+        return self._chain(r, -r**2, lambda v, y, dy: 2*y**3)
+    
+    def __truediv__(self, other):
+        """Returns the quotient of two second order variables."""
+        if isinstance(other, HyperDual):
+            return self.__mul__(other._reciprocal())
+        return self.__mul__(1/np.asarray(other, dtype=self._val.dtype))
+    
+    def __rtruediv__(self, other):
+        """Returns the quotient of two second order variables."""
+        return self._reciprocal().__mul__(other)
+    
+    def __pow__(self, p):
+        """Returns a second order variable raised to a constant power, p."""
+        if isinstance(p, HyperDual):
+            return exp(p*log(self))
+        v = self._val
+        return self._chain(v**p, p*v**(p - 1), lambda v, y, dy: p*(p - 1)*v**(p - 2))
+
+    def __rpow__(self, base):
+        """Returns a constant base (scalar or array) raised to the power of a
+        second order variable."""
+        return exp(self, base)
+
+# ===============
+# Rounding policy
+# ===============
+# Elementary functions snap results that are within a tolerance of an integer
+# (see `check_tol`). The policy controls when this happens:
+#   - "on": after every elementary function call (default)
+#   - "off": never
+#   - "final-only": only when `round_output` is called on a result
+
+ROUNDING_MODES = ("on", "off", "final-only")
+
+_rounding = "on"
+
+def get_rounding():
+    """Returns the current rounding policy."""
+    return _rounding
+
+def set_rounding(mode):
+    """Sets the rounding policy used by the elementary functions.
+    
+    Parameters:
+    ===========
+    - mode (str): One of "on", "off" or "final-only"
+    
+    Returns:
+    ========
+    - (str): The previous rounding policy
+    """
+    global _rounding
+    if mode not in ROUNDING_MODES:
+        raise ValueError(f"rounding mode should be one of {ROUNDING_MODES}")
+    previous, _rounding = _rounding, mode
+    return previous
+
+@contextmanager
+def rounding(mode):
+    """Context manager that temporarily sets the rounding policy.
+    
+    Example:
+    ========
+    >>> with rounding("off"):
+    ...     y = sin(Var(np.pi))
+    """
+    previous = set_rounding(mode)
+    try:
+        yield
+    finally:
+        set_rounding(previous)
+
+def _snap(a, tol):
+    """Returns a copy of `a` with entries within `tol` of an integer rounded."""
+    if a is None:
+        return a
+    if isinstance(a, SparseTangent):
+        return a._with(_snap(a._vals, tol))
+    rounded = np.rint(a)
+    mask = np.abs(a - rounded) < tol
+    if np.ndim(mask) == 0:
+        return rounded if mask else a
+    return np.where(mask, rounded, a)
+
 def check_tol(x, tol=1e-8):
     """Returns rounded function and/or derivative values.
     
@@ -223,41 +918,132 @@ def check_tol(x, tol=1e-8):
     
     Parameters:
     ===========
-    - x (Var): Scalar forward mode variable
+    - x (Var): Forward mode variable
     
     Returns:
     ========
-    - x (Var): Updated scalar forward mode variable, if the difference 
-      between the actual value and the rounded value of the attributes is less 
-      than some tolerance; otherwise, the input is returned
+    - x (Var): Updated forward mode variable, if the difference between the 
+      actual value and the rounded value of the attributes is less than some 
+      tolerance; otherwise, the input is returned
     """
+    x._val = _snap(x._val, tol)
+    if isinstance(x, HyperDual):
+        symmetric = x._tan is x._der
+        x._hes = _snap(x._hes, tol)
+        x._tan = x._der if symmetric else _snap(x._tan, tol)
+    x._der = _snap(x._der, tol)
+    if isinstance(x, HyperDual) and symmetric:
+        x._tan = x._der
+    return x
+
+def _round(x):
+    """Applies `check_tol` to the result of an elementary function if the 
+    rounding policy is "on"."""
+    if _rounding == "on":
+        return check_tol(x)
+    return x
+
+def round_output(x, tol=1e-8):
+    """Rounds a final result according to the rounding policy.
     
-    # Check function value(s)
-    try:
-        if abs(x._val - np.round(x._val)) < tol:
-            x._val = np.round(x._val)
-    
-    except ValueError:
-        with np.nditer(x._val, op_flags=["readwrite"]) as it:
-            for entry in it:
-                if abs(entry - np.round(entry)) < tol:
-                    entry[...] = np.round(entry)
-            
-    # Check derivative value(s)
+    Under the "on" and "final-only" policies `check_tol` is applied to `x`; 
+    under the "off" policy `x` is returned unchanged.
+    
+    Parameters:
+    ===========
+    - x (Var): Forward mode variable
+    - tol (float): Rounding tolerance
+    
+    Returns:
+    ========
+    - x (Var): Rounded forward mode variable
+    """
+    if _rounding == "off":
+        return x
+    return check_tol(x, tol)
+
+# ======================
+# Value-only evaluation
+# ======================
+# Under `no_grad`, forward mode variables carry no derivatives (their `der`
+# is None): constructors skip the seeds, and operators and elementary 
+# functions compute function values only, so code written for derivatives 
+# can be evaluated at roughly the cost of plain NumPy (e.g. in line searches).
+# Second order (HyperDual) variables are not affected.
+
+_grad = True
+
+def is_grad_enabled():
+    """Returns whether forward mode variables propagate derivatives."""
+    return _grad
+
+def set_grad_enabled(enabled):
+    """Sets whether forward mode variables propagate derivatives.
+    
+    Parameters:
+    ===========
+    - enabled (bool): False to compute function values only
+    
+    Returns:
+    ========
+    - (bool): The previous setting
+    """
+    global _grad
+    previous, _grad = _grad, bool(enabled)
+    return previous
+
+@contextmanager
+def no_grad():
+    """Context manager under which forward mode variables compute function
+    values only. Derivative drivers (e.g. `jacobian`) should not be called
+    inside it.
+    
+    Example:
+    ========
+    >>> with no_grad():
+    ...     y = f(Var(x))    # y.der is None
+    """
+    previous = set_grad_enabled(False)
     try:
-        if abs(x._der - np.round(x._der)) < tol:
-            x._der = np.round(x._der)
-        
-    except ValueError:
-        with np.nditer(x._der, op_flags=["readwrite"]) as it:
-            for entry in it:
-                if abs(entry - np.round(entry)) < tol:
-                    entry[...] = np.round(entry)
-                
-    return x
+        yield
+    finally:
+        set_grad_enabled(previous)
 
 # Trigonometric functions
 # =======================
+# Each elementary function evaluates its first derivative and passes it to 
+# the `_chain` method of its argument, together with a function returning the 
+# second derivative, which is only called for second order (HyperDual) 
+# variables.
+# Functions defined on part of the real line check their arguments according 
+# to the domain validation policy (see `GuruDiff.validation`).
+
+def _d2_sin(v, y, dy):
+    return -y
+
+def _d2_tan(v, y, dy):
+    return 2*y*dy
+
+def _d2_arcsin(v, y, dy):
+    return v*dy**3
+
+def _d2_arctan(v, y, dy):
+    return -2*v*dy**2
+
+def _d2_exp(v, y, dy):
+    return y
+
+def _d2_log(v, y, dy):
+    return -dy/v
+
+def _d2_sqrt(v, y, dy):
+    return -dy/(2*v)
+
+def _d2_tanh(v, y, dy):
+    return -2*y*dy
+
+def _d2_logistic(v, y, dy):
+    return dy*(1 - 2*y)
 
 def sin(x):
     """Returns the sine of a forward mode variable and its derivative.
@@ -271,7 +1057,10 @@ def sin(x):
     - (Var): Sine value and the corresponding derivative value; `check_tol`
       is called to remove rounding errors
     """
-    return check_tol(Var(np.sin(x._val), np.cos(x._val)*x._der))
+    v = x._val
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(np.sin(v), None))
+    return _round(x._chain(np.sin(v), np.cos(v), _d2_sin))
 
 def cos(x):
     """Returns the cosine of a forward mode variable and its derivative.
@@ -285,7 +1074,10 @@ def cos(x):
     - (Var): Cosine value and the corresponding derivative value; 
       `check_tol` is called to remove rounding errors
     """
-    return check_tol(Var(np.cos(x._val), -np.sin(x._val)*x._der))
+    v = x._val
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(np.cos(v), None))
+    return _round(x._chain(np.cos(v), -np.sin(v), _d2_sin))
     
 def tan(x):
     """Returns the tangent of a forward mode variable and its derivative.
@@ -299,34 +1091,40 @@ def tan(x):
     - (Var): Tangent value and the corresponding derivative value; 
       `check_tol` is called to remove rounding errors
     """
-    if (type(x._val) is float or type(x._val) is int and np.abs(x._val - np.pi/2) > 10e-8) or np.abs(x._val - np.pi/2).all() > 10e-8:
-        return check_tol(Var(np.tan(x._val), np.cos(x._val)**(-2)*x._der))
-    else:
-        raise ValueError("Cannot divide by zero")
+    v = domain(x._val, lambda v: np.abs(np.cos(v)) > 1e-8, "Cannot divide by zero")
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(np.tan(v), None))
+    return _round(x._chain(np.tan(v), np.cos(v)**(-2), _d2_tan))
 
 # Inverse trigonometric functions
 # ===============================
+
+def _in_unit_interval(v):
+    return (v > -1) & (v < 1)
+
+def _in_half_period(v):
+    return np.abs(v) < np.pi/2
      
 def arcsin(x):
     """Returns the inverse sine of a forward mode variable."""
-    if ((x._val - 1) < 0).all() and ((x._val + 1) >0).all():
-        return check_tol(Var(np.arcsin(x._val), x._der/np.sqrt(1-x._val**2)))
-    else:
-        raise ValueError("x should be in (-1, 1) for arcsin")
+    v = domain(x._val, _in_unit_interval, "x should be in (-1, 1) for arcsin")
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(np.arcsin(v), None))
+    return _round(x._chain(np.arcsin(v), 1/np.sqrt(1-v**2), _d2_arcsin))
         
 def arccos(x):
     """Returns the inverse cosine of a forward mode variable."""
-    if ((x._val - 1) < 0).all() and ((x._val + 1) > 0).all():
-        return check_tol(Var(np.arccos(x._val), -x._der/np.sqrt(1-x._val**2)))
-    else:
-        raise ValueError("x should be in (-1, 1) for arccos")
+    v = domain(x._val, _in_unit_interval, "x should be in (-1, 1) for arccos")
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(np.arccos(v), None))
+    return _round(x._chain(np.arccos(v), -1/np.sqrt(1-v**2), _d2_arcsin))
         
 def arctan(x):
     """Returns the inverse tangent of a forward mode variable."""
-    if ((x._val - np.pi/2) < 0).all() and ((x._val + np.pi/2) > 0).all():
-        return check_tol(Var(np.arctan(x._val), x._der/(1+x._val**2)))
-    else:
-        raise ValueError("x should be in (-pi/2, pi/2) for arctan")
+    v = domain(x._val, _in_half_period, "x should be in (-pi/2, pi/2) for arctan")
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(np.arctan(v), None))
+    return _round(x._chain(np.arctan(v), 1/(1+v**2), _d2_arctan))
     
 # Exponentials
 # ============
@@ -345,14 +1143,39 @@ def exp(x, base=None):
     - (Var): Exponential value and the corresponding derivative value; 
       `check_tol` is called to remove rounding errors
     """
+    if not _grad and isinstance(x, Var):
+        return x._make(np.exp(x._val) if base is None else np.power(base, x._val), None)
     if base is None:
-        return Var(np.exp(x._val), np.exp(x._val)*x._der)
+        y = np.exp(x._val)
+        return x._chain(y, y, _d2_exp)
     else:
-        return Var(np.power(base, x._val), np.power(base, x._val)*np.log(base))
+        log_base = np.log(np.asarray(base, dtype=float))
+        if log_base.ndim:
+            # Broadcast x against an array base, so its derivatives are aligned
+            # with the result
+            shape = np.broadcast(x._val, log_base).shape
+            if shape != np.shape(x._val):
+                x = x + np.zeros(shape, dtype=np.result_type(x._val))
+        else:
+            log_base = float(log_base)
+        y = np.power(base, x._val)
+        return x._chain(y, y*log_base, lambda v, y, dy: dy*log_base)
 
 # Logarithms
 # ==========
  
+def _nonzero(v):
+    return v != 0
+
+def _positive(v):
+    return v > 0
+
+def _log_argument(v):
+    """Returns the argument of a real logarithm under the domain validation
+    policy; zeros and negative values are rejected with distinct messages."""
+    v = domain(v, _nonzero, "Cannot divide by zero")
+    return domain(v, _positive, "Cannot take the logarithm of a negative value")
+
 def log(x, base=None):
     """Returns the logarithm of a forward mode variable and its derivative.
     
@@ -365,13 +1188,14 @@ def log(x, base=None):
     - (Var): Logarithm value and the corresponding derivative value; 
       `check_tol` is called to remove rounding errors
     """
-    if (type(x._val) is float or type(x._val) is int and x._val != 0) or x._val.all():
-        if base is None:
-            return check_tol(Var(np.log(x._val), x._der/x._val))
-        else:
-            return check_tol(Var(np.log(x._val)/np.log(base), 1/(x._val*np.log(base))))
+    v = _log_argument(x._val)
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(np.log(v) if base is None else np.log(v)/float(np.log(base)), None))
+    if base is None:
+        return _round(x._chain(np.log(v), 1/v, _d2_log))
     else:
-        raise ValueError("Cannot divide by zero")
+        log_base = float(np.log(base))
+        return _round(x._chain(np.log(v)/log_base, 1/(v*log_base), _d2_log))
         
         
 # Hyperbolic functions
@@ -379,25 +1203,35 @@ def log(x, base=None):
 
 def sinh(x):
     """Returns the hyperbolic sine of a forward mode variable."""
-    return (exp(x) - exp(-x))/2
+    v = x._val
+    if not _grad and isinstance(x, Var):
+        return x._make(np.sinh(v), None)
+    return x._chain(np.sinh(v), np.cosh(v), _d2_exp)
     
 def cosh(x):
     """Returns the hyperbolic cosine of a forward mode variable."""
-    return (exp(x) + exp(-x))/2
+    v = x._val
+    if not _grad and isinstance(x, Var):
+        return x._make(np.cosh(v), None)
+    return x._chain(np.cosh(v), np.sinh(v), _d2_exp)
     
 def tanh(x):
     """Returns the hyperbolic tangent of a forward mode variable."""
-    return sinh(x)/cosh(x)
+    y = np.tanh(x._val)
+    if not _grad and isinstance(x, Var):
+        return x._make(y, None)
+    return x._chain(y, 1 - y**2, _d2_tanh)
     
 # Square root
 # ===========
 
 def sqrt(x):
     """Square root of a forward mode variable."""
-    if (x._val > 0).all():
-        return check_tol(Var(np.sqrt(x._val), x._der/(2*np.sqrt(x._val))))
-    else:
-        raise ValueError("The function value should be greater than zero.")
+    v = domain(x._val, lambda v: v > 0, "The function value should be greater than zero.")
+    y = np.sqrt(v)
+    if not _grad and isinstance(x, Var):
+        return _round(x._make(y, None))
+    return _round(x._chain(y, 1/(2*y), _d2_sqrt))
         
 # Logisitic function
 # =================
@@ -413,5 +1247,573 @@ def logistic(x):
     ========
     Var: Standard logistic function with x as the argument
     """
-    return 1/(1 + exp(-x))
+    # y' = a/(1 + a)^2 is even in v for a = exp(-|v|), which never overflows:
+    # y = 1/(1 + a) for v >= 0 and a/(1 + a) otherwise, with no warnings to
+    # silence and no reduction over all entries
+    v = x._val
+    a = np.exp(-np.abs(v))
+    r = 1/(1 + a)
+    y = np.where(v >= 0, r, a*r)[()]
+    if not _grad and isinstance(x, Var):
+        return x._make(y, None)
+    return x._chain(y, a*(r*r), _d2_logistic)
+
+
+# NumPy protocols
+# ===============
+# Forward mode variables implement `__array_ufunc__` and `__array_function__`,
+# so NumPy code can be differentiated as written: the ufuncs and functions 
+# below route to the elementary functions and operators of this module, and
+# derivatives in vector mode keep their leading direction axis.
+
+def _binary(op, reflected):
+    """Returns the rule of a binary ufunc: `op` if the first operand is a 
+    variable and the `reflected` method of the second one otherwise (applying
+    `op` to an array first would dispatch back to the ufunc)."""
+    def rule(a, b):
+        if isinstance(a, (Var, HyperDual)):
+            return op(a, b)
+        return getattr(b, reflected)(a)
+    return rule
+
+_UFUNCS = {
+    np.add: _binary(operator.add, "__radd__"),
+    np.subtract: _binary(operator.sub, "__rsub__"),
+    np.multiply: _binary(operator.mul, "__rmul__"),
+    np.true_divide: _binary(operator.truediv, "__rtruediv__"),
+    np.power: _binary(operator.pow, "__rpow__"),
+    np.negative: operator.neg,
+    np.square: lambda x: x*x,
+    np.reciprocal: lambda x: 1/x,
+    np.sqrt: sqrt,
+    np.exp: exp,
+    np.exp2: lambda x: exp(x, 2),
+    np.log: log,
+    np.log2: lambda x: log(x, 2),
+    np.log10: lambda x: log(x, 10),
+    np.sin: sin,
+    np.cos: cos,
+    np.tan: tan,
+    np.arcsin: arcsin,
+    np.arccos: arccos,
+    np.arctan: arctan,
+    np.sinh: sinh,
+    np.cosh: cosh,
+    np.tanh: tanh,
+}
+
+def _value(x):
+    """Returns the value(s) of a variable, or x itself if it is a constant."""
+    return x._val if isinstance(x, Var) else x
+
+def _directions(x):
+    """Returns the derivative of a variable with a leading direction axis, 
+    and whether it had one; derivatives of the scalar mode layout (same shape
+    as the value) get a singleton direction axis."""
+    der = x._der
+    if isinstance(der, SparseTangent):
+        der = der.todense()
+    if np.ndim(der) > x._val.ndim:
+        return der, True
+    return der[None], False
+
+def _sum(a, axis=None, keepdims=False):
+    """np.sum of a forward mode variable."""
+    val = a._val
+    if not _grad:
+        return a._make(val.sum(axis=axis, keepdims=keepdims), None)
+    der, lead = _directions(a)
+    if axis is None:
+        axis = tuple(range(val.ndim))
+    elif not isinstance(axis, tuple):
+        axis = (axis,)
+    axis = tuple(ax % val.ndim for ax in axis)
+    der = der.sum(axis=tuple(ax + 1 for ax in axis), keepdims=keepdims)
+    return a._make(val.sum(axis=axis, keepdims=keepdims), der if lead else der[0])
+
+def _mean(a, axis=None, keepdims=False):
+    """np.mean of a forward mode variable."""
+    total = _sum(a, axis, keepdims)
+    return total/(a._val.size//np.size(total._val))
+
+def _dot(a, b):
+    """np.dot of forward mode variables and constants."""
+    av = a._val if isinstance(a, Var) else np.asarray(a)
+    bv = b._val if isinstance(b, Var) else np.asarray(b)
+    if av.ndim == 0 or bv.ndim == 0:
+        return _UFUNCS[np.multiply](a, b)
+    cls = type(a) if isinstance(a, Var) else type(b)
+    if not _grad:
+        return cls._make(np.dot(av, bv), None)
+    der, lead = 0, False
+    if isinstance(a, Var):
+        da, lead = _directions(a)
+        der = np.dot(da, bv)
+    if isinstance(b, Var):
+        db, lead_b = _directions(b)
+        # Contract the last axis of av with the matching axis of each tangent
+        axis = 1 + max(bv.ndim - 2, 0)
+        der = der + np.moveaxis(np.tensordot(av, db, axes=(av.ndim - 1, axis)), av.ndim - 1, 0)
+        lead = lead or lead_b
+    return cls._make(np.dot(av, bv), der if lead else der[0])
+
+def _stack(arrays, axis=0):
+    """np.stack of forward mode variables and constants."""
+    arrays = list(arrays)
+    val = np.stack([_value(x) for x in arrays], axis)
+    cls = VarArray if any(isinstance(x, VarArray) for x in arrays) else Var
+    if not _grad:
+        return cls._make(val, None)
+    axis = axis % val.ndim
+    tangents = [_directions(x) if isinstance(x, Var) else None for x in arrays]
+    found = [t for t in tangents if t is not None]
+    shape = (max(der.shape[0] for der, _ in found),) + val.shape[:axis] + val.shape[axis+1:]
+    der = np.stack([np.zeros(shape, dtype=val.dtype) if t is None else np.broadcast_to(t[0], shape) 
+                    for t in tangents], axis + 1)
+    if any(lead for _, lead in found):
+        return cls._make(val, der)
+    return cls._make(val, der[0])
+
+_ARRAY_FUNCTIONS = {
+    np.sum: _sum,
+    np.mean: _mean,
+    np.dot: _dot,
+    np.stack: _stack,
+    np.shape: lambda a: np.shape(a._val),
+    np.ndim: lambda a: np.ndim(a._val),
+    np.size: lambda a: np.size(a._val),
+}
+        
+# Vector mode
+# ===========
+# A variable seeded with k directions carries a derivative of shape 
+# (k,) + val.shape. All operators and elementary functions broadcast the 
+# value against the leading direction axis, so every pass propagates the k 
+# tangents with the same NumPy calls as a single one.
+
+def _lift(der, val_ndim, ndim):
+    """Aligns a vector mode derivative with a result of higher rank.
+    
+    A variable whose value has `val_ndim` axes carries a vector mode 
+    derivative of shape (n_dirs,) + val.shape (or (n_dirs, n_dirs) + val.shape
+    for second derivatives). When it is combined with a value of `ndim` > 
+    `val_ndim` axes, singleton axes are inserted after the direction axes so 
+    the value axes, not the direction axes, broadcast against each other. 
+    Other derivatives are returned unchanged.
+    """
+    lead = der.ndim - val_ndim
+    if lead > 0 and ndim > val_ndim:
+        return der.reshape(der.shape[:lead] + (1,)*(ndim - val_ndim) + der.shape[lead:])
+    return der
+
+def _collect(out, n_dirs):
+    """Returns the value(s) and the (n_dirs, ...) tangent block of `out`.
+    
+    Parameters:
+    ===========
+    - out (Var, list, or tuple): Output of a user function; lists and tuples 
+      may mix forward mode variables and constants
+    - n_dirs (int): Number of seeded directions
+    
+    Returns:
+    ========
+    - (array, array): Function value(s) and tangents of shape 
+      (n_dirs,) + val.shape
+    """
+    if isinstance(out, Var):
+        val = np.asarray(out._val)
+        if isinstance(out._der, SparseTangent):
+            return val, out._der._broadcast(val.shape)
+        return val, np.broadcast_to(out._der, (n_dirs,) + val.shape)
+    if not isinstance(out, (list, tuple)):
+        val = np.asarray(out, dtype=get_dtype())
+        return val, np.zeros((n_dirs,) + val.shape, dtype=val.dtype)
+    
+    dtype = next((element._val.dtype for element in out if isinstance(element, Var)), get_dtype())
+    vals = np.broadcast_arrays(*[element._val if isinstance(element, Var) else np.asarray(element, dtype=dtype) 
+                                 for element in out])
+    if any(isinstance(element, Var) and isinstance(element._der, SparseTangent) for element in out):
+        return np.stack(vals), _stack_sparse(out, n_dirs, vals[0].shape, dtype)
+    shape = (n_dirs,) + vals[0].shape
+    ders = [np.broadcast_to(element._der, shape) if isinstance(element, Var) else np.zeros(shape, dtype=dtype) 
+            for element in out]
+    return np.stack(vals), np.stack(ders, axis=1)
+
+def _stack_sparse(out, n_dirs, shape, dtype):
+    """Returns the derivative blocks of the elements of `out`, some of which
+    are sparse, stacked along the first value axis."""
+    blocks = []
+    for element in out:
+        der = element._der if isinstance(element, Var) else None
+        if der is None:
+            der = SparseTangent(np.full((1,) + shape, n_dirs), np.zeros((1,) + shape, dtype=dtype), n_dirs)
+        elif not isinstance(der, SparseTangent):
+            return np.stack([np.broadcast_to(np.asarray(e._der) if isinstance(e, Var) else 0., (n_dirs,) + shape) 
+                             for e in out], axis=1)
+        blocks.append(der._broadcast(shape))
+    k = max(block._idx.shape[0] for block in blocks)
+    pad = lambda a, fill: np.concatenate([a, np.full((k - a.shape[0],) + shape, fill, dtype=a.dtype)])
+    return _compact(np.stack([pad(b._idx, n_dirs) for b in blocks], axis=1),
+                    np.stack([pad(b._vals, 0.) for b in blocks], axis=1), n_dirs)
+
+def _evaluate(f, x, seed):
+    """Evaluates `f` at a variable with value `x` and tangent block `seed`."""
+    return _collect(f(Var._make(x, seed)), seed.shape[0])
+
+def jvp(f, x, v):
+    """Returns the value of a function and its Jacobian-vector product(s).
+    
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable, indexed as 
+      x[0], x[1], ...; it returns a Var, or a list/tuple of Vars and 
+      constants for vector valued functions
+    - x (array): Point of shape (n,) at which f is evaluated
+    - v (array): Direction of shape (n,), or seed matrix of shape (n, k) 
+      whose columns are propagated together in a single pass
+    
+    Returns:
+    ========
+    - (array, array): Value of f at x and J v, of shape (m,) or (m, k) 
+    
+    Example:
+    ========
+    >>> f = lambda x: [x[0]*x[1], sin(x[0])]
+    >>> val, Jv = jvp(f, [1.0, 2.0], np.eye(2))
+    """
+    x = np.asarray(x, dtype=get_dtype())
+    v = np.asarray(v, dtype=get_dtype())
+    if v.ndim == x.ndim:
+        val, der = _evaluate(f, x, v[np.newaxis])
+        return val, der[0]
+    val, der = _evaluate(f, x, np.ascontiguousarray(np.moveaxis(v, -1, 0)))
+    return val, np.moveaxis(der, 0, -1)
+
+def jacobian(f, x, chunk_size=None):
+    """Returns the value and the Jacobian of a function.
+    
+    The columns of the Jacobian are computed `chunk_size` at a time, so the 
+    cost is n/chunk_size vectorized passes while the tangent block never holds
+    more than chunk_size directions.
+    
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see `jvp`)
+    - x (array): Point of shape (n,) at which f is evaluated
+    - chunk_size (int or None): Number of directions per pass; by default, 
+      all n directions are propagated in one pass
+    
+    Returns:
+    ========
+    - (array, array): Value of f at x, of shape (m,), and the Jacobian, of 
+      shape (m, n)
+    """
+    x = np.asarray(x, dtype=get_dtype())
+    val, jac = _jacobian(f, x, x.size, x.shape, chunk_size)
+    return val, np.moveaxis(jac, 0, -1)
 
+def _jacobian(f, x, n, seed_shape, chunk_size):
+    """Returns the value of f at x and its derivatives along the n unit 
+    directions, stacked along a leading axis.
+    
+    The seed for direction i is the i-th unit vector reshaped to 
+    `seed_shape`, which must broadcast against x.
+    """
+    if chunk_size is None:
+        chunk_size = n
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be a positive integer")
+    
+    blocks = []
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        seed = np.zeros((stop - start, n), dtype=x.dtype)
+        seed[np.arange(stop - start), np.arange(start, stop)] = 1.
+        val, der = _evaluate(f, x, seed.reshape((stop - start,) + seed_shape))
+        blocks.append(der)
+    return val, np.concatenate(blocks)
+
+# Sparse tangents
+# ===============
+# When many inputs are seeded, each intermediate usually depends on a few of 
+# them only. A `SparseTangent` stores the derivative block of shape 
+# (n,) + val.shape as index/value pairs: for every entry of the value, the 
+# indices of the inputs it depends on and the corresponding derivatives, 
+# padded to a common count K with the index n and the derivative 0. Scaling 
+# by values keeps the indices; sums merge them. Once K exceeds 
+# `SPARSE_DENSITY_THRESHOLD` times n, the result is stored densely again.
+
+SPARSE_DENSITY_THRESHOLD = 0.25
+
+class SparseTangent:
+    """Derivative block of a forward mode variable stored as index/value pairs"""
+    
+    __slots__ = ("_idx", "_vals", "_n")
+    
+    # NumPy arrays defer to the reflected operators (e.g. dy * der calls
+    # SparseTangent.__rmul__); np.asarray returns the dense block.
+    __array_ufunc__ = None
+    
+    def __init__(self, idx, vals, n):
+        """Returns a sparse derivative block.
+        
+        Parameters:
+        ===========
+        idx (array): Input indices, of shape (K,) + val.shape, padded with n
+        vals (array): Derivatives, of the same shape as idx, padded with 0
+        n (int): Number of inputs
+        
+        Returns:
+        ========
+        SparseTangent: Sparse block of dense shape (n,) + val.shape
+        """
+        self._idx = idx
+        self._vals = vals
+        self._n = n
+    
+    @classmethod
+    def identity(cls, shape):
+        """Returns the seed of the inputs of a given shape, i.e. the identity
+        of shape (n,) + shape with n the number of inputs."""
+        n = int(np.prod(shape))
+        return cls(np.arange(n).reshape((1,) + tuple(shape)), np.ones((1,) + tuple(shape), dtype=get_dtype()), n)
+    
+    def __repr__(self):
+        return f"SparseTangent(shape={self.shape}, nnz_per_entry={self._idx.shape[0]})"
+    
+    @property
+    def shape(self):
+        return (self._n,) + self._idx.shape[1:]
+    
+    @property
+    def ndim(self):
+        return self._idx.ndim
+    
+    @property
+    def size(self):
+        return self._n * int(np.prod(self._idx.shape[1:]))
+    
+    def todense(self):
+        """Returns the derivative block as a dense array."""
+        dense = np.zeros((self._n + 1,) + self._idx.shape[1:], dtype=self._vals.dtype)
+        np.put_along_axis(dense, self._idx, self._vals, axis=0)
+        return dense[:self._n]
+    
+    def __array__(self, dtype=None, copy=None):
+        dense = self.todense()
+        return dense if dtype is None else dense.astype(dtype)
+    
+    def triplets(self):
+        """Returns the nonzero structure of the block as (entry, input, 
+        derivative) arrays, with entries numbered in flattened value order."""
+        idx = self._idx.reshape(self._idx.shape[0], -1)
+        mask = idx < self._n
+        entries = np.broadcast_to(np.arange(idx.shape[1]), idx.shape)
+        return entries[mask], idx[mask], self._vals.reshape(idx.shape)[mask]
+    
+    def _with(self, vals):
+        """Returns a block with the same indices and new derivatives."""
+        idx = self._idx
+        if vals.shape != idx.shape:
+            idx = np.broadcast_to(idx, vals.shape)
+        return SparseTangent(idx, vals, self._n)
+    
+    def _broadcast(self, shape):
+        """Returns the block broadcast to values of the given shape."""
+        shape = self._idx.shape[:1] + tuple(shape)
+        return SparseTangent(np.broadcast_to(self._idx, shape), np.broadcast_to(self._vals, shape), self._n)
+    
+    def reshape(self, shape):
+        """Returns the block with values reshaped; the input axis is kept."""
+        shape = self._idx.shape[:1] + tuple(shape[1:])
+        return SparseTangent(self._idx.reshape(shape), self._vals.reshape(shape), self._n)
+    
+    def __getitem__(self, index):
+        """Returns the block of the entries selected by index; the first 
+        entry of index selects all inputs (see `Var.__getitem__`)."""
+        return _compact(self._idx[index], self._vals[index], self._n)
+    
+    def __neg__(self):
+        return SparseTangent(self._idx, -self._vals, self._n)
+    
+    def __mul__(self, other):
+        if isinstance(other, SparseTangent):
+            return NotImplemented
+        return self._with(self._vals*other)
+    
+    def __rmul__(self, other):
+        return self.__mul__(other)
+    
+    def __truediv__(self, other):
+        if isinstance(other, SparseTangent):
+            return NotImplemented
+        return self._with(self._vals/other)
+    
+    def __add__(self, other):
+        if isinstance(other, SparseTangent):
+            return _merge(self, other)
+        return self.todense() + other
+    
+    def __radd__(self, other):
+        return other + self.todense()
+    
+    def __sub__(self, other):
+        if isinstance(other, SparseTangent):
+            return _merge(self, -other)
+        return self.todense() - other
+    
+    def __rsub__(self, other):
+        return other - self.todense()
+
+def _compact(idx, vals, n):
+    """Returns a block from padded index/value pairs, dropping rows that are
+    padding for every entry and switching to dense storage above the 
+    density threshold."""
+    if idx.shape[0] > 1:
+        order = np.argsort(idx, axis=0, kind="stable")
+        idx = np.take_along_axis(idx, order, axis=0)
+        vals = np.take_along_axis(vals, order, axis=0)
+        k = int((idx < n).sum(axis=0).max(initial=0))
+        idx, vals = idx[:max(k, 1)], vals[:max(k, 1)]
+    block = SparseTangent(idx, vals, n)
+    if idx.shape[0] > SPARSE_DENSITY_THRESHOLD * n:
+        return block.todense()
+    return block
+
+def _merge(a, b):
+    """Returns the sum of two sparse blocks."""
+    shape = _broadcast_shape(a._idx.shape[1:], b._idx.shape[1:])
+    if a._idx is b._idx or (a._idx.shape == b._idx.shape and np.array_equal(a._idx, b._idx)):
+        return SparseTangent(np.broadcast_to(a._idx, a._idx.shape[:1] + shape), a._vals + b._vals, a._n)
+    a, b = a._broadcast(shape), b._broadcast(shape)
+    idx = np.concatenate([a._idx, b._idx])
+    vals = np.concatenate([a._vals, b._vals])
+    order = np.argsort(idx, axis=0, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=0)
+    vals = np.take_along_axis(vals, order, axis=0)
+    # Each input appears at most once per operand, so duplicates come in 
+    # adjacent pairs: fold the second into the first and pad it.
+    dup = (idx[1:] == idx[:-1]) & (idx[1:] < a._n)
+    vals[:-1] += np.where(dup, vals[1:], 0.)
+    vals[1:][dup] = 0.
+    idx[1:][dup] = a._n
+    return _compact(idx, vals, a._n)
+
+# Batch mode
+# ==========
+# Evaluating f at B points of R^n is done in a single pass by giving every 
+# component of the input a trailing axis of length B: x[i] holds component i 
+# at all points, so f is written exactly as for a single point and every 
+# operator and elementary function broadcasts across the batch. The batch 
+# axis is moved to the front of the returned arrays.
+
+def batch_jvp(f, X, V):
+    """Returns the values and the Jacobian-vector products of a function at a
+    batch of points.
+    
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see `jvp`)
+    - X (array): Points of shape (B, n)
+    - V (array): Direction of shape (n,) shared by all points, or one 
+      direction per point of shape (B, n)
+    
+    Returns:
+    ========
+    - (array, array): Values of f of shape (B, m) and J v of shape (B, m)
+    """
+    x = np.ascontiguousarray(np.asarray(X, dtype=get_dtype()).T)
+    v = np.asarray(V, dtype=get_dtype()).T
+    if v.ndim == 1:
+        v = v[:, np.newaxis]
+    val, der = _evaluate(f, x, v[np.newaxis])
+    return np.moveaxis(val, -1, 0), np.moveaxis(der[0], -1, 0)
+
+def batch_jacobian(f, X, chunk_size=None):
+    """Returns the values and the Jacobians of a function at a batch of 
+    points.
+    
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see `jvp`)
+    - X (array): Points of shape (B, n)
+    - chunk_size (int or None): Number of directions per pass (see 
+      `jacobian`)
+    
+    Returns:
+    ========
+    - (array, array): Values of f of shape (B, m) and Jacobians of shape 
+      (B, m, n)
+    
+    Example:
+    ========
+    >>> f = lambda x: [x[0]*x[1], sin(x[0])]
+    >>> vals, jacs = batch_jacobian(f, np.random.rand(100000, 2))
+    """
+    X = np.asarray(X, dtype=get_dtype())
+    n = X.shape[1]
+    val, jac = _jacobian(f, np.ascontiguousarray(X.T), n, (n, 1), chunk_size)
+    return np.moveaxis(val, -1, 0), np.moveaxis(np.moveaxis(jac, 0, -1), -2, 0)
+
+# Second order mode
+# =================
+
+def _second_order(f, x, tan):
+    """Evaluates `f` at a second order variable with value `x`, identity 
+    `der` block and the given `tan` block; returns its value, first and 
+    second derivative blocks broadcast to full shape."""
+    n = x.size
+    der = np.eye(n, dtype=x.dtype).reshape((n,) + x.shape)
+    if tan is None:
+        tan = der
+    out = f(HyperDual._make(x, der, tan, np.zeros((n, tan.shape[0]) + x.shape, dtype=x.dtype)))
+    val = np.asarray(out._val)
+    return val, np.broadcast_to(out._der, (n,) + val.shape), np.broadcast_to(out._hes, (n, tan.shape[0]) + val.shape)
+
+def hessian(f, x):
+    """Returns the value, gradient and Hessian of a function in a single 
+    second order pass.
+    
+    Parameters:
+    ===========
+    - f (callable): Function of a single second order variable, indexed as 
+      x[0], x[1], ...; it returns a HyperDual
+    - x (array): Point of shape (n,) at which f is evaluated
+    
+    Returns:
+    ========
+    - (array, array, array): Value of f at x, gradient of shape (n,) and 
+      Hessian of shape (n, n); vector valued functions of shape (m,) give 
+      shapes (m, n) and (m, n, n)
+    
+    Example:
+    ========
+    >>> f = lambda x: x[0]**2 * sin(x[1])
+    >>> val, grad, hess = hessian(f, [1.0, 2.0])
+    """
+    x = np.asarray(x, dtype=get_dtype())
+    val, der, hes = _second_order(f, x, None)
+    return val, np.moveaxis(der, 0, -1), np.moveaxis(hes, (0, 1), (-2, -1))
+
+def hvp(f, x, v):
+    """Returns the value, gradient and Hessian-vector product of a function.
+    
+    Only the n x 1 block H v of mixed second derivatives is propagated, so 
+    the cost grows linearly rather than quadratically with n.
+    
+    Parameters:
+    ===========
+    - f (callable): Function of a single second order variable (see 
+      `hessian`)
+    - x (array): Point of shape (n,) at which f is evaluated
+    - v (array): Direction of shape (n,)
+    
+    Returns:
+    ========
+    - (array, array, array): Value of f at x, gradient of shape (n,) and 
+      H v of shape (n,)
+    """
+    x = np.asarray(x, dtype=get_dtype())
+    tan = np.asarray(v, dtype=get_dtype()).reshape((1,) + x.shape)
+    val, der, hes = _second_order(f, x, tan)
+    return val, np.moveaxis(der, 0, -1), np.moveaxis(hes[:, 0], 0, -1)
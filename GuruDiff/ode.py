@@ -0,0 +1,130 @@
+import numpy as np
+
+from GuruDiff import forward
+from GuruDiff.forward import Var
+from GuruDiff.precision import get_dtype
+from GuruDiff.solvers import _values
+
+# ===================================
+# Forward sensitivity ODE integration
+# ===================================
+# For dy/dt = f(t, y, p), the sensitivities S = dy/dp solve
+# dS/dt = df/dy S + df/dp. Evaluating f at a forward mode variable y with
+# the tangent block S, and at p with the identity block, gives both right
+# hand sides in one vectorized pass. Sensitivities are stored in the tangent
+# layout of forward mode, (q, n) for q parameters and n states, so stage
+# values are fed to f without copies; the outputs are transposed views.
+
+_RK4 = ((0., 0.), (.5, .5), (.5, .5), (1., 1.))
+
+def _rk4(f, t, Y, S, p):
+    """Fills Y and S with the classical Runge-Kutta method."""
+    n, q = Y.shape[1], S.shape[1]
+    p = Var._make(p, np.eye(q, dtype=Y.dtype))
+    k = np.empty((4, n), dtype=Y.dtype)
+    dk = np.empty((4, q, n), dtype=Y.dtype)
+    y = np.empty(n, dtype=Y.dtype)
+    s = np.empty((q, n), dtype=Y.dtype)
+    weights = np.array([1., 2., 2., 1.], dtype=Y.dtype)
+    for j in range(len(t) - 1):
+        h = t[j + 1] - t[j]
+        for i, (c, a) in enumerate(_RK4):
+            if i == 0:
+                y[...], s[...] = Y[j], S[j]
+            else:
+                np.multiply(k[i - 1], h*a, out=y)
+                y += Y[j]
+                np.multiply(dk[i - 1], h*a, out=s)
+                s += S[j]
+            k[i], dk[i] = forward._collect(f(t[j] + c*h, Var._make(y, s), p), q)
+        np.dot(weights*(h/6), k, out=Y[j + 1])
+        Y[j + 1] += Y[j]
+        np.dot(weights*(h/6), dk.reshape(4, -1), out=S[j + 1].reshape(-1))
+        S[j + 1] += S[j]
+
+def _backward_euler(f, t, Y, S, p, tol, max_iter):
+    """Fills Y and S with the backward Euler method.
+
+    The state equation y = Y[j] + h f(t, y, p) is solved by Newton iterations
+    with the Jacobian of the previous step, and the sensitivities by the
+    exact derivative of the step, (I - h df/dy) S = S[j] + h df/dp, with a
+    single Jacobian evaluation per step that is reused by the next one.
+    """
+    n, q = Y.shape[1], S.shape[1]
+    # Seeds of the y and p directions, (n + q) in total
+    seed = np.eye(n + q, dtype=Y.dtype)
+    p_var = Var._make(p, seed[:, n:])
+    identity = np.eye(n, dtype=Y.dtype)
+
+    def jacobians(t, y):
+        """Returns df/dy, of shape (n, n), and df/dp in the tangent layout,
+        of shape (q, n)."""
+        _, der = forward._collect(f(t, Var._make(y, seed[:, :n]), p_var), n + q)
+        return der[:n].T, der[n:]
+
+    J, _ = jacobians(t[0], Y[0])
+    M, h_M = None, None
+    for j in range(len(t) - 1):
+        h = t[j + 1] - t[j]
+        if h != h_M:
+            M, h_M = np.linalg.inv(identity - h*J), h
+        y = Y[j + 1]
+        y[...] = Y[j]
+        f_j = lambda y: f(t[j + 1], y, Var(p))
+        for _ in range(max_iter):
+            residual = y - Y[j] - h*_values(f_j, y)
+            step = M @ residual
+            y -= step
+            if np.max(np.abs(step), initial=0.) <= tol*(1 + np.max(np.abs(y), initial=0.)):
+                break
+        else:
+            raise ValueError(f"Newton iterations did not converge at t={t[j + 1]}; "
+                             "reduce the time step")
+        # The inverse at the new state also serves the next Newton iterations
+        J, Jp = jacobians(t[j + 1], y)
+        M, h_M = np.linalg.inv(identity - h*J), h
+        rhs = S[j] + h*Jp
+        np.matmul(rhs, M.T, out=S[j + 1])
+
+def integrate(f, y0, p, t, method="rk4", tol=1e-10, max_iter=50):
+    """Integrates an ODE and its sensitivities to the parameters.
+
+    Parameters:
+    ===========
+    - f (callable): Right hand side f(t, y, p) of dy/dt = f(t, y, p), where
+      y and p are forward mode variables of shapes (n,) and (q,); it returns
+      a Var or a list of n Vars and constants
+    - y0 (array): Initial state of shape (n,), independent of p
+    - p (array): Parameters of shape (q,)
+    - t (array): Increasing times of shape (T,), starting at the initial
+      time, at which the solution is computed
+    - method (str): "rk4" for the classical Runge-Kutta method, or
+      "backward_euler" for stiff problems
+    - tol (float): Relative tolerance of the Newton iterations of implicit
+      methods
+    - max_iter (int): Maximum number of Newton iterations per step
+
+    Returns:
+    ========
+    - (array, array): States of shape (T, n) and sensitivities dy/dp of
+      shape (T, n, q)
+
+    Example:
+    ========
+    >>> decay = lambda t, y, p: -p[0]*y
+    >>> Y, dYdp = integrate(decay, [1.0], [0.5], np.linspace(0, 1, 101))
+    """
+    dtype = get_dtype()
+    y0 = np.asarray(y0, dtype=dtype).ravel()
+    p = np.asarray(p, dtype=dtype).ravel()
+    t = np.asarray(t, dtype=dtype)
+    Y = np.empty((len(t), y0.size), dtype=dtype)
+    S = np.empty((len(t), p.size, y0.size), dtype=dtype)
+    Y[0], S[0] = y0, 0.
+    if method == "rk4":
+        _rk4(f, t, Y, S, p)
+    elif method == "backward_euler":
+        _backward_euler(f, t, Y, S, p, tol, max_iter)
+    else:
+        raise ValueError(f"unknown method {method!r}; expected 'rk4' or 'backward_euler'")
+    return Y, np.swapaxes(S, 1, 2)
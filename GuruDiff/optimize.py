@@ -0,0 +1,177 @@
+import numpy as np
+
+from GuruDiff import reverse
+from GuruDiff.precision import resolve
+
+# ============
+# Optimization
+# ============
+# L-BFGS approximates the inverse Hessian from the last m pairs of steps
+# s = x_{k+1} - x_k and gradient changes y = g_{k+1} - g_k, so a model with
+# n parameters needs O(mn) memory and never forms an n x n matrix. The
+# gradient graph is built once, and a single Executor evaluates the objective
+# and its gradient together, once per line search trial; the gradient at the
+# accepted point is then the one computed by the line search.
+
+class Minimum:
+    """Result of `lbfgs`.
+
+    Attributes:
+    ===========
+    - x (list): Values of the parameter nodes at the minimum
+    - fun (float): Value of the objective at x
+    - grad (list): Gradients of the objective with respect to the parameter
+      nodes at x
+    - converged (bool): Whether max(|grad|) <= gtol
+    - iterations (int): Number of steps taken
+    - evaluations (int): Number of `Executor.run` calls
+    """
+
+    def __init__(self, x, fun, grad, converged, iterations, evaluations):
+        self.x = x
+        self.fun = fun
+        self.grad = grad
+        self.converged = converged
+        self.iterations = iterations
+        self.evaluations = evaluations
+
+    def __repr__(self):
+        return (f"Minimum(fun={self.fun}, converged={self.converged}, "
+                f"iterations={self.iterations}, evaluations={self.evaluations})")
+
+def _views(flat, shapes):
+    """Returns views of consecutive blocks of a flat array with the given
+    shapes."""
+    views, start = [], 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        views.append(flat[start:start + size].reshape(shape))
+        start += size
+    return views
+
+def lbfgs(output_node, node_list, x0, feed_dict=None, m=10, gtol=1e-6, ftol=1e-12,
+          max_iter=1000, max_ls=20, dtype=None):
+    """Minimizes a graph output over some of its variables with L-BFGS.
+
+    Parameters:
+    ===========
+    - output_node (Node): Objective; as in `reverse.gradients`, the sum of its
+      entries is minimized
+    - node_list (list): Variable nodes optimized over
+    - x0 (list): Initial values of the nodes in node_list
+    - feed_dict (dict or None): Values of the other variable nodes, which stay
+      fixed
+    - m (int): Number of curvature pairs kept
+    - gtol (float): Tolerance on the largest gradient entry
+    - ftol (float): Tolerance on the relative decrease of the objective over
+      a step
+    - max_iter (int): Maximum number of steps
+    - max_ls (int): Maximum number of evaluations per line search
+    - dtype (str, type, dtype or None): Floating point dtype of the
+      parameters and of the Executor; by default, the precision policy
+
+    Returns:
+    ========
+    - (Minimum): Minimum with the iteration and evaluation counts
+
+    Example:
+    ========
+    >>> w = Variable("w")
+    >>> loss = (matmul_op(A, w) + -1*b)**2
+    >>> lbfgs(loss, [w], [np.zeros((n, 1))], feed_dict={A: A_val, b: b_val}).x
+    """
+    if m < 1:
+        raise ValueError("m should be a positive integer")
+    dtype = resolve(dtype)
+    executor = reverse.Executor([output_node] + reverse.gradients(output_node, node_list), dtype=dtype)
+    feed_dict = dict(feed_dict or {})
+
+    # Parameters, gradients and line search trials are views of flat arrays,
+    # so that the nodes are fed without copies
+    x0 = [np.asarray(value, dtype=dtype) for value in x0]
+    shapes = [value.shape for value in x0]
+    n = sum(value.size for value in x0)
+    x, x_trial, g, g_trial, d, work = np.empty((6, n), dtype=dtype)
+    for view, value in zip(_views(x, shapes), x0):
+        view[...] = value
+    S = np.zeros((m, n), dtype=dtype)
+    Y = np.zeros((m, n), dtype=dtype)
+    rho = np.zeros(m, dtype=dtype)
+    alpha = np.zeros(m, dtype=dtype)
+    evaluations = 0
+
+    def evaluate(point, grad):
+        """Returns the objective at point, and writes its gradient to grad."""
+        nonlocal evaluations
+        evaluations += 1
+        feed_dict.update(zip(node_list, _views(point, shapes)))
+        values = executor.run(feed_dict)
+        for view, value in zip(_views(grad, shapes), values[1:]):
+            view[...] = value
+        return float(np.sum(values[0]))
+
+    fun = evaluate(x, g)
+    pairs, newest, iteration, converged = 0, -1, 0, False
+    for iteration in range(max_iter):
+        if np.max(np.abs(g), initial=0.) <= gtol:
+            converged = True
+            break
+
+        # Two-loop recursion: d = -H g
+        np.copyto(d, g)
+        order = [(newest - i) % m for i in range(pairs)]
+        for i in order:
+            alpha[i] = rho[i]*(S[i] @ d)
+            np.multiply(Y[i], alpha[i], out=work)
+            d -= work
+        if pairs:
+            d *= (S[newest] @ Y[newest])/(Y[newest] @ Y[newest])
+        for i in reversed(order):
+            np.multiply(S[i], alpha[i] - rho[i]*(Y[i] @ d), out=work)
+            d += work
+        np.negative(d, out=d)
+        slope = g @ d
+        if not slope < 0:
+            # Not a descent direction: restart from steepest descent
+            np.negative(g, out=d)
+            slope, pairs = g @ d, 0
+
+        # Backtracking line search with the Armijo condition, and quadratic
+        # interpolation of the objective along d
+        step = 1. if pairs else min(1., 1./np.max(np.abs(g)))
+        for _ in range(max_ls):
+            np.multiply(d, step, out=x_trial)
+            x_trial += x
+            fun_trial = evaluate(x_trial, g_trial)
+            if fun_trial <= fun + 1e-4*step*slope:
+                break
+            curvature = fun_trial - fun - step*slope
+            guess = -slope*step**2/(2*curvature) if curvature > 0 else step/2
+            step = min(max(guess, step/10), step/2)
+        else:
+            break
+
+        # Curvature pair, kept only if it preserves positive definiteness; it
+        # overwrites the oldest pair either way
+        newest = (newest + 1) % m
+        pairs = min(pairs, m - 1)
+        np.subtract(x_trial, x, out=S[newest])
+        np.subtract(g_trial, g, out=Y[newest])
+        sy = S[newest] @ Y[newest]
+        if sy > 1e-10*(Y[newest] @ Y[newest]):
+            rho[newest] = 1./sy
+            pairs = min(pairs + 1, m)
+        else:
+            newest = (newest - 1) % m
+        x, x_trial = x_trial, x
+        g, g_trial = g_trial, g
+        decrease, fun = fun - fun_trial, fun_trial
+        if decrease <= ftol*max(abs(fun), 1.):
+            iteration += 1
+            converged = np.max(np.abs(g), initial=0.) <= gtol
+            break
+    else:
+        iteration = max_iter
+        converged = np.max(np.abs(g), initial=0.) <= gtol
+    return Minimum([view.copy() for view in _views(x, shapes)], fun,
+                   [view.copy() for view in _views(g, shapes)], converged, iteration, evaluations)
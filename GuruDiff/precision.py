@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+# Floating point precision policy
+# ===============================
+# Values and derivatives created by the forward mode constructors, and values
+# fed to reverse mode executors, are stored with the policy's dtype; every
+# operator, elementary function and gradient op then preserves it. The
+# policy can be overridden per variable (`forward.Var(..., dtype=...)`) and
+# per executor (`reverse.Executor(..., dtype=...)`).
+
+DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+
+_dtype = np.dtype(np.float64)
+
+def resolve(dtype=None):
+    """Returns the dtype to use: `dtype` if given, else the policy's.
+
+    Parameters:
+    ===========
+    - dtype (str, type, dtype or None): np.float32 or np.float64, in any
+      form accepted by np.dtype
+
+    Returns:
+    ========
+    - (np.dtype): Floating point dtype
+    """
+    if dtype is None:
+        return _dtype
+    dtype = np.dtype(dtype)
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype should be one of {[d.name for d in DTYPES]}")
+    return dtype
+
+def get_dtype():
+    """Returns the current floating point dtype."""
+    return _dtype
+
+def set_dtype(dtype):
+    """Sets the floating point dtype used by both engines.
+
+    Parameters:
+    ===========
+    - dtype (str, type, or dtype): np.float32 or np.float64
+
+    Returns:
+    ========
+    - (np.dtype): The previous dtype
+    """
+    global _dtype
+    previous, _dtype = _dtype, resolve(dtype)
+    return previous
+
+@contextmanager
+def precision(dtype):
+    """Context manager that temporarily sets the floating point dtype.
+
+    Example:
+    ========
+    >>> with precision(np.float32):
+    ...     x = forward.Var(np.linspace(0, 1, 1000))
+    """
+    previous = set_dtype(dtype)
+    try:
+        yield
+    finally:
+        set_dtype(previous)
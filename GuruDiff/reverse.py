@@ -4,8 +4,16 @@ with reference to: course CSE 599W Syetems for ML and framework of their homwwor
 2. https://github.com/dlsys-course/assignment1
 '''
 
+import copy
+import numbers
+import operator
+
 import numpy as np
 
+from GuruDiff.forward import _POWERS
+from GuruDiff.precision import get_dtype, resolve
+from GuruDiff.validation import domain
+
 class Node(object):
     """Node in a computation graph."""
     def __init__(self):
@@ -143,6 +151,35 @@ class Op(object):
         """
         raise NotImplementedError
 
+    def kernel(self, node):
+        """Returns a function of the input values that computes the output value.
+
+        Compiled plans (see Executor.compile) call the kernel once per node
+        and run, instead of compute, so it should not re-check its inputs.
+        By default it calls compute.
+
+        Parameters
+        ----------
+        node: node that performs the compute.
+
+        Returns
+        -------
+        A function taking one positional argument per input node.
+        """
+        return lambda *input_vals: self.compute(node, list(input_vals))
+
+    def out_kernel(self, node):
+        """Returns a function of the input values and an output array that
+        writes the output value into that array and returns it, or None if
+        the op cannot write into a given array.
+
+        Compiled plans use it to recycle the buffers of dead values (see
+        Plan). The output array has the shape and dtype the kernel returned
+        on a previous run, and never overlaps the inputs. The op must not
+        return views of its inputs.
+        """
+        return None
+
     def gradient(self, node, output_grad):
         """Given value of output gradient, compute gradient contributions to each input node.
 
@@ -170,6 +207,12 @@ class AddOp(Op):
         assert len(input_vals) == 2
         return input_vals[0] + input_vals[1]
 
+    def kernel(self, node):
+        return operator.add
+
+    def out_kernel(self, node):
+        return np.add
+
     def gradient(self, node, output_grad):
         """Given gradient of add node, return gradient contributions to each input."""
         return [output_grad, output_grad]
@@ -188,6 +231,14 @@ class AddByConstOp(Op):
         assert len(input_vals) == 1
         return input_vals[0] + node.const_attr
 
+    def kernel(self, node):
+        const_val = node.const_attr
+        return lambda a: a + const_val
+
+    def out_kernel(self, node):
+        const_val = node.const_attr
+        return lambda a, out: np.add(a, const_val, out=out)
+
     def gradient(self, node, output_grad):
         """Given gradient of add node, return gradient contribution to input."""
         return [output_grad]
@@ -225,6 +276,12 @@ class MulOp(Op):
         assert len(input_vals) == 2
         return input_vals[0] * input_vals[1]
 
+    def kernel(self, node):
+        return operator.mul
+
+    def out_kernel(self, node):
+        return np.multiply
+
     def gradient(self, node, output_grad):
         """Given gradient of multiply node, return gradient contributions to each input."""
         return [output_grad*node.inputs[1], output_grad*node.inputs[0]]
@@ -244,11 +301,43 @@ class MulByConstOp(Op):
         assert len(input_vals) == 1
         return input_vals[0] * node.const_attr
 
+    def kernel(self, node):
+        const_val = node.const_attr
+        return lambda a: a * const_val
+
+    def out_kernel(self, node):
+        const_val = node.const_attr
+        return lambda a, out: np.multiply(a, const_val, out=out)
+
     def gradient(self, node, output_grad):
         """Given gradient of multiplication node, return gradient contribution to input."""
 
         return [output_grad * node.const_attr]
 
+class DivOp(Op):
+    """Op to element-wise divide two nodes; graph simplification produces it
+    from a * b**-1, which rounds twice."""
+    def __call__(self, node_A, node_B):
+        new_node = Op.__call__(self)
+        new_node.inputs = [node_A, node_B]
+        new_node.name = "(%s/%s)" % (node_A.name, node_B.name)
+        return new_node
+
+    def compute(self, node, input_vals):
+        """Given values of two input nodes, return result of element-wise division."""
+        assert len(input_vals) == 2
+        return input_vals[0] / input_vals[1]
+
+    def kernel(self, node):
+        return operator.truediv
+
+    def out_kernel(self, node):
+        return np.divide
+
+    def gradient(self, node, output_grad):
+        """Given gradient of division node, return gradient contributions to each input."""
+        return [div_op(output_grad, node.inputs[1]), -div_op(output_grad*node, node.inputs[1])]
+
 class MatMulOp(Op):
     """Op to matrix multiply two nodes."""
     def __call__(self, node_A, node_B, trans_A=False, trans_B=False):
@@ -280,6 +369,16 @@ class MatMulOp(Op):
         inp_B = input_vals[1].transpose() if node.matmul_attr_trans_B else input_vals[1]
         return np.matmul(inp_A, inp_B)
 
+    def kernel(self, node):
+        trans_A, trans_B = node.matmul_attr_trans_A, node.matmul_attr_trans_B
+        if not (trans_A or trans_B):
+            return np.matmul
+        return lambda a, b: np.matmul(a.transpose() if trans_A else a, b.transpose() if trans_B else b)
+
+    def out_kernel(self, node):
+        trans_A, trans_B = node.matmul_attr_trans_A, node.matmul_attr_trans_B
+        return lambda a, b, out: np.matmul(a.transpose() if trans_A else a, b.transpose() if trans_B else b, out=out)
+
     def gradient(self, node, output_grad):
         """Given gradient of multiply node, return gradient contributions to each input.
             
@@ -302,6 +401,12 @@ class SinOp(Op):
         assert len(input_vals) == 1
         return np.sin(input_vals[0])
 
+    def kernel(self, node):
+        return np.sin
+
+    def out_kernel(self, node):
+        return np.sin
+
     def gradient(self, node, output_grad):
         return [output_grad * cos_op(node.inputs[0])]
 
@@ -317,6 +422,12 @@ class CosOp(Op):
         assert len(input_vals) == 1
         return np.cos(input_vals[0])
 
+    def kernel(self, node):
+        return np.cos
+
+    def out_kernel(self, node):
+        return np.cos
+
     def gradient(self, node, output_grad):
         return [-sin_op(node.inputs[0]) * output_grad]
 
@@ -332,6 +443,12 @@ class TanOp(Op):
         assert len(input_vals) == 1
         return np.sin(input_vals[0])/np.cos(input_vals[0])
 
+    def kernel(self, node):
+        return lambda a: np.sin(a)/np.cos(a)
+
+    def out_kernel(self, node):
+        return lambda a, out: np.divide(np.sin(a, out=out), np.cos(a), out=out)
+
     def gradient(self, node, output_grad):
         return [output_grad*(cos_op(node.inputs[0])**-2)]
 
@@ -348,6 +465,12 @@ class SinhOp(Op):
         assert len(input_vals) == 1
         return np.sinh(input_vals[0])
 
+    def kernel(self, node):
+        return np.sinh
+
+    def out_kernel(self, node):
+        return np.sinh
+
     def gradient(self, node, output_grad):
         return [output_grad * cosh_op(node.inputs[0])]
 
@@ -363,6 +486,12 @@ class CoshOp(Op):
         assert len(input_vals) == 1
         return np.cosh(input_vals[0])
 
+    def kernel(self, node):
+        return np.cosh
+
+    def out_kernel(self, node):
+        return np.cosh
+
     def gradient(self, node, output_grad):
         return [sinh_op(node.inputs[0]) * output_grad]
 
@@ -378,6 +507,12 @@ class TanhOp(Op):
         assert len(input_vals) == 1
         return np.tanh(input_vals[0])
 
+    def kernel(self, node):
+        return np.tanh
+
+    def out_kernel(self, node):
+        return np.tanh
+
     def gradient(self, node, output_grad):
         return [output_grad*(
             (cosh_op(node.inputs[0])**2 - sinh_op(node.inputs[0])**2) 
@@ -385,6 +520,11 @@ class TanhOp(Op):
         )]
 
 
+def _unit_interval(x, name):
+    """Returns the input of arcsin or arccos under the domain validation
+    policy (see `validation.domain`)."""
+    return domain(x, lambda x: (x > -1) & (x < 1), 'input of %s must in (-1,1)' % name)
+
 class ArcSinOp(Op):
 
     def __call__(self, node_A):
@@ -395,8 +535,13 @@ class ArcSinOp(Op):
 
     def compute(self, node, input_vals):
         assert len(input_vals) == 1
-        assert (input_vals[0]>-1).all() and (input_vals[0]<1).all(), 'input of arcsin must in (-1,1)'
-        return np.arcsin(input_vals[0])
+        return np.arcsin(_unit_interval(input_vals[0], "arcsin"))
+
+    def kernel(self, node):
+        return lambda a: np.arcsin(_unit_interval(a, "arcsin"))
+
+    def out_kernel(self, node):
+        return lambda a, out: np.arcsin(_unit_interval(a, "arcsin"), out=out)
 
     def gradient(self, node, output_grad):
         return [output_grad * ((1-node.inputs[0]**2)**-0.5)]
@@ -410,8 +555,13 @@ class ArcCosOp(Op):
 
     def compute(self, node, input_vals):
         assert len(input_vals) == 1
-        assert (input_vals[0]>-1).all() and (input_vals[0]<1).all(), 'input of arccos must in (-1,1)'
-        return np.arccos(input_vals[0])
+        return np.arccos(_unit_interval(input_vals[0], "arccos"))
+
+    def kernel(self, node):
+        return lambda a: np.arccos(_unit_interval(a, "arccos"))
+
+    def out_kernel(self, node):
+        return lambda a, out: np.arccos(_unit_interval(a, "arccos"), out=out)
 
     def gradient(self, node, output_grad):
         return [-output_grad * ((1-node.inputs[0]**2)**-0.5)]
@@ -427,6 +577,12 @@ class ArcTanOp(Op):
         assert len(input_vals) == 1
         return np.arctan(input_vals[0])
 
+    def kernel(self, node):
+        return np.arctan
+
+    def out_kernel(self, node):
+        return np.arctan
+
     def gradient(self, node, output_grad):
         return [output_grad/(1 + node.inputs[0]**2)]
 
@@ -444,6 +600,19 @@ class PowerOp(Op):
         assert len(input_vals) == 1
         return input_vals[0]**node.const_attr
 
+    def kernel(self, node):
+        const_val = node.const_attr
+        if type(const_val) in (int, float) and const_val in _POWERS:
+            return _POWERS[const_val]
+        return lambda a: a**const_val
+
+    def out_kernel(self, node):
+        const_val = node.const_attr
+        # Same ufunc as ndarray.__pow__, which has faster paths for some exponents
+        if type(const_val) in (int, float) and const_val in _POWERS:
+            return _POWERS[const_val]
+        return lambda a, out: np.power(a, const_val, out=out)
+
     def gradient(self, node, output_grad):
         """Given gradient of add node, return gradient contribution to input."""
         return [output_grad * \
@@ -461,6 +630,14 @@ class ExpOp(Op):
         assert len(input_vals) == 1
         return node.const_attr**input_vals[0]
 
+    def kernel(self, node):
+        const_val = node.const_attr
+        return lambda a: const_val**a
+
+    def out_kernel(self, node):
+        const_val = node.const_attr
+        return lambda a, out: np.power(const_val, a, out=out)
+
     def gradient(self, node, output_grad):
         return [output_grad * \
                 (np.log(node.const_attr) * \
@@ -478,6 +655,14 @@ class LogOp(Op):
         assert len(input_vals) == 1
         return np.log(input_vals[0]) / np.log(node.const_attr)
 
+    def kernel(self, node):
+        log_base = np.log(node.const_attr)
+        return lambda a: np.log(a) / log_base
+
+    def out_kernel(self, node):
+        log_base = np.log(node.const_attr)
+        return lambda a, out: np.divide(np.log(a, out=out), log_base, out=out)
+
     def gradient(self, node, output_grad):
         return [output_grad * \
                 ((np.log(node.const_attr) * node.inputs[0])**-1)]
@@ -494,6 +679,15 @@ class LogisticOp(Op):
         assert len(input_vals) == 1
         return 1./(1+np.exp(-input_vals[0]))
 
+    def kernel(self, node):
+        return lambda a: 1./(1+np.exp(-a))
+
+    def out_kernel(self, node):
+        def logistic(a, out):
+            np.exp(np.negative(a, out=out), out=out)
+            return np.divide(1., np.add(1, out, out=out), out=out)
+        return logistic
+
     def gradient(self, node, output_grad):
         return [output_grad*\
                 (1./(1+exp_op(-node.inputs[0], np.e)))*(1-1./(1+exp_op(-node.inputs[0], np.e)))]
@@ -525,7 +719,13 @@ class ZerosLikeOp(Op):
     def compute(self, node, input_vals):
         """Returns zeros_like of the same shape as input."""
         assert(isinstance(input_vals[0], np.ndarray))
-        return np.zeros(input_vals[0].shape)
+        return np.zeros(np.shape(input_vals[0]), dtype=_float_dtype(input_vals[0]))
+
+    def kernel(self, node):
+        return lambda a: np.zeros(np.shape(a), dtype=_float_dtype(a))
+
+    def out_kernel(self, node):
+        return lambda a, out: np.copyto(out, 0.) or out
 
     def gradient(self, node, output_grad):
         '''
@@ -550,7 +750,13 @@ class OnesLikeOp(Op):
     def compute(self, node, input_vals):
         """Returns ones_like of the same shape as input."""
         assert(isinstance(input_vals[0], np.ndarray))
-        return np.ones(input_vals[0].shape)
+        return np.ones(np.shape(input_vals[0]), dtype=_float_dtype(input_vals[0]))
+
+    def kernel(self, node):
+        return lambda a: np.ones(np.shape(a), dtype=_float_dtype(a))
+
+    def out_kernel(self, node):
+        return lambda a, out: np.copyto(out, 1.) or out
 
     def gradient(self, node, output_grad):
         return [zeroslike_op(node.inputs[0])]
@@ -560,6 +766,7 @@ add_op = AddOp()
 mul_op = MulOp()
 add_byconst_op = AddByConstOp()
 mul_byconst_op = MulByConstOp()
+div_op = DivOp()
 matmul_op = MatMulOp()
 cos_op = CosOp()
 sin_op = SinOp()
@@ -579,15 +786,66 @@ placeholder_op = PlaceholderOp()
 oneslike_op = OnesLikeOp()
 zeroslike_op = ZerosLikeOp()
 
+def _float_dtype(value):
+    """Returns the dtype of value if it is floating point, otherwise the
+    dtype of the precision policy."""
+    dtype = np.result_type(value)
+    return dtype if dtype.kind == "f" else get_dtype()
+
 class Executor:
     """Executor computes values for a given subset of nodes in a computation graph.""" 
-    def __init__(self, eval_node_list):
+    def __init__(self, eval_node_list, dtype=None, optimize=False):
         """
         Parameters
         ----------
         eval_node_list: list of nodes whose values need to be computed.
+        dtype: floating point dtype (np.float32 or np.float64) the fed values
+            are cast to; by default, the precision policy at run time
+            (see GuruDiff.precision).
+        optimize: whether to rewrite the graph before scheduling it (see
+            optimize_graph); the nodes of eval_node_list are left unchanged.
         """
         self.eval_node_list = eval_node_list
+        self.dtype = None if dtype is None else resolve(dtype)
+        self.optimize = optimize
+        self.stats = None
+        self._schedule = None
+        self._schedule_key = None
+        self._schedule_nodes = None
+        self._plan = None
+
+    def schedule(self):
+        """Returns the topological order of the nodes needed to evaluate
+        eval_node_list.
+
+        The order is computed on the first call and reused until
+        eval_node_list changes; after rewriting the inputs of nodes in place,
+        call invalidate() to recompute it. With optimize, it is the order of
+        the rewritten graph, and stats holds the statistics of the rewrite.
+        """
+        # Nodes overload ==, so eval_node_list is compared by identity
+        key = tuple(map(id, self.eval_node_list))
+        if self._schedule is None or key != self._schedule_key:
+            nodes = self.eval_node_list
+            if self.optimize:
+                self.stats = {}
+                nodes = optimize_graph(nodes, self.stats)
+            self._schedule = find_topo_sort(nodes)
+            self._schedule_key = key
+            self._schedule_nodes = nodes
+        return self._schedule
+
+    def invalidate(self):
+        """Discards the cached schedule and plan."""
+        self._schedule = None
+
+    def compile(self):
+        """Returns the flat execution plan of the schedule (see Plan), which
+        is cached with it."""
+        schedule = self.schedule()
+        if self._plan is None or self._plan.schedule is not schedule:
+            self._plan = Plan(schedule, self._schedule_nodes)
+        return self._plan
 
     def run(self, feed_dict):
         """Computes values of nodes in eval_node_list given computation graph.
@@ -600,24 +858,157 @@ class Executor:
         -------
         A list of values for nodes in eval_node_list. 
         """
-        node_to_val_map = dict(feed_dict)
-        # print('init val_map:', node_to_val_map)
-        # Traverse graph in topological sort order and compute values for all nodes.
-        topo_order = find_topo_sort(self.eval_node_list)
-        # print('topo_order:', list(topo_order))
-        for _i, node in enumerate(topo_order):
-            # print('-'*30)
-            # print(_i, node)
-            if isinstance(node.op, PlaceholderOp):
-                continue
-            # print('inputs:', _i, node.inputs)
-            # print('inputs map:', _i, [node_to_val_map[i] for i in node.inputs])
-            node_to_val_map[node] = node.op.compute(node, 
-                                    [node_to_val_map[i] for i in node.inputs])
-
-        # Collect node values.
-        node_val_results = [node_to_val_map[node] for node in self.eval_node_list]
-        return node_val_results
+        return self.compile().run(feed_dict, resolve(self.dtype))
+
+class Plan:
+    """Flat execution plan of a graph.
+
+    Every node of a schedule gets an integer slot, and every non-placeholder
+    node becomes an instruction (kernel, input slots, output slot), with the
+    kernel from Op.kernel. Running the plan fills a list of slots in order,
+    without hashing nodes, dispatching on op types or checking inputs.
+
+    Each instruction also lists the slots read for the last time by it,
+    which are cleared once it has run, so only live values are kept. The
+    first run with given input shapes records the shape and dtype of every
+    value; later runs with the same shapes write large values into pooled
+    buffers through Op.out_kernel, where the buffer of a dead value is
+    recycled for the next value of the same shape and dtype.
+    """
+    # Values smaller than this are left to the allocator
+    min_pooled_bytes = 1 << 16
+
+    def __init__(self, schedule, eval_node_list):
+        """
+        Parameters
+        ----------
+        schedule: topological order of the nodes to evaluate.
+        eval_node_list: list of nodes whose values are returned.
+        """
+        self.schedule = schedule
+        slot = {node: i for i, node in enumerate(schedule)}
+        self.size = len(schedule)
+        self.feeds = [(node, slot[node]) for node in schedule if isinstance(node.op, PlaceholderOp)]
+        self.outputs = [slot[node] for node in eval_node_list]
+        self.nodes = [node for node in schedule if not isinstance(node.op, PlaceholderOp)]
+
+        # Liveness: the values read last by each instruction, except outputs
+        inputs = [tuple(slot[i] for i in node.inputs) for node in self.nodes]
+        last_use = {}
+        for k, args in enumerate(inputs):
+            for i in args:
+                last_use[i] = k
+        for i in self.outputs:
+            last_use.pop(i, None)
+        dead = [[] for _ in self.nodes]
+        for i, k in last_use.items():
+            dead[k].append(i)
+
+        self.general = any(len(args) not in (1, 2) for args in inputs)
+        if self.general:
+            self.instructions = [(node.op.kernel(node), args, slot[node], tuple(d))
+                                 for node, args, d in zip(self.nodes, inputs, dead)]
+        else:
+            # Unary and binary instructions: (kernel, slot, slot or None, slot, dead slots)
+            self.instructions = [(node.op.kernel(node), args[0], args[1] if len(args) == 2 else None, slot[node], tuple(d))
+                                 for node, args, d in zip(self.nodes, inputs, dead)]
+        self.peak_bytes = None
+        self._signature = None
+        self._pooled = None
+        self._buffers = None
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def run(self, feed_dict, dtype):
+        """Returns the values of the output nodes.
+
+        Parameters
+        ----------
+        feed_dict: values of the variable nodes.
+        dtype: floating point dtype the fed values are cast to.
+        """
+        slots = [None] * self.size
+        for node, i in self.feeds:
+            slots[i] = np.asarray(feed_dict[node], dtype=dtype)
+        if self.general:
+            for kernel, inputs, out, dead in self.instructions:
+                slots[out] = kernel(*[slots[i] for i in inputs])
+                for i in dead:
+                    slots[i] = None
+            return [slots[i] for i in self.outputs]
+
+        signature = [(slots[i].shape, slots[i].dtype) for _, i in self.feeds]
+        if signature != self._signature:
+            self._profile(slots)
+            self._signature = signature
+        elif self._pooled is None:
+            for kernel, a, b, out, dead in self.instructions:
+                slots[out] = kernel(slots[a]) if b is None else kernel(slots[a], slots[b])
+                for i in dead:
+                    slots[i] = None
+        else:
+            buffers = [np.empty(shape, dtype=dtype) for shape, dtype in self._buffers]
+            for kernel, a, b, out, dead, buf in self._pooled:
+                if buf is None:
+                    slots[out] = kernel(slots[a]) if b is None else kernel(slots[a], slots[b])
+                elif b is None:
+                    slots[out] = kernel(slots[a], buffers[buf])
+                else:
+                    slots[out] = kernel(slots[a], slots[b], buffers[buf])
+                for i in dead:
+                    slots[i] = None
+        return [slots[i] for i in self.outputs]
+
+    def _profile(self, slots):
+        """Runs the plan, recording the shape and dtype of every value, and
+        assigns pooled buffers to the values computed by later runs."""
+        shapes = [None] * self.size
+        for kernel, a, b, out, dead in self.instructions:
+            value = slots[out] = kernel(slots[a]) if b is None else kernel(slots[a], slots[b])
+            if type(value) is np.ndarray:
+                shapes[out] = (value.shape, value.dtype, value.nbytes)
+            for i in dead:
+                slots[i] = None
+
+        # Values read by ops that may return views of their inputs are never
+        # recycled, nor are outputs
+        out_kernels = [node.op.out_kernel(node) for node in self.nodes]
+        fixed = set(self.outputs)
+        for (_, a, b, _, _), out_kernel in zip(self.instructions, out_kernels):
+            if out_kernel is None:
+                fixed.update((a, b))
+
+        # Assign buffers in execution order: the output first, so that it
+        # never overlaps the inputs, then the buffers of dead values are
+        # returned to the pool. Intermediates would all be retained without
+        # liveness, and pooled buffers are allocated for the whole run.
+        free, buffer_of, buffers = {}, {}, []
+        pooled, live, peak, retained = [], 0, 0, 0
+        for (kernel, a, b, out, dead), out_kernel in zip(self.instructions, out_kernels):
+            shape = shapes[out]
+            buf = None
+            if shape is not None:
+                retained += shape[2]
+                if out not in fixed and out_kernel is not None and shape[2] >= self.min_pooled_bytes:
+                    pool = free.setdefault(shape[:2], [])
+                    buf = pool.pop() if pool else len(buffers)
+                    if buf == len(buffers):
+                        buffers.append(shape[:2])
+                    buffer_of[out] = buf
+                else:
+                    live += shape[2]
+            peak = max(peak, live)
+            for i in dead:
+                if i in buffer_of:
+                    free[shapes[i][:2]].append(buffer_of[i])
+                elif shapes[i] is not None:
+                    live -= shapes[i][2]
+            pooled.append((kernel, a, b, out, dead, None) if buf is None else (out_kernel, a, b, out, dead, buf))
+        pool_bytes = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for shape, dtype in buffers)
+        self.peak_bytes = (retained, peak + pool_bytes)
+        self._buffers = buffers
+        self._pooled = pooled if buffers else None
 
 def gradients(output_node, node_list):
     """Take gradient of output node with respect to each node in node_list.
@@ -667,6 +1058,209 @@ def gradients(output_node, node_list):
     grad_node_list = [node_to_output_grad[node] for node in node_list]
     return grad_node_list
 
+##############################
+####### Graph Rewrites ####### 
+##############################
+
+# Ops whose two inputs can be swapped without changing any bit of the output
+_COMMUTATIVE = (AddOp, MulOp)
+
+def _attr_key(value):
+    """Returns a hashable key of a node attribute; equal keys give equal
+    results, so floats are keyed by their repr, which tells 0. from -0."""
+    if isinstance(value, np.ndarray):
+        return (np.ndarray, value.shape, value.dtype.str, value.tobytes())
+    if isinstance(value, (numbers.Number, np.generic)):
+        return (type(value), repr(value))
+    try:
+        hash(value)
+    except TypeError:
+        return (object, id(value))
+    return (type(value), value)
+
+def _node_key(node, inputs):
+    """Returns the key of a node with the given (canonical) inputs: its op,
+    its inputs and its other attributes."""
+    ids = [id(i) for i in inputs]
+    if isinstance(node.op, _COMMUTATIVE):
+        ids.sort()
+    attrs = tuple(sorted((name, _attr_key(value)) for name, value in vars(node).items()
+                         if name not in ("inputs", "op", "name")))
+    return (node.op, tuple(ids), attrs)
+
+def _with_inputs(node, inputs):
+    """Returns node if it has these inputs, or else a copy of it with them."""
+    if len(inputs) == len(node.inputs) and all(a is b for a, b in zip(inputs, node.inputs)):
+        return node
+    new_node = copy.copy(node)
+    new_node.inputs = list(inputs)
+    return new_node
+
+def eliminate_common_subexpressions(node_list, stats=None):
+    """Merges structurally identical nodes of the graph ending in node_list.
+
+    Nodes are hash-consed on their op, their inputs (in either order for
+    commutative ops) and their other attributes, such as const_attr, in
+    topological order, so chains of duplicates merge too. The graph is not
+    modified: nodes whose inputs change are copied.
+
+    Parameters
+    ----------
+    node_list: list of output nodes.
+    stats: dict updated with the number of nodes before and after the pass,
+        and the number eliminated, under "nodes", "cse_nodes" and
+        "cse_eliminated".
+
+    Returns
+    -------
+    A list of nodes computing the same values as node_list.
+    """
+    topo_order = find_topo_sort(node_list)
+    canonical = {}
+    table = {}
+    for node in topo_order:
+        inputs = [canonical[id(i)] for i in node.inputs]
+        if isinstance(node.op, PlaceholderOp):
+            canonical[id(node)] = node
+            continue
+        key = _node_key(node, inputs)
+        if key not in table:
+            table[key] = _with_inputs(node, inputs)
+        canonical[id(node)] = table[key]
+    if stats is not None:
+        remaining = len({id(node) for node in canonical.values()})
+        stats.setdefault("nodes", len(topo_order))
+        stats["cse_nodes"] = remaining
+        stats["cse_eliminated"] = len(topo_order) - remaining
+    return [canonical[id(node)] for node in node_list]
+
+# Element-wise ops with one input, whose output has the shape of the input,
+# and its dtype if it is floating point and the constant is a Python number
+_SAME_SHAPE = (SinOp, CosOp, TanOp, SinhOp, CoshOp, TanhOp, ArcSinOp, ArcCosOp, ArcTanOp, LogisticOp,
+               PowerOp, ExpOp, AddByConstOp, MulByConstOp, OnesLikeOp, ZerosLikeOp)
+_FLOAT_OPS = _SAME_SHAPE + (AddOp, MulOp, DivOp, MatMulOp, LogOp)
+
+def _is_number(value):
+    """Whether value is a Python int or float, which never changes the
+    dtype of a floating point array it is combined with."""
+    return type(value) in (int, float)
+
+def _shape_class(node, classes):
+    """Returns the class of node: nodes of the same class have values of the
+    same shape and floating point dtype.
+
+    Classes are (token, is_float) pairs; an element-wise op inherits the
+    class of its inputs when they share one, and other nodes get their own.
+    """
+    inputs = [classes[id(i)] for i in node.inputs]
+    if isinstance(node.op, _SAME_SHAPE) and inputs[0][1] and (node.const_attr is None or _is_number(node.const_attr)):
+        return inputs[0]
+    if isinstance(node.op, (AddOp, MulOp, DivOp)) and inputs[0] == inputs[1] and inputs[0][1]:
+        return inputs[0]
+    return (id(node), isinstance(node.op, _FLOAT_OPS) and all(is_float for _, is_float in inputs))
+
+def _simplify(node, classes):
+    """Returns a simpler node computing the value of node, or None."""
+    op, inputs = node.op, node.inputs
+    same = lambda a, b: classes[id(a)] == classes[id(b)]
+    if isinstance(op, MulOp):
+        for a, b in (inputs, inputs[::-1]):
+            if isinstance(a.op, OnesLikeOp) and same(a, b):
+                return b
+        for a, b in (inputs, inputs[::-1]):
+            if isinstance(b.op, PowerOp) and _is_number(b.const_attr) and b.const_attr == -1:
+                return div_op(a, b.inputs[0])
+    elif isinstance(op, AddOp):
+        for a, b in (inputs, inputs[::-1]):
+            if isinstance(b.op, ZerosLikeOp) and same(a, b):
+                return a
+    elif isinstance(op, (MulByConstOp, AddByConstOp, PowerOp)):
+        x, const_val = inputs[0], node.const_attr
+        if not (_is_number(const_val) and classes[id(x)][1]):
+            return None
+        identity = 0 if isinstance(op, AddByConstOp) else 1
+        if const_val == identity:
+            return x
+        if isinstance(op, PowerOp):
+            return oneslike_op(x) if const_val == 0 else None
+        if type(x.op) is type(op) and _is_number(x.const_attr):
+            if isinstance(op, MulByConstOp):
+                return mul_byconst_op(x.inputs[0], x.const_attr * const_val)
+            return add_byconst_op(x.inputs[0], x.const_attr + const_val)
+        if isinstance(op, MulByConstOp) and isinstance(x.op, ZerosLikeOp) and np.isfinite(const_val):
+            return x
+    elif isinstance(op, (OnesLikeOp, ZerosLikeOp)):
+        if isinstance(inputs[0].op, (OnesLikeOp, ZerosLikeOp)):
+            return op(inputs[0].inputs[0])
+    return None
+
+def simplify_graph(node_list, stats=None):
+    """Folds constants and simplifies the graph ending in node_list.
+
+    The rewrites are: a * oneslike(b) -> a and a + zeroslike(b) -> a when a
+    and b have the same shape and dtype; x * 1, x + 0 and x**1 -> x;
+    x**0 -> oneslike(x); chains of multiplications or additions by
+    constants -> a single one; zeroslike(x) * c -> zeroslike(x) for finite
+    c; oneslike and zeroslike of oneslike or zeroslike -> of the inner
+    input; and a * b**-1 -> a / b. Shapes and dtypes are tracked
+    symbolically (see _shape_class), so rewrites never broadcast
+    differently. Folding a chain reassociates its constants, and a / b
+    rounds once instead of twice, so values may differ in the last bit;
+    the sign of a zero may also be lost. The graph is not modified.
+
+    Parameters
+    ----------
+    node_list: list of output nodes.
+    stats: dict updated with the number of nodes before and after the pass,
+        the number eliminated and the number of rewrites, under "nodes",
+        "simplify_nodes", "simplify_eliminated" and "simplify_rewrites".
+
+    Returns
+    -------
+    A list of nodes computing the same values as node_list.
+    """
+    topo_order = find_topo_sort(node_list)
+    canonical = {}
+    classes = {}
+    # Rewritten nodes are kept alive, so that the ids in classes stay unique
+    created = []
+    rewrites = 0
+    for node in topo_order:
+        if isinstance(node.op, PlaceholderOp):
+            canonical[id(node)] = node
+            classes[id(node)] = (id(node), True)
+            continue
+        new_node = _with_inputs(node, [canonical[id(i)] for i in node.inputs])
+        while True:
+            if id(new_node) not in classes:
+                classes[id(new_node)] = _shape_class(new_node, classes)
+                created.append(new_node)
+            simpler = _simplify(new_node, classes)
+            if simpler is None:
+                break
+            new_node = simpler
+            rewrites += 1
+        canonical[id(node)] = new_node
+    result = [canonical[id(node)] for node in node_list]
+    if stats is not None:
+        remaining = len(find_topo_sort(result))
+        stats.setdefault("nodes", len(topo_order))
+        stats["simplify_nodes"] = remaining
+        stats["simplify_eliminated"] = len(topo_order) - remaining
+        stats["simplify_rewrites"] = rewrites
+    return result
+
+def optimize_graph(node_list, stats=None):
+    """Returns node_list rewritten by the graph passes: simplification (see
+    simplify_graph), then common subexpression elimination.
+
+    Parameters
+    ----------
+    node_list: list of output nodes.
+    stats: dict updated with the statistics of each pass.
+    """
+    return eliminate_common_subexpressions(simplify_graph(node_list, stats), stats)
+
 ##############################
 ####### Helper Methods ####### 
 ##############################
@@ -687,13 +1281,25 @@ def find_topo_sort(node_list):
     return topo_order
 
 def topo_sort_dfs(node, visited, topo_order):
-    """Post-order DFS"""
+    """Post-order DFS
+    
+    The traversal keeps its own stack of (node, remaining inputs) rather than
+    recursing, so graphs deeper than the recursion limit can be sorted.
+    """
     if node in visited:
         return
     visited.add(node)
-    for n in node.inputs:
-        topo_sort_dfs(n, visited, topo_order)
-    topo_order.append(node)
+    stack = [(node, iter(node.inputs))]
+    while stack:
+        current, inputs = stack[-1]
+        for n in inputs:
+            if n not in visited:
+                visited.add(n)
+                stack.append((n, iter(n.inputs)))
+                break
+        else:
+            stack.pop()
+            topo_order.append(current)
 
 def sum_node_list(node_list):
     """Custom sum function in order to avoid create redundant nodes in Python sum implementation."""
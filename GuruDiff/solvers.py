@@ -0,0 +1,154 @@
+import numpy as np
+
+from GuruDiff import forward
+from GuruDiff.precision import get_dtype
+
+# ========================
+# Nonlinear system solvers
+# ========================
+# Newton's method needs a Jacobian at every iterate, which costs n forward
+# mode directions (or m reverse passes) per step. After the first step, the
+# solver below only updates an approximate inverse Jacobian with Broyden's
+# rank-1 formula, at the cost of one value-only evaluation of the function
+# and O(n^2) work per step. The true Jacobian is recomputed only when the
+# residual stops decreasing fast enough.
+
+class Solution:
+    """Result of `solve`.
+
+    Attributes:
+    ===========
+    - x (array): Final iterate
+    - residual (array): Value of the function at x
+    - converged (bool): Whether max(|residual|) <= tol
+    - iterations (int): Number of steps taken
+    - fevals (int): Number of value-only evaluations of the function
+    - jevals (int): Number of Jacobian evaluations, which also give the value
+    """
+
+    def __init__(self, x, residual, converged, iterations, fevals, jevals):
+        self.x = x
+        self.residual = residual
+        self.converged = converged
+        self.iterations = iterations
+        self.fevals = fevals
+        self.jevals = jevals
+
+    def __repr__(self):
+        return (f"Solution(converged={self.converged}, iterations={self.iterations}, "
+                f"fevals={self.fevals}, jevals={self.jevals}, "
+                f"residual={np.max(np.abs(self.residual), initial=0.)})")
+
+def _values(f, x):
+    """Returns the value of f at x, without derivatives."""
+    with forward.no_grad():
+        out = f(forward.Var(x))
+    if isinstance(out, (list, tuple)):
+        return np.stack(np.broadcast_arrays(*[np.asarray(forward._value(element), dtype=x.dtype)
+                                               for element in out]))
+    return np.asarray(forward._value(out), dtype=x.dtype)
+
+def _inverse(J):
+    """Returns the inverse of a square Jacobian."""
+    if J.ndim != 2 or J.shape[0] != J.shape[1]:
+        raise ValueError(f"the Jacobian should be square, got shape {J.shape}")
+    try:
+        return np.linalg.inv(J)
+    except np.linalg.LinAlgError:
+        raise ValueError("the Jacobian is singular") from None
+
+def _evaluate(jac, x):
+    """Returns the value of the function at x and the inverse of its
+    Jacobian."""
+    F, J = jac(x)
+    return np.asarray(F, dtype=x.dtype).ravel(), _inverse(np.asarray(J, dtype=x.dtype))
+
+def solve(f, x0, tol=1e-10, max_iter=100, jac=None, broyden=True, stall=0.5):
+    """Solves f(x) = 0 by Newton's method with Broyden updates.
+
+    The Jacobian is evaluated at x0 and then updated with Broyden's rank-1
+    formula. It is evaluated again whenever a step reduces max(|f|) by less
+    than the factor `stall`. A step taken with a fresh Jacobian is halved
+    until the residual decreases, and the solver stops without convergence
+    if it does not.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see
+      `forward.jvp`), with as many outputs as inputs
+    - x0 (array): Initial guess of shape (n,)
+    - tol (float): Tolerance on max(|f(x)|)
+    - max_iter (int): Maximum number of steps
+    - jac (callable or None): Function x -> (f(x), J(x)) used for the
+      Jacobian evaluations, e.g. built on `reverse.gradients`; by default,
+      `forward.jacobian(f, x)`
+    - broyden (bool): Whether to update the Jacobian between evaluations;
+      if False, the Jacobian is evaluated at every step (Newton's method)
+    - stall (float): Residual reduction factor, in (0, 1], below which a
+      Broyden step is accepted without a Jacobian evaluation
+
+    Returns:
+    ========
+    - (Solution): Solution with the evaluation counters
+
+    Example:
+    ========
+    >>> f = lambda x: [x[0]**2 + x[1]**2 - 4, x[0] - x[1]]
+    >>> solve(f, [1.0, 2.0]).x
+    array([1.41421356, 1.41421356])
+    """
+    if not 0 < stall <= 1:
+        raise ValueError("stall should be in (0, 1]")
+    if jac is None:
+        jac = lambda x: forward.jacobian(f, x)
+    x = np.array(x0, dtype=get_dtype()).ravel()
+    fevals = 0
+
+    # H approximates the inverse of the Jacobian at x, and is exact if fresh
+    F, H = _evaluate(jac, x)
+    fresh, refresh, jevals = True, False, 1
+    norm = np.max(np.abs(F), initial=0.)
+    for iteration in range(max_iter):
+        if norm <= tol:
+            return Solution(x, F, True, iteration, fevals, jevals)
+        if refresh:
+            F, H = _evaluate(jac, x)
+            fresh, refresh, jevals = True, False, jevals + 1
+
+        s = -H @ F
+        x_new = x + s
+        F_new = _values(f, x_new).ravel()
+        fevals += 1
+        norm_new = np.max(np.abs(F_new), initial=0.)
+        if fresh:
+            for _ in range(30):
+                if norm_new < norm:
+                    break
+                s = s / 2
+                x_new = x + s
+                F_new = _values(f, x_new).ravel()
+                fevals += 1
+                norm_new = np.max(np.abs(F_new), initial=0.)
+            if not norm_new < norm:
+                # No descent along the Newton direction: round-off limits
+                # the residual, or the Jacobian is ill-conditioned
+                return Solution(x, F, False, iteration, fevals, jevals)
+        elif not norm_new < norm:
+            # Reject the step and retry from x with the true Jacobian
+            F, H = _evaluate(jac, x)
+            fresh, jevals = True, jevals + 1
+            continue
+
+        y = F_new - F
+        x, F, reduced, norm = x_new, F_new, norm_new <= stall*norm, norm_new
+        if broyden and reduced:
+            # Sherman-Morrison form of the good Broyden update of J
+            Hy = H @ y
+            sH = s @ H
+            denominator = s @ Hy
+            if denominator != 0:
+                H += np.outer((s - Hy)/denominator, sH)
+            fresh = False
+        else:
+            refresh = True
+    return Solution(x, F, norm <= tol, max_iter, fevals, jevals)
@@ -0,0 +1,385 @@
+import numpy as np
+
+from GuruDiff import forward
+from GuruDiff import reverse
+
+class COOMatrix:
+    """Sparse matrix in coordinate format"""
+
+    __slots__ = ("rows", "cols", "data", "shape")
+
+    def __init__(self, rows, cols, data, shape):
+        """Returns a sparse matrix in coordinate format.
+
+        Parameters:
+        ===========
+        rows (array): Row index of each stored entry
+        cols (array): Column index of each stored entry
+        data (array): Value of each stored entry
+        shape (tuple): Shape (m, n) of the matrix
+
+        Returns:
+        ========
+        COOMatrix: Sparse matrix
+        """
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.cols = np.asarray(cols, dtype=np.intp)
+        self.data = np.asarray(data, dtype=float)
+        self.shape = tuple(shape)
+
+    def __repr__(self):
+        """Returns the shape and number of stored entries of the matrix."""
+        return f"COOMatrix(shape={self.shape}, nnz={self.nnz})"
+
+    @property
+    def nnz(self):
+        """Number of stored entries."""
+        return self.data.size
+
+    def toarray(self):
+        """Returns the matrix as a dense array."""
+        dense = np.zeros(self.shape)
+        dense[self.rows, self.cols] = self.data
+        return dense
+
+    def tocsr(self):
+        """Returns the matrix in compressed sparse row format.
+
+        Returns:
+        ========
+        (array, array, array): The `data`, column `indices` and row pointer
+        `indptr` arrays, where the entries of row i are stored in
+        data[indptr[i]:indptr[i+1]]
+        """
+        order = np.lexsort((self.cols, self.rows))
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(self.rows, minlength=self.shape[0]), out=indptr[1:])
+        return self.data[order], self.cols[order], indptr
+
+# ==================
+# Sparsity detection
+# ==================
+
+class _Dependency(np.ndarray):
+    """Boolean array recording which inputs a derivative depends on.
+
+    Used in place of a tangent block, it makes every NumPy ufunc return the
+    union of the dependencies of its operands instead of a numerical result,
+    so forward mode derivative rules such as cos(x)*x.der propagate the
+    sparsity pattern exactly, without accidental zeros.
+    """
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if kwargs.get("out") is not None or ufunc.signature is not None:
+            return NotImplemented
+        if method == "reduce":
+            axis = kwargs.get("axis", 0)
+            keepdims = kwargs.get("keepdims", False)
+            return np.logical_or.reduce(inputs[0].view(np.ndarray), axis=axis, keepdims=keepdims).view(_Dependency)
+        if method != "__call__":
+            return NotImplemented
+
+        arrays = [np.asarray(a) for a in inputs]
+        result = np.zeros(np.broadcast(*arrays).shape, dtype=bool)
+        for a, array in zip(inputs, arrays):
+            if isinstance(a, _Dependency):
+                result |= array
+        return result.view(_Dependency)
+
+    def __array_function__(self, func, types, args, kwargs):
+        # The array functions used by forward mode derivative rules would
+        # otherwise compute numbers, or drop the subclass
+        rule = _DEPENDENCY_FUNCTIONS.get(func)
+        if rule is None:
+            return super().__array_function__(func, types, args, kwargs)
+        return rule(*args, **kwargs)
+
+def _pattern(a):
+    """Returns the dependencies of a as a plain boolean array; constants
+    have none."""
+    if isinstance(a, _Dependency):
+        return a.view(np.ndarray)
+    return np.zeros(np.shape(a), dtype=bool)
+
+def _contract(func):
+    """Returns the rule of a contraction such as np.dot, whose entries
+    depend on every input of the dependency operands that they sum over."""
+    def rule(a, b, *args, **kwargs):
+        # Constant operands count as nonzero, as in the ufuncs
+        result = np.zeros((), dtype=bool)
+        if isinstance(a, _Dependency):
+            result = result | (func(_pattern(a).astype(float), np.ones(np.shape(b)), *args, **kwargs) > 0)
+        if isinstance(b, _Dependency):
+            result = result | (func(np.ones(np.shape(a)), _pattern(b).astype(float), *args, **kwargs) > 0)
+        return result.view(_Dependency)
+    return rule
+
+def _join(func):
+    """Returns the rule of a function joining arrays, such as np.stack."""
+    def rule(arrays, *args, **kwargs):
+        return func([_pattern(a) for a in arrays], *args, **kwargs).view(_Dependency)
+    return rule
+
+def _any(a, axis=None, dtype=None, out=None, keepdims=False):
+    """Rule of np.sum and np.mean: the union of the reduced dependencies."""
+    return np.logical_or.reduce(_pattern(a), axis=axis, keepdims=keepdims).view(_Dependency)
+
+_DEPENDENCY_FUNCTIONS = {
+    np.dot: _contract(np.dot),
+    np.tensordot: _contract(np.tensordot),
+    np.stack: _join(np.stack),
+    np.concatenate: _join(np.concatenate),
+    np.broadcast_to: lambda array, shape, subok=False: np.broadcast_to(_pattern(array), shape).view(_Dependency),
+    np.sum: _any,
+    np.mean: _any,
+}
+
+def jacobian_sparsity(f, x):
+    """Returns the sparsity pattern of the Jacobian of a forward mode function.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see
+      `forward.jvp`)
+    - x (array): Point of shape (n,) at which f is evaluated; values only
+      matter for branches taken inside f
+
+    Returns:
+    ========
+    - (array): Boolean array of shape (m, n) that is True where the Jacobian
+      may be nonzero
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.size
+    seed = np.eye(n, dtype=bool).reshape((n,) + x.shape).view(_Dependency)
+    with forward.rounding("off"):
+        _, der = forward._collect(f(forward.Var._make(x, seed)), n)
+    return np.ascontiguousarray(np.asarray(der).reshape(n, -1).T != 0)
+
+def _align(patterns):
+    """Inserts singleton axes after the input axis of dependency patterns so
+    their value axes broadcast against each other."""
+    ndim = max(p.ndim for p in patterns)
+    return [p.reshape(p.shape[:1] + (1,)*(ndim - p.ndim) + p.shape[1:]) for p in patterns]
+
+def graph_sparsity(output_node, wrt, feed_dict):
+    """Returns the sparsity pattern of the Jacobian of a reverse mode graph.
+
+    Dependencies are traced structurally through the op graph: elementwise
+    ops take the union of the dependencies of their inputs, and matrix
+    products combine the dependencies of one operand with the nonzero
+    structure of the other.
+
+    Parameters:
+    ===========
+    - output_node (Node): Output of the graph
+    - wrt (Node): Variable node the Jacobian is taken with respect to
+    - feed_dict (dict): Values of all variable nodes of the graph
+
+    Returns:
+    ========
+    - (array): Boolean array of shape (m, n) that is True where the Jacobian
+      may be nonzero, where m and n are the sizes of the output and of wrt
+    """
+    return _graph_sparsity(output_node, wrt, feed_dict)[0]
+
+def _graph_sparsity(output_node, wrt, feed_dict):
+    """Returns the sparsity pattern of the Jacobian of a reverse mode graph
+    (see `graph_sparsity`) and the shape of the output."""
+    topo_order = reverse.find_topo_sort([output_node])
+    values = dict(zip(topo_order, reverse.Executor(topo_order).run(feed_dict)))
+    n = np.size(values[wrt])
+
+    patterns = {}
+    for node in topo_order:
+        shape = np.shape(values[node])
+        if node is wrt:
+            patterns[node] = np.eye(n, dtype=bool).reshape((n,) + shape)
+        elif isinstance(node.op, (reverse.PlaceholderOp, reverse.OnesLikeOp, reverse.ZerosLikeOp, reverse.EqOp)):
+            patterns[node] = np.zeros((n,) + shape, dtype=bool)
+        elif isinstance(node.op, reverse.MatMulOp):
+            node_A, node_B = node.inputs
+            dep_A, dep_B = patterns[node_A], patterns[node_B]
+            nz_A, nz_B = values[node_A] != 0, values[node_B] != 0
+            if node.matmul_attr_trans_A:
+                dep_A, nz_A = np.swapaxes(dep_A, -1, -2), nz_A.T
+            if node.matmul_attr_trans_B:
+                dep_B, nz_B = np.swapaxes(dep_B, -1, -2), nz_B.T
+            patterns[node] = (np.matmul(dep_A.astype(int), nz_B.astype(int)) > 0) \
+                           | (np.matmul(nz_A.astype(int), dep_B.astype(int)) > 0)
+        else:
+            aligned = _align([patterns[i] for i in node.inputs])
+            patterns[node] = np.logical_or.reduce(np.broadcast_arrays(*aligned))
+
+    return np.ascontiguousarray(patterns[output_node].reshape(n, -1).T), np.shape(values[output_node])
+
+# ========
+# Coloring
+# ========
+
+def color_columns(pattern):
+    """Returns a coloring of the columns of a sparsity pattern.
+
+    Columns sharing a nonzero row receive different colors, so all columns
+    of one color can be recovered from a single compressed Jacobian-vector
+    product. Columns are colored greedily, densest first.
+
+    Parameters:
+    ===========
+    - pattern (array): Boolean array of shape (m, n)
+
+    Returns:
+    ========
+    - (array): Color of each column, from 0 to the number of colors - 1
+    """
+    pattern = np.asarray(pattern, dtype=bool)
+    return _greedy_coloring(*np.nonzero(pattern), *pattern.shape)
+
+def _greedy_coloring(rows, cols, m, n):
+    """Colors the columns of an m x n pattern given the coordinates of its 
+    nonzero entries (see `color_columns`)."""
+    cols_in_row = [[] for _ in range(m)]
+    rows_in_col = [[] for _ in range(n)]
+    for i, j in zip(rows.tolist(), cols.tolist()):
+        cols_in_row[i].append(j)
+        rows_in_col[j].append(i)
+
+    colors = [-1]*n
+    # forbidden[c] == j marks color c as used by a neighbour of column j
+    forbidden = [-1]*(n + 1)
+    for j in sorted(range(n), key=lambda j: -len(rows_in_col[j])):
+        for i in rows_in_col[j]:
+            for k in cols_in_row[i]:
+                forbidden[colors[k]] = j
+        color = 0
+        while forbidden[color] == j:
+            color += 1
+        colors[j] = color
+    return np.array(colors, dtype=np.intp)
+
+def color_rows(pattern):
+    """Returns a coloring of the rows of a sparsity pattern.
+
+    Rows sharing a nonzero column receive different colors, so all rows of
+    one color can be recovered from a single compressed vector-Jacobian
+    product (see `color_columns`).
+    """
+    return color_columns(np.asarray(pattern, dtype=bool).T)
+
+# ====================
+# Compressed Jacobians
+# ====================
+
+def sparse_jacobian(f, x, pattern=None):
+    """Returns the value and the sparse Jacobian of a forward mode function.
+
+    The Jacobian is compressed along its columns: one direction is seeded per
+    column color, so the number of passes equals the number of colors rather
+    than the number of inputs.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see
+      `forward.jvp`)
+    - x (array): Point of shape (n,) at which f is evaluated
+    - pattern (array or None): Sparsity pattern of shape (m, n); by default,
+      it is detected with `jacobian_sparsity`
+
+    Returns:
+    ========
+    - (array, COOMatrix): Value of f at x and its Jacobian
+    """
+    x = np.asarray(x, dtype=float)
+    if pattern is None:
+        pattern = jacobian_sparsity(f, x)
+    pattern = np.asarray(pattern, dtype=bool)
+    rows, cols = np.nonzero(pattern)
+    colors = _greedy_coloring(rows, cols, *pattern.shape)
+    n_colors = colors.max() + 1 if colors.size else 0
+
+    seed = np.zeros((x.size, n_colors))
+    seed[np.arange(x.size), colors] = 1.
+    val, compressed = forward.jvp(f, x, seed)
+    data = compressed.reshape(-1, n_colors)[rows, colors[cols]]
+    return val, COOMatrix(rows, cols, data, pattern.shape)
+
+def tangent_jacobian(f, x):
+    """Returns the value and the sparse Jacobian of a forward mode function,
+    propagating sparse tangents (see `forward.SparseTangent`).
+
+    All n inputs are seeded in a single pass without sparsity detection or
+    coloring; each intermediate only stores the derivatives with respect to
+    the inputs it depends on, until it becomes dense enough to be stored as
+    a dense block.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see
+      `forward.jvp`)
+    - x (array): Point of shape (n,) at which f is evaluated
+
+    Returns:
+    ========
+    - (array, COOMatrix): Value of f at x and its Jacobian
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.size
+    val, der = forward._collect(f(forward.Var._make(x, forward.SparseTangent.identity(x.shape))), n)
+    shape = (np.size(val), n)
+    if isinstance(der, forward.SparseTangent):
+        rows, cols, data = der.triplets()
+        return val, COOMatrix(rows, cols, data, shape)
+    jac = np.asarray(der).reshape(n, -1).T
+    rows, cols = np.nonzero(jac)
+    return val, COOMatrix(rows, cols, jac[rows, cols], shape)
+
+def sparse_jacobian_reverse(output_node, wrt, feed_dict, pattern=None):
+    """Returns the value and the sparse Jacobian of a reverse mode graph.
+
+    The Jacobian is compressed along its rows: the gradient of the weighted
+    sum of all outputs of one row color is computed per pass, so the number
+    of reverse passes equals the number of colors rather than the number of
+    outputs.
+
+    Parameters:
+    ===========
+    - output_node (Node): Output of the graph
+    - wrt (Node): Variable node the Jacobian is taken with respect to
+    - feed_dict (dict): Values of all variable nodes of the graph
+    - pattern (array or None): Sparsity pattern of shape (m, n); by default,
+      it is detected with `graph_sparsity`
+
+    Returns:
+    ========
+    - (array, COOMatrix): Value of the output and its Jacobian
+    """
+    if pattern is None:
+        pattern, shape = _graph_sparsity(output_node, wrt, feed_dict)
+        val = None
+    else:
+        # The weights of each color are fed in the shape of the output
+        val, = reverse.Executor([output_node]).run(feed_dict)
+        shape = np.shape(val)
+    pattern = np.asarray(pattern, dtype=bool)
+    rows, cols = np.nonzero(pattern)
+    colors = _greedy_coloring(cols, rows, *pattern.shape[::-1])
+    n_colors = colors.max() + 1 if colors.size else 0
+
+    weights = reverse.Variable(name="weights")
+    grad, = reverse.gradients(output_node * weights, [wrt])
+    executor = reverse.Executor([output_node, grad])
+
+    compressed = np.zeros((pattern.shape[1], n_colors))
+    feed_dict = dict(feed_dict)
+    for color in range(n_colors):
+        feed_dict[weights] = (colors == color).astype(float).reshape(shape)
+        out_val, grad_val = executor.run(feed_dict)
+        # The value of the output is taken from the first sweep
+        if val is None:
+            val = out_val
+        compressed[:, color] = np.ravel(grad_val)
+    if val is None:
+        # No output depends on wrt, so there was no sweep
+        val, = reverse.Executor([output_node]).run(feed_dict)
+    data = compressed[cols, colors[rows]]
+    return val, COOMatrix(rows, cols, data, pattern.shape)
@@ -0,0 +1,157 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from GuruDiff import forward
+from GuruDiff import validation
+from GuruDiff.precision import get_dtype, set_dtype
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+# ================
+# Parameter sweeps
+# ================
+# A sweep evaluates the values and Jacobians of a forward mode function at
+# many points. The points are split into chunks of rows, and each chunk is
+# evaluated in a single batched pass (see `forward.batch_jacobian`) by a pool
+# of worker processes. The points and the results live in shared memory
+# blocks that every worker maps, so chunks are described to the workers by
+# their row range only, and results are written in place instead of being
+# pickled back. Without `multiprocessing.shared_memory` (Python < 3.8), the
+# points are sent to each worker once and the results of each chunk are
+# pickled back.
+
+def default_workers():
+    """Returns the number of CPU cores available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+# State of a worker process, set once by `_init_worker`
+_worker = {}
+
+def _attach(block):
+    """Returns the shared memory block described by (name, shape, dtype) and
+    an array backed by it."""
+    name, shape, dtype = block
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _init_worker(f, X, blocks, policies):
+    """Sets up a worker process: the function, the points and the result
+    arrays, and the policies of the parent process."""
+    dtype, rounding, mode = policies
+    set_dtype(dtype)
+    forward.set_rounding(rounding)
+    validation.set_validation(mode)
+    _worker["f"] = f
+    if blocks is None:
+        _worker["arrays"] = (X, None, None)
+    else:
+        attached = [_attach(block) for block in blocks]
+        _worker["shm"] = [shm for shm, _ in attached]
+        _worker["arrays"] = tuple(array for _, array in attached)
+
+def _run_chunk(start, stop):
+    """Evaluates the chunk of points [start, stop) in a worker process."""
+    X, vals, jacs = _worker["arrays"]
+    val, jac = forward.batch_jacobian(_worker["f"], X[start:stop])
+    if vals is None:
+        return start, stop, val, jac
+    vals[start:stop] = val
+    jacs[start:stop] = jac
+    return start, stop, None, None
+
+def _chunks(n_points, workers, chunk_size):
+    """Returns the row ranges of the chunks."""
+    if chunk_size is None:
+        # A few chunks per worker balance the load without small passes
+        chunk_size = max(1, min(16384, -(-n_points // (4*workers))))
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be a positive integer")
+    return [(start, min(start + chunk_size, n_points)) for start in range(0, n_points, chunk_size)]
+
+def sweep(f, X, workers=None, chunk_size=None, callback=None):
+    """Returns the values and the Jacobians of a function at many points,
+    evaluated in parallel by worker processes.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see
+      `forward.jvp`); it is sent to the workers, so it should be picklable,
+      e.g. a function defined at the top level of a module
+    - X (array): Points of shape (B, n)
+    - workers (int or None): Number of worker processes; by default, the
+      number of available cores. With a single worker, the chunks are
+      evaluated in this process
+    - chunk_size (int or None): Number of points per batched pass
+    - callback (callable or None): Called in this process as
+      callback(start, stop, vals, jacs) when the chunk of points
+      X[start:stop] is done, in completion order; vals and jacs are views
+      of the results of the chunk that are only valid during the call
+
+    Returns:
+    ========
+    - (array, array): Values of f of shape (B, m) and Jacobians of shape
+      (B, m, n), as returned by `forward.batch_jacobian`
+
+    Example:
+    ========
+    >>> vals, jacs = sweep(model, np.random.rand(10**6, 3), workers=8)
+    """
+    X = np.ascontiguousarray(X, dtype=get_dtype())
+    workers = default_workers() if workers is None else workers
+    if workers < 1:
+        raise ValueError("workers should be a positive integer")
+    chunks = _chunks(X.shape[0], workers, chunk_size)
+
+    # Shapes of the results, from the first point
+    val, jac = forward.batch_jacobian(f, X[:1])
+    vals = np.empty((X.shape[0],) + val.shape[1:], dtype=val.dtype)
+    jacs = np.empty((X.shape[0],) + jac.shape[1:], dtype=jac.dtype)
+    if workers == 1 or len(chunks) == 1:
+        for start, stop in chunks:
+            vals[start:stop], jacs[start:stop] = forward.batch_jacobian(f, X[start:stop])
+            if callback is not None:
+                callback(start, stop, vals[start:stop], jacs[start:stop])
+        return vals, jacs
+    if shared_memory is None:
+        _run_pool(f, X, None, vals, jacs, chunks, workers, callback)
+        return vals, jacs
+
+    blocks = [shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1)) for a in (X, vals, jacs)]
+    try:
+        return _run_shared(f, X, blocks, vals, jacs, chunks, workers, callback)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def _run_shared(f, X, blocks, vals, jacs, chunks, workers, callback):
+    """Runs a sweep with the points and results in shared memory blocks, and
+    returns copies of the results (the views of the blocks are released when
+    this function returns, so the blocks can be closed)."""
+    arrays = [np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf) for a, shm in zip((X, vals, jacs), blocks)]
+    arrays[0][...] = X
+    specs = [(shm.name, a.shape, a.dtype) for a, shm in zip(arrays, blocks)]
+    _run_pool(f, None, specs, arrays[1], arrays[2], chunks, workers, callback)
+    return arrays[1].copy(), arrays[2].copy()
+
+def _run_pool(f, X, specs, vals, jacs, chunks, workers, callback):
+    """Evaluates the chunks in a process pool, and calls back as they are
+    done."""
+    policies = (get_dtype(), forward.get_rounding(), validation.get_validation())
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(f, X, specs, policies)) as pool:
+        futures = [pool.submit(_run_chunk, start, stop) for start, stop in chunks]
+        for future in as_completed(futures):
+            start, stop, val, jac = future.result()
+            if val is not None:
+                vals[start:stop] = val
+                jacs[start:stop] = jac
+            if callback is not None:
+                callback(start, stop, vals[start:stop], jacs[start:stop])
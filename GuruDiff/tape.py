@@ -0,0 +1,467 @@
+import operator
+
+import numpy as np
+
+from GuruDiff import forward
+from GuruDiff import validation
+from GuruDiff.precision import get_dtype
+
+# =========
+# Recording
+# =========
+# A function of a forward mode variable is recorded by evaluating it once on
+# a variable whose value and tangent block are `_Traced` arrays. These stand
+# in for NumPy arrays: every ufunc, array function, indexing operation and
+# array method applied to them is computed on their concrete values and
+# appended to the tape, so the derivative rules, domain checks and rounding
+# of the forward mode engine are recorded as the NumPy calls they make.
+#
+# Branches taken on values (e.g. `if ok.all()` in a domain check) are
+# recorded as guards: a replay at a point where a guard does not hold falls
+# back to evaluating the function again.
+
+# Op codes
+_UFUNC = 0  # fn(*buffers[args], out=buffers[out], **kwargs)
+_CALL = 1   # buffers[out] = fn(*args, **kwargs), args may nest buffer refs
+_GUARD = 2  # fn(buffers[args]) must equal out
+
+class _Ref:
+    """Reference to a tape buffer inside the arguments of a recorded call."""
+
+    __slots__ = ("slot",)
+
+    def __init__(self, slot):
+        self.slot = slot
+
+def _method(name):
+    """Returns a recorded version of the array method `name`."""
+    def call(a, *args, **kwargs):
+        return getattr(a, name)(*args, **kwargs)
+    call.__name__ = name
+    def method(self, *args, **kwargs):
+        return self._tape.call(call, (self,) + args, kwargs)
+    return method
+
+def _ufunc(ufunc, reflected=False):
+    """Returns a recorded arithmetic or comparison operator."""
+    if reflected:
+        return lambda self, other: ufunc(other, self)
+    return lambda self, other: ufunc(self, other)
+
+def _inplace(ufunc):
+    """Returns a recorded in-place operator."""
+    def method(self, other):
+        return ufunc(self, other, out=(self,))
+    return method
+
+# Python operators applied to scalars instead of ufunc calls, as in eager 
+# evaluation: (replay code, operator)
+_OPERATORS = {np.add: ("{} + {}", operator.add), np.subtract: ("{} - {}", operator.sub),
+              np.multiply: ("{} * {}", operator.mul), np.true_divide: ("{} / {}", operator.truediv),
+              np.power: ("{} ** {}", operator.pow), np.negative: ("-{}", operator.neg),
+              np.less: ("{} < {}", operator.lt), np.less_equal: ("{} <= {}", operator.le),
+              np.greater: ("{} > {}", operator.gt), np.greater_equal: ("{} >= {}", operator.ge),
+              np.equal: ("{} == {}", operator.eq), np.not_equal: ("{} != {}", operator.ne)}
+
+class _Traced:
+    """Array recorded onto a tape
+
+    Holds the concrete value computed while recording and the index of the
+    tape buffer that holds it during replays. Converting it to a NumPy array
+    raises a TypeError, since the conversion could not be replayed.
+    """
+
+    __slots__ = ("_tape", "_slot", "_value")
+
+    def __init__(self, tape, slot, value):
+        self._tape = tape
+        self._slot = slot
+        self._value = value
+
+    def __repr__(self):
+        return f"_Traced(slot={self._slot}, value={self._value!r})"
+
+    def __array__(self, dtype=None, copy=None):
+        raise TypeError("arrays recorded onto a tape cannot be converted to NumPy arrays")
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        return self._tape.ufunc(ufunc, method, inputs, kwargs)
+
+    def __array_function__(self, func, types, args, kwargs):
+        return self._tape.call(func, args, kwargs)
+
+    def __getitem__(self, index):
+        return self._tape.call(operator.getitem, (self, index), {})
+
+    @property
+    def shape(self):
+        return self._value.shape
+
+    @property
+    def ndim(self):
+        return self._value.ndim
+
+    @property
+    def size(self):
+        return self._value.size
+
+    @property
+    def dtype(self):
+        return self._value.dtype
+
+    @property
+    def T(self):
+        return np.transpose(self)
+
+    def __len__(self):
+        return len(self._value)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    # Conversions to Python scalars depend on values, so they are guarded
+    def __bool__(self):
+        return self._tape.guard(self, bool)
+
+    def __float__(self):
+        return self._tape.guard(self, float)
+
+    def __int__(self):
+        return self._tape.guard(self, int)
+
+    __add__, __radd__ = _ufunc(np.add), _ufunc(np.add, True)
+    __sub__, __rsub__ = _ufunc(np.subtract), _ufunc(np.subtract, True)
+    __mul__, __rmul__ = _ufunc(np.multiply), _ufunc(np.multiply, True)
+    __truediv__, __rtruediv__ = _ufunc(np.true_divide), _ufunc(np.true_divide, True)
+    __rpow__ = _ufunc(np.power, True)
+    __matmul__, __rmatmul__ = _ufunc(np.matmul), _ufunc(np.matmul, True)
+    __lt__, __le__ = _ufunc(np.less), _ufunc(np.less_equal)
+    __gt__, __ge__ = _ufunc(np.greater), _ufunc(np.greater_equal)
+    __eq__, __ne__ = _ufunc(np.equal), _ufunc(np.not_equal)
+    __and__, __or__ = _ufunc(np.logical_and), _ufunc(np.logical_or)
+    __iadd__, __isub__ = _inplace(np.add), _inplace(np.subtract)
+    __imul__, __itruediv__ = _inplace(np.multiply), _inplace(np.true_divide)
+    __hash__ = None
+
+    def __pow__(self, p):
+        if isinstance(self._value, np.ndarray) and type(p) in (int, float) and p in forward._POWERS:
+            return forward._POWERS[p](self)
+        return np.power(self, p)
+
+    def __neg__(self):
+        return np.negative(self)
+
+    def __abs__(self):
+        return np.absolute(self)
+
+    def __invert__(self):
+        return np.logical_not(self)
+
+    reshape = _method("reshape")
+    astype = _method("astype")
+    copy = _method("copy")
+    flatten = _method("flatten")
+    ravel = _method("ravel")
+    transpose = _method("transpose")
+    swapaxes = _method("swapaxes")
+    squeeze = _method("squeeze")
+    sum = _method("sum")
+    prod = _method("prod")
+    mean = _method("mean")
+    max = _method("max")
+    min = _method("min")
+    all = _method("all")
+    any = _method("any")
+    dot = _method("dot")
+    clip = _method("clip")
+
+class _Recorder:
+    """Tape under construction
+
+    Buffers are either fixed, i.e. the same array object in every replay
+    (the inputs, constants, results of ufuncs, which are written in place,
+    and views of other fixed buffers), or reassigned by the op that computes
+    them. Views of fixed buffers are taken once, while recording, instead of
+    being recorded as ops.
+    """
+
+    def __init__(self):
+        self.buffers = []
+        self.fixed = set()
+        self.ops = []
+
+    def new(self, value, fixed=True):
+        """Returns a traced array holding value in a new buffer."""
+        self.buffers.append(value)
+        slot = len(self.buffers) - 1
+        if fixed:
+            self.fixed.add(slot)
+        return _Traced(self, slot, value)
+
+    def slot(self, a):
+        """Returns the index of the buffer holding the operand a."""
+        if isinstance(a, _Traced):
+            return a._slot
+        self.buffers.append(a)
+        self.fixed.add(len(self.buffers) - 1)
+        return len(self.buffers) - 1
+
+    def ufunc(self, ufunc, method, inputs, kwargs):
+        """Records and evaluates a ufunc call."""
+        out = kwargs.pop("out", None)
+        fn = getattr(ufunc, method)
+        if any(isinstance(v, _Traced) for v in kwargs.values()) or method not in ("__call__", "reduce", "accumulate", "outer"):
+            return self.call(fn, inputs, kwargs if out is None else dict(kwargs, out=out))
+        values = [a._value if isinstance(a, _Traced) else a for a in inputs]
+        if method == "__call__":
+            fn = ufunc
+        if out is not None:
+            if not all(isinstance(o, _Traced) and o._slot in self.fixed for o in out):
+                raise TypeError("recorded ufuncs can only write into recorded arrays")
+            fn(*values, out=tuple(o._value for o in out), **kwargs)
+            self.ops.append((_UFUNC, fn, tuple(self.slot(a) for a in inputs), kwargs, tuple(o._slot for o in out)))
+            return out[0] if len(out) == 1 else out
+        if fn in _OPERATORS and not kwargs and all(np.ndim(v) == 0 for v in values):
+            result = _OPERATORS[fn][1](*values)
+        else:
+            result = fn(*values, **kwargs)
+        results = result if isinstance(result, tuple) else (result,)
+        # Scalars are cheaper to recompute than to write into 0-d buffers
+        fixed = not all(np.ndim(r) == 0 for r in results)
+        traced = tuple(self.new(r, fixed) for r in results)
+        self.ops.append((_UFUNC, fn, tuple(self.slot(a) for a in inputs), kwargs, tuple(t._slot for t in traced)))
+        return traced if isinstance(result, tuple) else traced[0]
+
+    def template(self, a, refs):
+        """Returns a copy of a (nested) argument with traced arrays replaced by
+        references to their buffers, and its concrete value; the referenced
+        slots are appended to refs."""
+        if isinstance(a, _Traced):
+            refs.append(a._slot)
+            return _Ref(a._slot), a._value
+        if type(a) in (list, tuple):
+            pairs = [self.template(item, refs) for item in a]
+            return type(a)(p[0] for p in pairs), type(a)(p[1] for p in pairs)
+        if type(a) is dict:
+            pairs = {k: self.template(v, refs) for k, v in a.items()}
+            return {k: p[0] for k, p in pairs.items()}, {k: p[1] for k, p in pairs.items()}
+        return a, a
+
+    def call(self, fn, args, kwargs):
+        """Records and evaluates a call of an array function or method."""
+        refs = []
+        args, arg_values = self.template(tuple(args), refs)
+        kwargs, kwarg_values = self.template(dict(kwargs), refs)
+        result = fn(*arg_values, **kwarg_values)
+        if isinstance(result, (np.ndarray, np.generic)):
+            if (isinstance(result, np.ndarray) and all(slot in self.fixed for slot in refs)
+                    and any(np.may_share_memory(result, self.buffers[slot]) for slot in refs)):
+                return self.new(result)
+            traced = self.new(result, fixed=False)
+            self.ops.append((_CALL, fn, args, kwargs, traced._slot))
+            return traced
+        if type(result) in (list, tuple) and result and all(isinstance(r, np.ndarray) for r in result):
+            traced = type(result)(self.new(r, fixed=False) for r in result)
+            self.ops.append((_CALL, fn, args, kwargs, tuple(t._slot for t in traced)))
+            return traced
+        # Shapes, dimensions and other static properties
+        return result
+
+    def guard(self, a, kind):
+        """Records that kind(a) takes its current value, and returns it."""
+        value = kind(a._value)
+        self.ops.append((_GUARD, kind, a._slot, None, value))
+        return value
+
+    def compile(self, out):
+        """Returns a function executing the recorded ops as straight-line
+        Python code, which returns the buffers of the slots in out.
+
+        Fixed buffers and constants are bound as globals of the function;
+        the other buffers are its local variables.
+        """
+        namespace = {"_Diverged": _Diverged}
+        def name(slot):
+            if slot in self.fixed:
+                namespace[f"b{slot}"] = self.buffers[slot]
+            return f"b{slot}"
+        def constant(value):
+            key = f"c{len(namespace)}"
+            namespace[key] = value
+            return key
+        def expr(t):
+            if type(t) is _Ref:
+                return name(t.slot)
+            if type(t) is list:
+                return "[" + ", ".join(expr(item) for item in t) + "]"
+            if type(t) is tuple:
+                return "(" + "".join(expr(item) + ", " for item in t) + ")"
+            return constant(t)
+        def keywords(kwargs):
+            return "".join(f", {k}={expr(v)}" for k, v in kwargs.items())
+        
+        lines = ["def _replay():"]
+        for code, fn, args, kwargs, result in self.ops:
+            f = constant(fn)
+            if code == _UFUNC and result[0] not in self.fixed:
+                targets = name(result[0]) if len(result) == 1 else "".join(name(slot) + ", " for slot in result)
+                if fn in _OPERATORS and not kwargs:
+                    lines.append(f"    {targets} = {_OPERATORS[fn][0].format(*[name(slot) for slot in args])}")
+                else:
+                    lines.append(f"    {targets} = {f}({''.join(name(slot) + ', ' for slot in args)}{keywords(kwargs)[2:]})")
+            elif code == _UFUNC:
+                outs = ", ".join(name(slot) for slot in result)
+                outs = outs if len(result) == 1 else f"({outs})"
+                lines.append(f"    {f}({', '.join(name(slot) for slot in args)}, out={outs}{keywords(kwargs)})")
+            elif code == _CALL:
+                targets = ", ".join(name(slot) for slot in result) if type(result) is tuple else name(result)
+                lines.append(f"    {targets} = {f}({''.join(expr(a) + ', ' for a in args)}{keywords(kwargs)[2:]})")
+            else:
+                lines.append(f"    if {f}({name(args)}) != {constant(result)}:")
+                lines.append("        raise _Diverged")
+        lines.append(f"    return {', '.join(name(slot) for slot in out)}")
+        exec("\n".join(lines), namespace)
+        return namespace["_replay"]
+
+class _Diverged(Exception):
+    """Raised when a replay reaches a guard that does not hold."""
+
+def _policies():
+    return get_dtype(), forward.get_rounding(), validation.get_validation(), forward.is_grad_enabled()
+
+# ======
+# Replay
+# ======
+
+class Tape:
+    """Recorded forward mode evaluation of a function
+
+    A tape holds the NumPy calls made by one evaluation of a function, as op
+    codes with indices into a list of buffers, compiled into straight-line
+    code that replays them at new points of the same shape. Buffers written
+    by ufuncs are allocated once, at recording time, so a replay creates no
+    forward mode variables and only allocates the results of array functions
+    such as np.where and np.stack.
+
+    Powers are recorded for constant exponents only. A power with a forward
+    mode variable as exponent builds its result with the Var constructor,
+    which converts the recorded arrays to NumPy arrays, so recording a
+    function that uses one raises a TypeError; use exp(y*log(x)) instead.
+    """
+
+    def __init__(self, f, x, v=None):
+        """Records the evaluation of f at x along the directions v.
+
+        Parameters:
+        ===========
+        - f (callable): Function of a single forward mode variable (see
+          `forward.jvp`)
+        - x (array): Point at which f is recorded
+        - v (array or None): Direction of shape x.shape, or seed matrix of
+          shape x.shape + (k,), as in `forward.jvp`; by default, all inputs
+          are seeded, so replays return the Jacobian
+
+        Returns:
+        ========
+        - Tape: Recorded evaluation of f
+        """
+        x = np.array(x, dtype=get_dtype())
+        self._f = f
+        self._v_shape = None if v is None else np.shape(v)
+        self._policies = _policies()
+        recorder = _Recorder()
+        X = recorder.new(x)
+        S = recorder.new(self._seed(x, v))
+        k = S.shape[0]
+        out = f(forward.Var._make(X, S))
+        if isinstance(out, forward.Var):
+            val, der = out._val, np.broadcast_to(out._der, (k,) + np.shape(out._val))
+        else:
+            val, der = forward._collect(out, k)
+        self._x, self._s = X._value, S._value
+        self._ops = recorder.ops
+        self._replay = recorder.compile((recorder.slot(val), recorder.slot(der)))
+        self.fallbacks = 0
+
+    def __repr__(self):
+        return f"Tape(ops={len(self._ops)}, fallbacks={self.fallbacks})"
+
+    def __len__(self):
+        """Number of recorded ops."""
+        return len(self._ops)
+
+    def _seed(self, x, v):
+        """Returns the tangent block of shape (k,) + x.shape seeded by v."""
+        if v is None:
+            return np.eye(x.size, dtype=x.dtype).reshape((x.size,) + x.shape)
+        v = np.asarray(v, dtype=x.dtype)
+        if v.ndim == x.ndim:
+            return v[np.newaxis]
+        return np.ascontiguousarray(np.moveaxis(v, -1, 0))
+
+    def _result(self, val, der):
+        """Returns the value and the derivatives in the layout of `forward.jvp`
+        (or `forward.jacobian` for a tape recorded without directions)."""
+        if self._v_shape is not None and len(self._v_shape) == self._x.ndim:
+            return val, der[0]
+        return val, np.moveaxis(der, 0, -1)
+
+    def __call__(self, x, v=None):
+        """Returns the value and derivatives of the recorded function at x.
+
+        A replay that reaches a guard that does not hold, or that runs under
+        different precision, rounding, validation or no_grad policies than
+        the recording, evaluates f again instead and increments `fallbacks`.
+
+        Parameters:
+        ===========
+        - x (array): Point of the shape the tape was recorded at
+        - v (array or None): Directions of the shape the tape was recorded
+          with; ignored for tapes recorded without directions
+
+        Returns:
+        ========
+        - (array, array): Value of f at x and J v, as returned by
+          `forward.jvp`, or the Jacobian, as returned by `forward.jacobian`,
+          for tapes recorded without directions
+        """
+        if np.shape(x) != self._x.shape:
+            raise ValueError(f"the tape was recorded at a point of shape {self._x.shape}")
+        if self._v_shape is not None and np.shape(v) != self._v_shape:
+            raise ValueError(f"the tape was recorded with directions of shape {self._v_shape}")
+        try:
+            if _policies() != self._policies:
+                raise _Diverged
+            np.copyto(self._x, x)
+            if self._v_shape is not None:
+                np.copyto(self._s, self._seed(self._x, v))
+            val, der = self._replay()
+        except _Diverged:
+            self.fallbacks += 1
+            x = np.array(x, dtype=get_dtype())
+            val, der = forward._evaluate(self._f, x, self._seed(x, v))
+            return self._result(val, der)
+        # The buffers are overwritten by the next replay
+        return self._result(np.array(val), np.array(der))
+
+def record(f, x, v=None):
+    """Records the evaluation of a forward mode function for fast replays.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single forward mode variable (see
+      `forward.jvp`)
+    - x (array): Point at which f is recorded
+    - v (array or None): Directions, as in `forward.jvp`; by default, the
+      tape returns the Jacobian
+
+    Returns:
+    ========
+    - Tape: Recorded evaluation, called as tape(x) or tape(x, v)
+
+    Example:
+    ========
+    >>> tape = record(lambda x: [x[0]*forward.sin(x[1]), x[1]**2], [1.0, 2.0])
+    >>> val, jac = tape([0.5, 1.5])
+    """
+    return Tape(f, x, v)
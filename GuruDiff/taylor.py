@@ -0,0 +1,430 @@
+from math import factorial
+
+import numpy as np
+
+from GuruDiff.forward import _in_unit_interval, _lift, _nonzero, _positive
+from GuruDiff.validation import domain
+
+class Taylor:
+    """Truncated Taylor series variable
+
+    A Taylor variable holds the coefficients c[0], ..., c[K] of the truncated
+    expansion x(t) = c[0] + c[1] t + ... + c[K] t^K along a direction, in an
+    array of shape (K+1,) + val.shape. Every operation and elementary function
+    of this module maps the coefficients of its arguments to those of its
+    result with the univariate Taylor recurrences, so propagating K orders
+    costs O(K^2) operations.
+    """
+
+    __slots__ = ("_coef",)
+
+    __array_ufunc__ = None
+
+    def __init__(self, a, da=None, order=1):
+        """Returns a Taylor variable.
+
+        Parameters:
+        ===========
+        a (int, float, or array): Function value(s)
+        da (int, float, array, or None): Direction, i.e. first order
+          coefficient(s); by default, set to 1
+        order (int): Truncation order K
+
+        Returns:
+        ========
+        Taylor: Taylor variable whose coefficients above the first are zero
+        """
+        val = np.asarray(a, dtype=float)
+        self._coef = np.zeros((order + 1,) + val.shape)
+        self._coef[0] = val
+        if order >= 1:
+            self._coef[1] = 1. if da is None else da
+
+    @classmethod
+    def _make(cls, coef):
+        """Returns a Taylor variable built directly from its coefficients."""
+        new = object.__new__(cls)
+        new._coef = coef
+        return new
+
+    def __repr__(self):
+        """Returns relevant information about a Taylor variable."""
+        return f"Function value(s):\n{self._coef[0]}\nTaylor coefficients:\n{self._coef}"
+
+    @property
+    def val(self):
+        return self._coef[0]
+
+    @property
+    def coef(self):
+        return self._coef
+
+    @property
+    def order(self):
+        return self._coef.shape[0] - 1
+
+    def derivatives(self):
+        """Returns the derivatives of orders 0 to K along the direction,
+        i.e. k! c[k]."""
+        scale = np.array([factorial(k) for k in range(self.order + 1)], dtype=float)
+        return scale.reshape((-1,) + (1,)*(self._coef.ndim - 1)) * self._coef
+
+    def __getitem__(self, index):
+        """Returns the entries of a Taylor variable selected by index."""
+        if not isinstance(index, tuple):
+            index = (index,)
+        return self._make(self._coef[(slice(None),) + index])
+
+    # ====================
+    # Operator overloading
+    # ====================
+    def __neg__(self):
+        """Returns the negative of a Taylor variable."""
+        return self._make(-self._coef)
+
+    def __add__(self, other):
+        """Returns the sum of two Taylor variables."""
+        if isinstance(other, Taylor):
+            a, b = _aligned(self, other)
+            return self._make(a + b)
+        coef = _with_constant(self._coef, other)
+        coef[0] += other
+        return self._make(coef)
+
+    def __radd__(self, other):
+        """Returns the sum of two Taylor variables."""
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        """Returns the difference between two Taylor variables."""
+        if isinstance(other, Taylor):
+            a, b = _aligned(self, other)
+            return self._make(a - b)
+        coef = _with_constant(self._coef, other)
+        coef[0] -= other
+        return self._make(coef)
+
+    def __rsub__(self, other):
+        """Returns the difference between two Taylor variables."""
+        coef = _with_constant(-self._coef, other)
+        coef[0] += other
+        return self._make(coef)
+
+    def __mul__(self, other):
+        """Returns the product of two Taylor variables (Cauchy product)."""
+        if isinstance(other, Taylor):
+            return self._make(_convolve(*_aligned(self, other)))
+        other = np.asarray(other)
+        return self._make(other*_lift(self._coef, self._coef.ndim - 1, other.ndim))
+
+    def __rmul__(self, other):
+        """Returns the product of two Taylor variables."""
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        """Returns the quotient of two Taylor variables."""
+        if isinstance(other, Taylor):
+            return self._make(_divide(*_aligned(self, other)))
+        other = np.asarray(other, dtype=float)
+        return self._make(_lift(self._coef, self._coef.ndim - 1, other.ndim)/other)
+
+    def __rtruediv__(self, other):
+        """Returns the quotient of two Taylor variables."""
+        other = np.asarray(other, dtype=float)
+        num = _with_constant(np.zeros_like(self._coef), other)
+        num[0] += other
+        return self._make(_divide(num, _lift(self._coef, self._coef.ndim - 1, other.ndim)))
+
+    def __pow__(self, p):
+        """Returns a Taylor variable raised to some power, p."""
+        if isinstance(p, Taylor):
+            return exp(p*log(self))
+        a = self._coef
+        if float(p).is_integer() and p >= 0:
+            return self._make(_integer_power(a, int(p)))
+        if not (a[0] != 0).all():
+            raise ValueError("Cannot raise zero to a non-integer or negative power")
+        y = np.empty_like(a)
+        y[0] = a[0]**p
+        for k in range(1, a.shape[0]):
+            j = _weights(1, k + 1, a.ndim)
+            y[k] = np.sum(((p + 1)*j - k) * a[1:k+1] * y[k-1::-1], axis=0) / (k*a[0])
+        return self._make(y)
+
+# ================
+# Series utilities
+# ================
+
+def _aligned(x, y):
+    """Returns the coefficients of two Taylor variables truncated to the
+    lower order and aligned for broadcasting."""
+    a, b = x._coef, y._coef
+    order = min(a.shape[0], b.shape[0])
+    a, b = a[:order], b[:order]
+    ndim = max(a.ndim, b.ndim) - 1
+    return _lift(a, a.ndim - 1, ndim), _lift(b, b.ndim - 1, ndim)
+
+def _with_constant(coef, c):
+    """Returns a copy of the coefficients broadcast against the constant c."""
+    c = np.asarray(c)
+    coef = _lift(coef, coef.ndim - 1, c.ndim)
+    return np.array(np.broadcast_to(coef, coef.shape[:1] + np.broadcast(coef[0], c).shape))
+
+def _weights(start, stop, ndim):
+    """Returns the integers start, ..., stop - 1 shaped to broadcast against
+    a block of coefficients with ndim axes."""
+    return np.arange(start, stop, dtype=float).reshape((-1,) + (1,)*(ndim - 1))
+
+def _convolve(a, b):
+    """Returns the coefficients of the product of two series."""
+    c = np.empty((a.shape[0],) + np.broadcast(a[0], b[0]).shape)
+    for k in range(a.shape[0]):
+        c[k] = np.sum(a[:k+1] * b[k::-1], axis=0)
+    return c
+
+def _divide(a, b):
+    """Returns the coefficients of the quotient of two series."""
+    c = np.empty((a.shape[0],) + np.broadcast(a[0], b[0]).shape)
+    c[0] = a[0]/b[0]
+    for k in range(1, a.shape[0]):
+        c[k] = (a[k] - np.sum(b[1:k+1] * c[k-1::-1], axis=0)) / b[0]
+    return c
+
+def _integer_power(a, p):
+    """Returns the coefficients of a series raised to a non-negative integer
+    power by repeated squaring."""
+    result = np.zeros_like(a)
+    result[0] = 1.
+    while p:
+        if p & 1:
+            result = _convolve(result, a)
+        p >>= 1
+        if p:
+            a = _convolve(a, a)
+    return result
+
+def _rate(a, w, k):
+    """Returns the k-th coefficient of y when y' = w x', i.e.
+    (1/k) sum_{j=1}^k j a_j w_{k-j}."""
+    return np.sum(_weights(1, k + 1, a.ndim) * a[1:k+1] * w[k-1::-1], axis=0) / k
+
+def _quotient_rate(a, w, y, k):
+    """Returns the k-th coefficient of y when y' w = x', given the lower
+    coefficients of y."""
+    correction = np.sum(_weights(1, k, a.ndim) * y[1:k] * w[k-1:0:-1], axis=0)
+    return (k*a[k] - correction) / (k*w[0])
+
+def _ode(a, y0, w_of, w0):
+    """Returns the coefficients of y defined by y' = w x' and y(0) = y0,
+    where w_of(y, k) gives the k-th coefficient of w from those of y."""
+    y = np.empty_like(a)
+    w = np.empty_like(a)
+    y[0], w[0] = y0, w0
+    for k in range(1, a.shape[0]):
+        y[k] = _rate(a, w, k)
+        w[k] = w_of(y, k)
+    return y
+
+def _square_term(y, k):
+    """Returns the k-th coefficient of y^2."""
+    return np.sum(y[:k+1] * y[k::-1], axis=0)
+
+def _checked(a, valid, message):
+    """Returns the coefficients of a function argument under the domain
+    validation policy (see `validation.domain`); under "nan", all
+    coefficients of out-of-domain entries are NaN."""
+    a0 = a[0]
+    v = domain(a0, valid, message)
+    return a if v is a0 else a + (v - a0)
+
+def _exp(a):
+    y = np.empty_like(a)
+    y[0] = np.exp(a[0])
+    for k in range(1, a.shape[0]):
+        y[k] = _rate(a, y, k)
+    return y
+
+def _sin_cos(a):
+    s, c = np.empty_like(a), np.empty_like(a)
+    s[0], c[0] = np.sin(a[0]), np.cos(a[0])
+    for k in range(1, a.shape[0]):
+        s[k] = _rate(a, c, k)
+        c[k] = -_rate(a, s, k)
+    return s, c
+
+def _sinh_cosh(a):
+    s, c = np.empty_like(a), np.empty_like(a)
+    s[0], c[0] = np.sinh(a[0]), np.cosh(a[0])
+    for k in range(1, a.shape[0]):
+        s[k] = _rate(a, c, k)
+        c[k] = _rate(a, s, k)
+    return s, c
+
+def _log(a):
+    y = np.empty_like(a)
+    y[0] = np.log(a[0])
+    for k in range(1, a.shape[0]):
+        y[k] = _quotient_rate(a, a, y, k)
+    return y
+
+def _sqrt(a):
+    y = np.empty_like(a)
+    y[0] = np.sqrt(a[0])
+    for k in range(1, a.shape[0]):
+        y[k] = (a[k] - np.sum(y[1:k] * y[k-1:0:-1], axis=0)) / (2*y[0])
+    return y
+
+def _arcsin_rate(a, y0):
+    """Returns the coefficients of y defined by y' = x'/sqrt(1 - x^2)."""
+    one_minus_square = -_convolve(a, a)
+    one_minus_square[0] += 1
+    w = _sqrt(one_minus_square)
+    y = np.empty_like(a)
+    y[0] = y0
+    for k in range(1, a.shape[0]):
+        y[k] = _quotient_rate(a, w, y, k)
+    return y
+
+# =======================
+# Trigonometric functions
+# =======================
+
+def sin(x):
+    """Returns the sine of a Taylor variable."""
+    return Taylor._make(_sin_cos(x._coef)[0])
+
+def cos(x):
+    """Returns the cosine of a Taylor variable."""
+    return Taylor._make(_sin_cos(x._coef)[1])
+
+def tan(x):
+    """Returns the tangent of a Taylor variable, using tan' = 1 + tan^2."""
+    a = _checked(x._coef, lambda v: np.abs(np.cos(v)) > 1e-8, "Cannot divide by zero")
+    y0 = np.tan(a[0])
+    return Taylor._make(_ode(a, y0, _square_term, 1 + y0**2))
+
+# ===============================
+# Inverse trigonometric functions
+# ===============================
+
+def arcsin(x):
+    """Returns the inverse sine of a Taylor variable."""
+    a = _checked(x._coef, _in_unit_interval, "x should be in (-1, 1) for arcsin")
+    return Taylor._make(_arcsin_rate(a, np.arcsin(a[0])))
+
+def arccos(x):
+    """Returns the inverse cosine of a Taylor variable."""
+    a = _checked(x._coef, _in_unit_interval, "x should be in (-1, 1) for arccos")
+    y = -_arcsin_rate(a, 0.)
+    y[0] = np.arccos(a[0])
+    return Taylor._make(y)
+
+def arctan(x):
+    """Returns the inverse tangent of a Taylor variable, defined for any real
+    argument, as in reverse mode."""
+    a = x._coef
+    w = _convolve(a, a)
+    w[0] += 1
+    y = np.empty_like(a)
+    y[0] = np.arctan(a[0])
+    for k in range(1, a.shape[0]):
+        y[k] = _quotient_rate(a, w, y, k)
+    return Taylor._make(y)
+
+# ==========================
+# Exponentials and logarithms
+# ==========================
+
+def exp(x, base=None):
+    """Returns the exponential of a Taylor variable; bases other than e are
+    handled as exp(x*log(base))."""
+    a = x._coef if base is None else x._coef*np.log(base)
+    return Taylor._make(_exp(a))
+
+def log(x, base=None):
+    """Returns the logarithm of a Taylor variable."""
+    a = _checked(x._coef, _nonzero, "Cannot divide by zero")
+    a = _checked(a, _positive, "Cannot take the logarithm of a negative value")
+    y = _log(a)
+    return Taylor._make(y if base is None else y/np.log(base))
+
+# ====================
+# Hyperbolic functions
+# ====================
+
+def sinh(x):
+    """Returns the hyperbolic sine of a Taylor variable."""
+    return Taylor._make(_sinh_cosh(x._coef)[0])
+
+def cosh(x):
+    """Returns the hyperbolic cosine of a Taylor variable."""
+    return Taylor._make(_sinh_cosh(x._coef)[1])
+
+def tanh(x):
+    """Returns the hyperbolic tangent of a Taylor variable, using
+    tanh' = 1 - tanh^2."""
+    a = x._coef
+    y0 = np.tanh(a[0])
+    return Taylor._make(_ode(a, y0, lambda y, k: -_square_term(y, k), 1 - y0**2))
+
+# ===========
+# Square root
+# ===========
+
+def sqrt(x):
+    """Returns the square root of a Taylor variable."""
+    a = _checked(x._coef, lambda v: v > 0, "The function value should be greater than zero.")
+    return Taylor._make(_sqrt(a))
+
+# ==================
+# Logistic function
+# ==================
+
+def logistic(x):
+    """Returns the standard logistic function of a Taylor variable, using
+    y' = y (1 - y)."""
+    a = x._coef
+    y0 = 1/(1 + np.exp(-a[0]))
+    return Taylor._make(_ode(a, y0, lambda y, k: y[k] - _square_term(y, k), y0*(1 - y0)))
+
+# ========================
+# Directional derivatives
+# ========================
+
+def taylor_coefficients(f, x, v, order):
+    """Returns the Taylor coefficients of t -> f(x + t v) at t = 0.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single Taylor variable, indexed as x[0],
+      x[1], ..., built from the functions of this module
+    - x (array): Point of shape (n,)
+    - v (array): Direction of shape (n,)
+    - order (int): Highest order K
+
+    Returns:
+    ========
+    - (array): Coefficients of shape (K+1,) + shape of f(x)
+    """
+    x = np.asarray(x, dtype=float)
+    out = f(Taylor(x, np.asarray(v, dtype=float), order))
+    if not isinstance(out, Taylor):
+        out = Taylor(out, 0., order)
+    return out._coef
+
+def directional_derivatives(f, x, v, order):
+    """Returns the derivatives of orders 0 to K of t -> f(x + t v) at t = 0.
+
+    Parameters:
+    ===========
+    - f (callable): Function of a single Taylor variable (see
+      `taylor_coefficients`)
+    - x (array): Point of shape (n,)
+    - v (array): Direction of shape (n,)
+    - order (int): Highest order K
+
+    Returns:
+    ========
+    - (array): Derivatives of shape (K+1,) + shape of f(x)
+    """
+    return Taylor._make(taylor_coefficients(f, x, v, order)).derivatives()
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+# Domain validation policy
+# ========================
+# Functions that are only defined on part of the real line check their
+# arguments: arcsin, arccos, log, sqrt and tan in forward and Taylor mode,
+# with the same rules, and arcsin and arccos in reverse mode. Forward mode
+# arctan also keeps the (-pi/2, pi/2) restriction of its original API; the
+# Taylor and reverse mode arctan accept any real. The policy controls what
+# happens:
+#   - "raise": raise a ValueError on any argument outside the domain (default)
+#   - "nan": return NaN values and derivatives for arguments outside the
+#     domain, leaving the other entries untouched
+#   - "off": skip the checks entirely and return whatever NumPy computes
+
+VALIDATION_MODES = ("raise", "nan", "off")
+
+_validation = "raise"
+
+def get_validation():
+    """Returns the current domain validation policy."""
+    return _validation
+
+def set_validation(mode):
+    """Sets the domain validation policy of the forward, Taylor and reverse
+    mode engines.
+
+    Parameters:
+    ===========
+    - mode (str): One of "raise", "nan" or "off"
+
+    Returns:
+    ========
+    - (str): The previous validation policy
+    """
+    global _validation
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"validation mode should be one of {VALIDATION_MODES}")
+    previous, _validation = _validation, mode
+    return previous
+
+@contextmanager
+def validation(mode):
+    """Context manager that temporarily sets the domain validation policy.
+
+    Example:
+    ========
+    >>> with validation("nan"):
+    ...     y = forward.log(forward.Var(np.array([-1.0, 1.0])))
+    """
+    previous = set_validation(mode)
+    try:
+        yield
+    finally:
+        set_validation(previous)
+
+def domain(v, valid, message):
+    """Returns the arguments a function should be evaluated at under the
+    domain validation policy.
+
+    Parameters:
+    ===========
+    - v (array): Arguments of the function
+    - valid (callable): Returns a boolean array that is True where v is in
+      the domain; it is not called when the policy is "off"
+    - message (str): Message of the ValueError raised under "raise"
+
+    Returns:
+    ========
+    - (array): v itself if the policy is "off" or every entry is valid;
+      otherwise, under "nan", a copy of v with NaN at invalid entries
+    """
+    if _validation == "off":
+        return v
+    ok = valid(v)
+    if ok.all():
+        return v
+    if _validation == "raise":
+        raise ValueError(message)
+    return np.where(ok, v, np.nan)
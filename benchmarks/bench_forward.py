@@ -0,0 +1,162 @@
+"""Micro-benchmarks for the forward mode engine.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_forward
+
+Each benchmark prints the mean wall time of a single call, so numbers from
+different revisions of `GuruDiff.forward` can be compared directly.
+"""
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import GuruDiff.forward as forward
+
+
+def report(name, stmt, number=100000, **namespace):
+    """Prints the mean time per call of `stmt` in microseconds."""
+    total = min(timeit.repeat(stmt, number=number, repeat=3, globals=namespace))
+    print(f"{name:<40s}{1e6*total/number:10.3f} us")
+
+
+def bench_scalar_ops():
+    """Per-operation overhead of arithmetic on scalar variables."""
+    x = forward.Var(1.5)
+    y = forward.Var(0.5, 2.0)
+    ns = dict(x=x, y=y, forward=forward)
+    report("Var(1.5)", "forward.Var(1.5)", **ns)
+    report("x + y", "x + y", **ns)
+    report("x + 3.0", "x + 3.0", **ns)
+    report("x * y", "x * y", **ns)
+    report("x / y", "x / y", **ns)
+    report("-x", "-x", **ns)
+    report("x ** 3", "x ** 3", **ns)
+    report("sin(x)", "forward.sin(x)", **ns)
+    report("exp(x)", "forward.exp(x)", **ns)
+    report("x*y + sin(x)/y - 3*x", "x*y + forward.sin(x)/y - 3*x", **ns)
+
+
+def bench_array_rounding():
+    """Elementary functions on large arrays under each rounding policy."""
+    x = forward.Var(np.linspace(0, 1, 100000))
+    ns = dict(x=x, forward=forward)
+    for mode in forward.ROUNDING_MODES:
+        with forward.rounding(mode):
+            report(f"sin(x), n=1e5, rounding={mode}", "forward.sin(x)", number=50, **ns)
+
+
+def bench_elementary():
+    """Elementary functions on arrays, and the compositions they replace."""
+    x = forward.Var(np.linspace(-1, 1, 10000))
+    ns = dict(x=x, forward=forward)
+    for name in ["exp", "sinh", "cosh", "tanh", "logistic"]:
+        report(f"{name}(x), n=1e4", f"forward.{name}(x)", number=1000, **ns)
+    report("(exp(x) - exp(-x))/2, n=1e4", "(forward.exp(x) - forward.exp(-x))/2", number=1000, **ns)
+    report("1/(1 + exp(-x)), n=1e4", "1/(1 + forward.exp(-x))", number=1000, **ns)
+
+
+def chain(x):
+    """Test function R^n -> R^n with a dense Jacobian."""
+    return forward.sin(x) * x[0] + forward.exp(x / 10) * x[-1]
+
+
+def bench_jacobian():
+    """Full Jacobians with one direction per pass versus chunked passes."""
+    x = np.linspace(0.1, 1, 200)
+    ns = dict(x=x, chain=chain, forward=forward)
+    for chunk_size in [1, 10, 50, 200]:
+        report(f"jacobian, n=200, chunk_size={chunk_size}", 
+               f"forward.jacobian(chain, x, {chunk_size})", number=5, **ns)
+
+
+def model(x):
+    """Small R^3 -> R^2 model used for point sweeps."""
+    return [x[0]*forward.sin(x[1]) + x[2]**2, forward.exp(-x[0]*x[2]) / (1 + x[1]**2)]
+
+
+def bench_batch():
+    """Jacobians at many points: Python loop versus one batched pass."""
+    X = np.random.RandomState(0).rand(100000, 3)
+    ns = dict(X=X, model=model, forward=forward)
+    report("jacobian at one point", "forward.jacobian(model, X[0])", number=1000, **ns)
+    report("batch_jacobian at all 1e5 points", "forward.batch_jacobian(model, X)", number=3, **ns)
+
+
+def bench_vararray():
+    """Assembling a 10k-output Jacobian: list of Vars versus a VarArray."""
+    t = np.linspace(0, 1, 10000)
+    p0 = np.array([1.0, 2.0, 0.5])
+
+    def legacy():
+        p = [forward.Var(p0[i], np.eye(3)[i]) for i in range(3)]
+        return forward.Var([p[0]*forward.exp(-p[1]*ti) + p[2]*ti for ti in t])
+
+    def soa():
+        p = forward.VarArray(p0)
+        return p[0]*forward.exp(-p[1]*t) + p[2]*t
+
+    report("Var([f_1, ..., f_m]), m=1e4", "legacy()", number=3, legacy=legacy)
+    report("VarArray, m=1e4", "soa()", number=100, soa=soa)
+
+
+def accumulate_inplace(x, n_terms):
+    total = forward.Var(np.zeros(x.val.shape), np.zeros(x.der.shape))
+    for i in range(n_terms):
+        total += 0.5*x
+    return total
+
+
+def accumulate(x, n_terms):
+    total = forward.Var(np.zeros(x.val.shape), np.zeros(x.der.shape))
+    for i in range(n_terms):
+        total = total + 0.5*x
+    return total
+
+
+def peak_memory(func, *args):
+    """Returns the peak memory allocated by func(*args) in MiB."""
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def bench_accumulation():
+    """Accumulation loops with in-place versus binary operators."""
+    for size in [1, 100000]:
+        x = forward.Var(np.linspace(0, 1, size), np.ones(size))
+        ns = dict(x=x, accumulate=accumulate, accumulate_inplace=accumulate_inplace)
+        report(f"total = total + 0.5*x, n={size}", "accumulate(x, 100)", number=20, **ns)
+        report(f"total += 0.5*x, n={size}", "accumulate_inplace(x, 100)", number=20, **ns)
+        print(f"{'peak memory, binary / in-place':<40s}"
+              f"{peak_memory(accumulate, x, 100):8.2f} / {peak_memory(accumulate_inplace, x, 100):.2f} MiB")
+
+
+def objective(x):
+    """Scalar objective of the kind evaluated in line searches."""
+    return forward.sin(x)*forward.exp(-x/10) + x**2/(1 + x) - forward.logistic(x)
+
+
+def bench_no_grad():
+    """Function values with derivatives versus under no_grad."""
+    for size in [1, 100000]:
+        x = np.linspace(0.1, 1, size)
+        ns = dict(x=x, objective=objective, forward=forward)
+        number = 20000 if size == 1 else 100
+        report(f"objective(Var(x)), n={size}", "objective(forward.Var(x))", number=number, **ns)
+        with forward.no_grad():
+            report(f"objective(Var(x)), no_grad, n={size}", "objective(forward.Var(x))", number=number, **ns)
+
+
+if __name__ == "__main__":
+    bench_scalar_ops()
+    bench_array_rounding()
+    bench_elementary()
+    bench_jacobian()
+    bench_batch()
+    bench_vararray()
+    bench_accumulation()
+    bench_no_grad()
@@ -0,0 +1,47 @@
+"""Hessians with the second order forward mode versus reverse-over-reverse.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_hessian
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.forward as forward
+import GuruDiff.reverse as ad
+
+
+def objective(x, n, sin, exp):
+    """Chained objective sum_i sin(x_i) * x_{i+1} + exp(x_i / n)."""
+    total = 0
+    for i in range(n - 1):
+        total = total + sin(x[i]) * x[i + 1] + exp(x[i] * (1. / n))
+    return total
+
+
+def forward_hessian(x0):
+    n = x0.size
+    return forward.hessian(lambda x: objective(x, n, forward.sin, forward.exp), x0)[2]
+
+
+def reverse_hessian(x0):
+    """Builds the gradient graph, differentiates each entry again and runs 
+    the resulting graph once."""
+    n = x0.size
+    xs = [ad.Variable(name=f"x{i}") for i in range(n)]
+    y = objective(xs, n, ad.sin_op, lambda node: ad.exp_op(node, np.e))
+    grads = ad.gradients(y, xs)
+    rows = [ad.gradients(g, xs) for g in grads]
+    executor = ad.Executor([h for row in rows for h in row])
+    values = executor.run(feed_dict={x: np.array([v]) for x, v in zip(xs, x0)})
+    return np.array(values).reshape(n, n)
+
+
+if __name__ == "__main__":
+    for n in [5, 10, 20]:
+        x0 = np.linspace(0.1, 1, n)
+        assert np.allclose(forward_hessian(x0), reverse_hessian(x0))
+        fwd = min(timeit.repeat(lambda: forward_hessian(x0), number=3, repeat=3)) / 3
+        rev = min(timeit.repeat(lambda: reverse_hessian(x0), number=1, repeat=3))
+        print(f"n={n:3d}  forward.hessian: {1e3*fwd:8.2f} ms   reverse-over-reverse: {1e3*rev:9.2f} ms")
@@ -0,0 +1,61 @@
+"""Forward sensitivity integration against a hand-written forward mode RK4
+loop.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_ode
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.forward as forward
+from GuruDiff.forward import Var
+from GuruDiff.ode import integrate
+
+
+def decay(t, y, p):
+    """Nonlinear decay with one rate per state."""
+    return -p*y + 0.1*forward.sin(y)
+
+
+def reaction_diffusion(L):
+    """Diffusion along a chain of n states with one decay rate per state."""
+    def f(t, y, p):
+        return np.dot(L, y) - p*y + 0.1*forward.sin(y)
+    return f
+
+
+def naive_rk4(f, y0, p, t):
+    """RK4 on forward mode variables of the states and parameters, with a
+    Var per stage and step."""
+    n, q = len(y0), len(p)
+    y = Var._make(np.asarray(y0, dtype=float), np.zeros((q, n)))
+    p = Var._make(np.asarray(p, dtype=float), np.eye(q))
+    states, sensitivities = [y._val], [y._der.T]
+    for j in range(len(t) - 1):
+        h = t[j + 1] - t[j]
+        k1 = f(t[j], y, p)
+        k2 = f(t[j] + h/2, y + h/2*k1, p)
+        k3 = f(t[j] + h/2, y + h/2*k2, p)
+        k4 = f(t[j] + h, y + h*k3, p)
+        y = y + h/6*(k1 + 2*k2 + 2*k3 + k4)
+        states.append(y._val)
+        sensitivities.append(y._der.T)
+    return np.array(states), np.array(sensitivities)
+
+
+if __name__ == "__main__":
+    t = np.linspace(0, 1, 101)
+    for n in [100, 300]:
+        L = (np.diag(-2*np.ones(n)) + np.diag(np.ones(n - 1), 1) + np.diag(np.ones(n - 1), -1))*10
+        y0, p = np.sin(np.linspace(0, np.pi, n)), np.linspace(0.5, 1.5, n)
+        for name, f in [("decay", decay), ("reaction-diffusion", reaction_diffusion(L))]:
+            Y, S = integrate(f, y0, p, t)
+            Y_naive, S_naive = naive_rk4(f, y0, p, t)
+            assert np.allclose(Y, Y_naive) and np.allclose(S, S_naive)
+            rk4 = min(timeit.repeat(lambda: integrate(f, y0, p, t), number=1, repeat=3))
+            naive = min(timeit.repeat(lambda: naive_rk4(f, y0, p, t), number=1, repeat=3))
+            implicit = min(timeit.repeat(lambda: integrate(f, y0, p, t, method="backward_euler"), number=1, repeat=3))
+            print(f"{name:18s} n=q={n:4d}, {len(t) - 1} steps  rk4: {1e3*rk4:8.1f} ms   "
+                  f"naive rk4: {1e3*naive:8.1f} ms   backward euler: {1e3*implicit:8.1f} ms")
@@ -0,0 +1,42 @@
+"""L-BFGS on reverse mode gradients of a model with 10^5 parameters.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_optimize
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.reverse as ad
+from GuruDiff.optimize import lbfgs
+
+
+if __name__ == "__main__":
+    n, k, m = 10**5, 50, 10
+    rng = np.random.RandomState(0)
+    A, b, w = ad.Variable("A"), ad.Variable("b"), ad.Variable("w")
+    ones_k, ones_n = ad.Variable("ones_k"), ad.Variable("ones_n")
+    # Least squares fit with a smooth log-cosh penalty on the parameters,
+    # both summed to shape (1, 1) with matrix products
+    loss = (ad.matmul_op(ones_k, (ad.matmul_op(A, w) + -1*b)**2) 
+            + ad.matmul_op(ones_n, ad.log_op(ad.cosh_op(w), np.e))*1e-2)
+    feed_dict = {A: rng.randn(k, n)*rng.rand(n)**4, b: 10*rng.randn(k, 1), 
+                 ones_k: np.ones((1, k)), ones_n: np.ones((1, n))}
+    x0 = [np.zeros((n, 1))]
+
+    minimum = lbfgs(loss, [w], x0, feed_dict=feed_dict, m=m)
+    seconds = min(timeit.repeat(lambda: lbfgs(loss, [w], x0, feed_dict=feed_dict, m=m), number=1, repeat=3))
+    print(f"n={n}: {minimum}")
+    print(f"  {1e3*seconds:.1f} ms, {1e3*seconds/minimum.evaluations:.2f} ms per evaluation")
+    print(f"  curvature pairs: {2*m*n*8/2**20:.1f} MiB (a dense Hessian would take {n*n*8/2**30:.1f} GiB)")
+
+    # One fused Executor run per line search trial, against separate value
+    # and gradient runs that repeat the forward pass
+    feed_dict[w] = np.zeros((n, 1))
+    grad, = ad.gradients(loss, [w])
+    fused = ad.Executor([loss, grad])
+    value, gradient = ad.Executor([loss]), ad.Executor([grad])
+    t_fused = min(timeit.repeat(lambda: fused.run(feed_dict), number=10, repeat=3))/10
+    t_separate = min(timeit.repeat(lambda: (value.run(feed_dict), gradient.run(feed_dict)), number=10, repeat=3))/10
+    print(f"  value and gradient: fused {1e3*t_fused:.2f} ms, separate {1e3*t_separate:.2f} ms")
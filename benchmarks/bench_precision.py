@@ -0,0 +1,48 @@
+"""Throughput and memory of float32 versus float64 on large arrays.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_precision
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.forward as forward
+import GuruDiff.precision as precision
+import GuruDiff.reverse as ad
+
+
+def f(x):
+    """Elementwise test function used by both engines."""
+    return forward.sin(x)*forward.exp(x/10) + x**2/(1 + x)
+
+
+def bench_forward(n, n_dirs):
+    for dtype in precision.DTYPES:
+        with precision.precision(dtype):
+            x = forward.Var(np.linspace(0, 1, n), np.ones((n_dirs, n)))
+            t = min(timeit.repeat(lambda: f(x), number=10, repeat=3)) / 10
+            y = f(x)
+        print(f"forward  {dtype.name:<8s} n={n:.0e} k={n_dirs}: {1e3*t:8.2f} ms   "
+              f"value + tangents: {(y.val.nbytes + y.der.nbytes)/2**20:7.1f} MiB")
+
+
+def bench_reverse(n):
+    x = ad.Variable(name="x")
+    y = ad.sin_op(x)*ad.exp_op(x/10, np.e) + ad.power_op(x, 2)/(1 + x)
+    grad_x, = ad.gradients(y, [x])
+    feed = {x: np.linspace(0, 1, n)}
+    for dtype in precision.DTYPES:
+        executor = ad.Executor([y, grad_x], dtype=dtype)
+        t = min(timeit.repeat(lambda: executor.run(feed), number=10, repeat=3)) / 10
+        nbytes = sum(v.nbytes for v in executor.run(feed))
+        print(f"reverse  {dtype.name:<8s} n={n:.0e}:     {1e3*t:8.2f} ms   "
+              f"value + gradient: {nbytes/2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    for n in [10**5, 10**6]:
+        bench_forward(n, 1)
+        bench_forward(n, 8)
+        bench_reverse(n)
@@ -0,0 +1,129 @@
+"""Repeated Executor.run calls on a large reverse mode graph.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_reverse
+"""
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import GuruDiff.reverse as ad
+
+
+def wide_graph(x, n_terms):
+    """Sum of n_terms sines, added as a balanced tree so that node names stay
+    short."""
+    nodes = [ad.sin_op(x*(1 + 1e-5*i)) for i in range(n_terms)]
+    while len(nodes) > 1:
+        nodes = [a + b for a, b in zip(nodes[::2], nodes[1::2])] + nodes[len(nodes) - len(nodes) % 2:]
+    return nodes[0]
+
+
+def interpret(executor, feed_dict):
+    """Walks the schedule node by node, as Executor.run did before plans were
+    compiled."""
+    values = dict(feed_dict)
+    for node in executor.schedule():
+        if isinstance(node.op, ad.PlaceholderOp):
+            continue
+        values[node] = node.op.compute(node, [values[i] for i in node.inputs])
+    return [values[node] for node in executor.eval_node_list]
+
+
+def deep_graph(x, depth):
+    """Chain of elementwise layers, and its gradient; every layer names its
+    input once, so that node names grow linearly."""
+    y = x
+    for _ in range(depth):
+        y = ad.tanh_op(ad.logistic_op(ad.sin_op(y)*0.9 + 0.1)*2.0)
+    return [y] + ad.gradients(y, [x])
+
+
+def activations(x, w):
+    """Elementwise layers with logistic, tanh and trigonometric activations,
+    whose gradients repeat the same subexpressions."""
+    y = x
+    for _ in range(3):
+        y = ad.logistic_op(y * w) * ad.tanh_op(y) + ad.sin_op(y) * ad.cos_op(w) + 0.5
+    return y
+
+
+def rational(x, depth):
+    """Chain of rational layers; quotients, constant factors and squares
+    become reciprocal powers, constant chains and ones in the gradients."""
+    y = x
+    for _ in range(depth):
+        z = y*2.0*0.5
+        y = z / (z**2 + 1)
+    return y
+
+
+def peak(f):
+    """Returns the peak memory traced while running f, in bytes."""
+    tracemalloc.start()
+    f()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == "__main__":
+    x = ad.Variable("x")
+    y = wide_graph(x, 33000)
+    feed_dict = {x: np.ones(4)}
+    executor = ad.Executor([y])
+    print(f"{len(ad.find_topo_sort([y]))} nodes")
+
+    sort = min(timeit.repeat(lambda: ad.find_topo_sort([y]), number=1, repeat=5))
+    first = timeit.timeit(lambda: executor.run(feed_dict), number=1)
+    run = min(timeit.repeat(lambda: executor.run(feed_dict), number=1, repeat=5))
+    walk = min(timeit.repeat(lambda: interpret(executor, feed_dict), number=1, repeat=5))
+    print(f"topological sort: {1e3*sort:7.1f} ms")
+    print(f"first run:        {1e3*first:7.1f} ms (computes the schedule and compiles the plan)")
+    print(f"later runs:       {1e3*run:7.1f} ms (compiled plan; {1e3*walk:.1f} ms walking the nodes, "
+          f"{1e3*(walk + sort):.1f} ms with a sort per run)")
+
+    # Large arrays: liveness and buffer reuse
+    nodes = deep_graph(x, 50)
+    feed_dict = {x: np.random.RandomState(0).rand(10**5)}
+    executor = ad.Executor(nodes)
+    executor.run(feed_dict)
+    retained, planned = executor.compile().peak_bytes
+    run = min(timeit.repeat(lambda: executor.run(feed_dict), number=1, repeat=3))
+    walk = min(timeit.repeat(lambda: interpret(executor, feed_dict), number=1, repeat=3))
+    print(f"\n{len(executor.schedule())} nodes on arrays of {feed_dict[x].nbytes/2**20:.1f} MiB")
+    print(f"planned peak of intermediates: {retained/2**20:8.1f} MiB retained, {planned/2**20:6.1f} MiB with liveness and reuse")
+    print(f"traced peak: {peak(lambda: interpret(executor, feed_dict))/2**20:8.1f} MiB walking the nodes, "
+          f"{peak(lambda: executor.run(feed_dict))/2**20:6.1f} MiB with the plan")
+    ad.Plan.min_pooled_bytes = np.inf
+    executor = ad.Executor(nodes)
+    executor.run(feed_dict)
+    unpooled = min(timeit.repeat(lambda: executor.run(feed_dict), number=1, repeat=3))
+    print(f"run: {1e3*walk:7.1f} ms walking the nodes, {1e3*unpooled:7.1f} ms with liveness only, "
+          f"{1e3*run:7.1f} ms with liveness and reuse")
+
+    # Simplification and common subexpressions of first and second order
+    # gradient graphs
+    w = ad.Variable("w")
+    y = activations(x, w)
+    grad_x, grad_w = ad.gradients(y, [x, w])
+    z = rational(x, 3)
+    grad_z, = ad.gradients(z, [x])
+    for order, nodes in [(1, [y, grad_x, grad_w]), (2, [y, grad_x, grad_w] + ad.gradients(grad_x, [x, w])),
+                         ("2, rational", [z, grad_z] + ad.gradients(grad_z, [x]))]:
+        stats = {}
+        merged = ad.eliminate_common_subexpressions(nodes, stats)
+        ad.optimize_graph(nodes, stats)
+        print(f"\norder {order}: {stats['nodes']} nodes, {len(ad.find_topo_sort(merged))} after elimination, "
+              f"{stats['simplify_nodes']} after simplification ({stats['simplify_rewrites']} rewrites), "
+              f"{stats['cse_nodes']} after both")
+        for size in [10, 10**5]:
+            feed_dict = {x: np.linspace(0, 1, size), w: np.linspace(1, 2, size)}
+            times = []
+            for executor in [ad.Executor(nodes), ad.Executor(merged), ad.Executor(nodes, optimize=True)]:
+                executor.run(feed_dict)
+                times.append(min(timeit.repeat(lambda: executor.run(feed_dict), number=10, repeat=5))/10)
+            print(f"  arrays of {size:6d}: {1e3*times[0]:7.2f} ms, {1e3*times[1]:7.2f} ms after elimination, "
+                  f"{1e3*times[2]:7.2f} ms after simplification and elimination")
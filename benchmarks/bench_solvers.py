@@ -0,0 +1,28 @@
+"""Newton's method versus Broyden updates with Jacobian reuse.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_solvers
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.forward as forward
+from GuruDiff.solvers import solve
+
+
+def laplacian(n):
+    """Second difference matrix on n interior points of [0, 1]."""
+    return (np.diag(-2*np.ones(n)) + np.diag(np.ones(n - 1), 1) + np.diag(np.ones(n - 1), -1))*(n + 1)**2
+
+
+if __name__ == "__main__":
+    for n in [100, 300, 1000]:
+        L = laplacian(n)
+        bratu = lambda u: np.dot(L, u) + 2*forward.exp(u)
+        for broyden in [False, True]:
+            solution = solve(bratu, np.zeros(n), tol=1e-6, broyden=broyden)
+            seconds = min(timeit.repeat(lambda: solve(bratu, np.zeros(n), tol=1e-6, broyden=broyden), number=1, repeat=3))
+            print(f"n={n:5d}  {'broyden' if broyden else 'newton ':7s}: {1e3*seconds:9.2f} ms   "
+                  f"iterations={solution.iterations:2d}  fevals={solution.fevals:2d}  jevals={solution.jevals:2d}")
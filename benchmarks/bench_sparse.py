@@ -0,0 +1,30 @@
+"""Dense versus compressed sparse Jacobians.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_sparse
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.forward as forward
+import GuruDiff.sparse as sparse
+
+
+def banded(x):
+    """Discrete Laplacian with a nonlinear term: tridiagonal Jacobian."""
+    return x[:-2] - 2*x[1:-1] + forward.sin(x[2:]) + x[1:-1]**2
+
+
+if __name__ == "__main__":
+    for n in [100, 1000, 3000]:
+        x = np.linspace(0, 1, n)
+        pattern = sparse.jacobian_sparsity(banded, x)
+        dense = min(timeit.repeat(lambda: forward.jacobian(banded, x, 100), number=1, repeat=3))
+        compressed = min(timeit.repeat(lambda: sparse.sparse_jacobian(banded, x, pattern), number=1, repeat=3))
+        tangents = min(timeit.repeat(lambda: sparse.tangent_jacobian(banded, x), number=1, repeat=3))
+        colors = sparse.color_columns(pattern).max() + 1
+        print(f"n={n:5d}  dense (chunk_size=100): {1e3*dense:9.2f} ms   "
+              f"compressed ({colors} colors): {1e3*compressed:7.2f} ms   "
+              f"sparse tangents: {1e3*tangents:7.2f} ms")
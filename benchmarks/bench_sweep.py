@@ -0,0 +1,30 @@
+"""Throughput of process-parallel parameter sweeps versus worker count.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_sweep
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.forward as forward
+from GuruDiff.sweep import default_workers, sweep
+
+
+def model(x):
+    """Damped oscillator observables, with a few dozen elementary ops."""
+    y = forward.exp(-x[0]*x[2])*forward.cos(x[1]*x[2])
+    return [y, forward.sinh(x[0])*x[1]**2 + forward.arctan(y), forward.logistic(x[0] - x[1] + x[2])]
+
+
+if __name__ == "__main__":
+    X = np.random.RandomState(0).rand(10**6, 3)
+    cores = default_workers()
+    print(f"{X.shape[0]} points, {cores} available cores")
+    for workers in range(1, cores + 1):
+        seconds = min(timeit.repeat(lambda: sweep(model, X, workers), number=1, repeat=3))
+        print(f"workers={workers:3d}: {X.shape[0]/seconds/1e6:7.2f} M points/s")
+    if cores == 1:
+        seconds = min(timeit.repeat(lambda: sweep(model, X, 2), number=1, repeat=3))
+        print(f"workers=  2: {X.shape[0]/seconds/1e6:7.2f} M points/s (oversubscribed)")
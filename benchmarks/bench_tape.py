@@ -0,0 +1,41 @@
+"""Repeated evaluation of a function: eager forward mode versus tape replays.
+
+Run from the repository root with
+
+    python -m benchmarks.bench_tape
+"""
+import timeit
+
+import numpy as np
+
+import GuruDiff.forward as forward
+import GuruDiff.tape as tape
+
+
+def model(x):
+    """Small R^3 -> R^3 model, dominated by per-operation overhead."""
+    return [x[0]*forward.sin(x[1]) + forward.log(x[2]), forward.exp(-x[0]*x[2])/(1 + x[1]**2),
+            forward.logistic(x[1]) - forward.sqrt(x[2])]
+
+
+def chain(x):
+    """Elementwise R^n -> R^n function along one direction."""
+    return forward.sin(x)*x[0] + forward.exp(x/10)*x[-1]
+
+
+def report(name, eager, replay, number):
+    t_eager = min(timeit.repeat(eager, number=number, repeat=3)) / number
+    t_replay = min(timeit.repeat(replay, number=number, repeat=3)) / number
+    print(f"{name:<32s} eager: {1e6*t_eager:9.1f} us   replay: {1e6*t_replay:9.1f} us   "
+          f"speedup: {t_eager/t_replay:4.1f}x")
+
+
+if __name__ == "__main__":
+    x = np.array([0.5, 1.2, 2.0])
+    t = tape.record(model, x)
+    report(f"jacobian, n=3 ({len(t)} ops)", lambda: forward.jacobian(model, x), lambda: t(x), 5000)
+    for n in [10, 1000, 100000]:
+        x = np.linspace(0.1, 1, n)
+        v = np.ones(n)
+        t = tape.record(chain, x, v)
+        report(f"jvp, n={n}", lambda: forward.jvp(chain, x, v), lambda: t(x, v), max(10, 100000 // n))
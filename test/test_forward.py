@@ -29,6 +29,15 @@ def test_init():
     assert np.array_equal(f.val, [4, -8]) and np.array_equal(f.der, [[4, 1, 0],[-8, -4, 0]]), "error with init"
     assert np.array_equal(g.val, [np.sin(8), -12, 2]) and np.array_equal(g.der, [[8*np.cos(8), 4*np.cos(8), 0], [-12, 0, -4], [0, 0, 0]]), "error with init"
     
+def test_make():
+    val = np.array([1.0, 2.0])
+    der = np.array([0.5, 0.0])
+    x = forward.Var._make(val, der)
+    assert isinstance(x, forward.Var), "error with make"
+    assert x.val is val and x.der is der, "error with make"
+    with pytest.raises(AttributeError):
+        x.name = "x"
+    
 def test_val():
     x = forward.Var(1, [1, 0, 0])
     y = forward.Var(2, [0, 1, 0])
@@ -237,10 +246,37 @@ def test_AD_check_tol():
     v = forward.sin(u)
     assert np.array_equal(v._val, np.sin(z)) and np.array_equal(v._der, np.cos(z)), "error with check_tol"
 
+def test_check_tol_array():
+    x = forward.Var._make(np.array([1.0 + 1e-10, 0.5, -2.0 - 1e-9]), np.array([1e-12, 0.25, 3.0]))
+    y = forward.check_tol(x)
+    assert np.array_equal(y._val, [1.0, 0.5, -2.0]) and np.array_equal(y._der, [0.0, 0.25, 3.0]), "error with check_tol"
+
+def test_rounding():
+    assert forward.get_rounding() == "on", "error with rounding"
+    with forward.rounding("off"):
+        assert forward.get_rounding() == "off", "error with rounding"
+        y = forward.sin(forward.Var(np.pi))
+        assert y._val != 0.0 and y._der == -1.0, "error with rounding"
+    assert forward.get_rounding() == "on", "error with rounding"
+    with forward.rounding("final-only"):
+        y = forward.sin(forward.Var(np.pi))
+        assert y._val != 0.0, "error with rounding"
+        y = forward.round_output(y)
+        assert y._val == 0.0 and y._der == -1.0, "error with rounding"
+    with forward.rounding("off"):
+        y = forward.round_output(forward.sin(forward.Var(np.pi)))
+        assert y._val != 0.0, "error with rounding"
+    with pytest.raises(ValueError):
+        forward.set_rounding("sometimes")
+    assert forward.get_rounding() == "on", "error with rounding"
+
 def test_exp():
     x = forward.Var([5.0])
     y = forward.exp(x, 2)
     assert np.array_equal(y._val, [32.]) and np.array_equal(y._der, [np.power(2, 5)*np.log(2)]), "error with exp"
+    u = forward.Var(5.0, 3.0)
+    v = forward.exp(u, 2)
+    assert v._val == 32. and v._der == 3*np.power(2, 5)*np.log(2), "error with exp"
 
 def test_log():
     x = forward.Var(3.0) 
@@ -343,3 +379,265 @@ def test_logistic():
     x = forward.Var(1.0)
     y = forward.logistic(x)
     assert y._val == 1/(1+np.exp(-1.0)) and y._der == np.exp(-1.0)/(1+np.exp(-1.0))**2, "error with logistic"
+    x = forward.Var(np.array([-1000.0, -2.0, 0.0, 2.0, 1000.0]), np.ones(5))
+    with np.errstate(over="ignore"):
+        y = forward.logistic(x)
+    expected = 1/(1 + np.exp(-np.array([-700.0, -2.0, 0.0, 2.0, 700.0])))
+    assert np.allclose(y._val, expected) and np.allclose(y._der, expected*(1 - expected)), "error with logistic"
+
+def test_getitem():
+    x = forward.Var([1.0, 2.0, 3.0], [4.0, 5.0, 6.0])
+    assert x[1].val == 2.0 and x[1].der == 5.0, "error with getitem"
+    x = forward.Var._make(np.array([1.0, 2.0]), np.eye(2))
+    assert x[0].val == 1.0 and np.array_equal(x[0].der, [1.0, 0.0]), "error with getitem"
+    assert np.array_equal(x[1:].val, [2.0]) and np.array_equal(x[1:].der, [[0.0], [1.0]]), "error with getitem"
+
+def test_inplace():
+    x = forward.Var(np.array([1.0, 2.0]), np.array([1.0, 0.5]))
+    total = forward.Var(np.zeros(2), np.zeros(2))
+    val_id, der_id = id(total.val), id(total.der)
+    total += 2*x
+    total -= x
+    total *= x
+    total /= x + 1
+    expected = (2*x - x)*x/(x + 1)
+    assert np.allclose(total.val, expected.val) and np.allclose(total.der, expected.der), "error with in-place operators"
+    assert id(total.val) == val_id and id(total.der) == der_id, "error with in-place operators"
+    total += 1.0
+    total *= 3.0
+    assert np.allclose(total.val, 3*(expected.val + 1)) and np.allclose(total.der, 3*expected.der), "error with in-place operators"
+
+    # Copy-on-write: buffers shared with other variables are never modified
+    y = x + 1.0
+    y *= 2.0
+    assert np.array_equal(x.der, [1.0, 0.5]), "error with in-place operators"
+    z = x[0]
+    z += 1.0
+    assert np.array_equal(x.val, [1.0, 2.0]), "error with in-place operators"
+    w = x
+    w *= w
+    assert np.array_equal(x.val, [1.0, 2.0]) and np.array_equal(w.val, [1.0, 4.0]), "error with in-place operators"
+
+    # Variables bound to several names are never modified
+    x = forward.Var(np.array([1.0, 2.0, 3.0]))
+    total = x
+    for _ in range(3):
+        total += x*1.0
+    assert np.array_equal(x.val, [1.0, 2.0, 3.0]) and np.array_equal(x.der, [1.0, 1.0, 1.0]), "error with in-place operators"
+    assert np.array_equal(total.val, [4.0, 8.0, 12.0]) and np.array_equal(total.der, [4.0, 4.0, 4.0]), "error with in-place operators"
+    a = forward.Var(np.ones(3))
+    b = a
+    a += 1
+    a *= forward.Var(np.ones(3))
+    assert np.array_equal(b.val, np.ones(3)) and np.array_equal(b.der, np.ones(3)), "error with in-place operators"
+    assert np.array_equal(a.val, [2.0, 2.0, 2.0]) and np.array_equal(a.der, [3.0, 3.0, 3.0]), "error with in-place operators"
+    held = [a]
+    a /= 2.0
+    assert np.array_equal(held[0].val, [2.0, 2.0, 2.0]) and a is not held[0], "error with in-place operators"
+
+    # Results of a larger shape fall back to the binary operators
+    s = forward.Var(1.0)
+    s *= forward.Var(np.array([1.0, 2.0]), np.array([0.0, 1.0]))
+    assert np.array_equal(s.val, [1.0, 2.0]) and np.array_equal(s.der, [1.0, 3.0]), "error with in-place operators"
+
+    # Vector mode
+    x = forward.Var._make(np.array([1.0, 2.0]), np.eye(2))
+    total = forward.Var._make(np.zeros(2), np.zeros((2, 2)))
+    total += x*x
+    total *= x[0]
+    total /= x[1]
+    expected = x*x*x[0]/x[1]
+    assert np.allclose(total.val, expected.val) and np.allclose(total.der, expected.der), "error with in-place operators"
+
+def test_vararray():
+    x = forward.VarArray([1.0, 2.0, 3.0])
+    assert len(x) == 3 and x.shape == (3,) and np.array_equal(x.jac, np.eye(3)), "error with VarArray"
+    y = forward.sin(x)*x[0] + 2/x - x[1]
+    expected = np.diag(np.cos(x.val) - 2/x.val**2) + np.outer(np.sin(x.val), [1, 0, 0]) - np.outer(np.ones(3), [0, 1, 0])
+    assert isinstance(y, forward.VarArray) and np.allclose(y.jac, expected), "error with VarArray"
+    z = x[0] - x
+    assert isinstance(z, forward.VarArray) and np.array_equal(z.jac, [[0, 0, 0], [1, -1, 0], [1, 0, -1]]), "error with VarArray"
+    assert isinstance(x[1], forward.Var) and not isinstance(x[1], forward.VarArray), "error with VarArray"
+    assert x[1].val == 2.0 and np.array_equal(x[1].der, [0, 1, 0]), "error with VarArray"
+    assert np.array_equal(x[1:].jac, [[0, 1, 0], [0, 0, 1]]), "error with VarArray"
+
+    w = forward.VarArray.concatenate([y, 3*x[1:]])
+    assert w.shape == (5,) and np.allclose(w.jac[:3], expected) and np.array_equal(w.jac[3:], [[0, 3, 0], [0, 0, 3]]), "error with VarArray"
+    s = forward.VarArray.stack([x[0]*x[1], 3.0, forward.exp(x[2])])
+    assert np.allclose(s.val, [2.0, 3.0, np.exp(3.0)]), "error with VarArray"
+    assert np.allclose(s.jac, [[2.0, 1.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, np.exp(3.0)]]), "error with VarArray"
+    a = forward.VarArray([1.0, 2.0], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    assert np.array_equal(a.jac, [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]) and np.array_equal(a.der, [[1.0, 4.0], [2.0, 5.0], [3.0, 6.0]]), "error with VarArray"
+
+def test_vector_mode_broadcasting():
+    x = forward.Var._make(np.array([1.0, 2.0]), np.eye(2))
+    y = forward.exp(x) * x[0] + np.array([1.0, 2.0]) * x[1]
+    assert np.allclose(y.val, [np.e + 2, np.exp(2) + 4]), "error with vector mode"
+    assert np.allclose(y.der, [[2*np.e, np.exp(2)], [1.0, np.exp(2) + 2]]), "error with vector mode"
+
+def test_jvp():
+    f = lambda x: [x[0]*x[1], forward.sin(x[0]), 2.0]
+    val, tangent = forward.jvp(f, [1.0, 2.0], [1.0, 0.0])
+    assert np.array_equal(val, [2.0, np.sin(1.0), 2.0]), "error with jvp"
+    assert np.allclose(tangent, [2.0, np.cos(1.0), 0.0]), "error with jvp"
+    val, tangent = forward.jvp(f, [1.0, 2.0], [[1.0, 1.0], [0.0, -1.0]])
+    assert tangent.shape == (3, 2), "error with jvp"
+    assert np.allclose(tangent, [[2.0, 1.0], [np.cos(1.0), np.cos(1.0)], [0.0, 0.0]]), "error with jvp"
+
+def test_jacobian():
+    f = lambda x: [x[0]**2 * x[2], x[1] / x[0], forward.log(x[2])]
+    x = np.array([1.0, 2.0, 3.0])
+    expected = [[6.0, 0.0, 1.0], [-2.0, 1.0, 0.0], [0.0, 0.0, 1/3]]
+    val, jac = forward.jacobian(f, x)
+    assert np.allclose(val, [3.0, 2.0, np.log(3.0)]) and np.allclose(jac, expected), "error with jacobian"
+    for chunk_size in [1, 2, 5]:
+        assert np.allclose(forward.jacobian(f, x, chunk_size)[1], expected), "error with jacobian"
+    val, grad = forward.jacobian(lambda x: x[0]**2 + x[1], [3.0, 4.0])
+    assert val == 13.0 and np.array_equal(grad, [6.0, 1.0]), "error with jacobian"
+    with pytest.raises(ValueError):
+        forward.jacobian(f, x, 0)
+
+def test_sparse_tangent():
+    x0 = np.linspace(0.1, 1.0, 20)
+    f = lambda x: forward.sin(x[1:])*x[:-1] + forward.exp(x[1:]/10) - x[1:]**2/x[:-1] + x[0]
+    y = f(forward.Var._make(x0, forward.SparseTangent.identity(x0.shape)))
+    assert isinstance(y.der, forward.SparseTangent) and y.der.shape == (20, 19), "error with SparseTangent"
+    assert np.allclose(np.asarray(y.der), forward.jvp(f, x0, np.eye(20))[1].T), "error with SparseTangent"
+    entries, inputs, data = y.der.triplets()
+    assert len(data) == 19*3 - 1, "error with SparseTangent"
+
+    # Lists of sparse and constant outputs
+    g = lambda x: [x[0]*x[1], 3.0, forward.tan(x[2]) + x[0], x[3]*2.0]
+    val, der = forward._collect(g(forward.Var._make(x0[:4], forward.SparseTangent.identity((4,)))), 4)
+    assert np.allclose(np.asarray(der), forward._collect(g(forward.Var._make(x0[:4], np.eye(4))), 4)[1]), "error with SparseTangent"
+
+    x = forward.Var._make(x0, forward.SparseTangent.identity(x0.shape))
+    y = x[0]*np.ones(5) + x[:5]
+    expected = np.eye(20, 5)
+    expected[0] += 1
+    assert np.array_equal(np.asarray(y.der), expected), "error with SparseTangent"
+
+    # Dense storage above the density threshold
+    x = forward.Var._make(x0, forward.SparseTangent.identity(x0.shape))
+    s = x[0:2]
+    for i in range(1, 10):
+        s = s + x[2*i:2*i+2]
+    assert isinstance(s.der, np.ndarray) and np.array_equal(s.der, np.tile(np.eye(2), 10).T), "error with SparseTangent"
+
+def test_numpy_protocol():
+    x = forward.Var(np.array([0.2, 0.5, 0.7]))
+    for ufunc, function in [(np.sin, forward.sin), (np.exp, forward.exp), (np.log, forward.log), 
+                            (np.sqrt, forward.sqrt), (np.tanh, forward.tanh), (np.arctan, forward.arctan)]:
+        assert ufunc(x) == function(x), "error with " + ufunc.__name__
+    assert np.log10(x) == forward.log(x, 10) and np.power(2.0, x) == forward.exp(x, 2), "error with ufuncs"
+    a = np.array([1.0, 2.0, 3.0])
+    assert a*x == x*a and a - x == -(x - a) and a/x == x.__rtruediv__(a) and np.power(x, 3) == x**3, "error with ufuncs"
+    with pytest.raises(TypeError):
+        np.cumsum(x)
+    # Array bases, of the shape of x or broadcasting against it
+    y = np.power(a, x)
+    assert np.allclose(y.val, a**x.val) and np.allclose(y.der, a**x.val*np.log(a)), "error with ufuncs"
+    y = a.reshape(3, 1)**x
+    assert y.val.shape == y.der.shape == (3, 3), "error with ufuncs"
+    assert np.allclose(y.der, a.reshape(3, 1)**x.val*np.log(a).reshape(3, 1)), "error with ufuncs"
+    
+    v = forward.Var(np.array([0.2, 0.5, 0.7]), np.eye(3))
+    assert np.isclose(np.sum(v).val, 1.4) and np.array_equal(np.sum(v).der, np.ones(3)), "error with sum"
+    assert np.allclose(np.mean(x).der, 1.0), "error with mean"
+    A = np.arange(6.0).reshape(2, 3)
+    y = np.dot(A, v)
+    assert np.allclose(y.val, A @ v.val) and np.array_equal(y.der, A.T), "error with dot"
+    y = np.dot(v, v)
+    assert np.isclose(y.val, 0.78) and np.allclose(y.der, 2*v.val), "error with dot"
+    y = np.stack([v, 2*v, np.ones(3)], axis=1)
+    assert y.val.shape == (3, 3) and np.array_equal(y.der[:, :, 1], 2*np.eye(3)), "error with stack"
+    assert not y.der[:, :, 2].any() and np.shape(y) == (3, 3), "error with stack"
+    
+    f = lambda x: np.sum(np.exp(x) * np.dot(np.ones((3, 3)), x))
+    val, J = forward.jacobian(f, v.val)
+    assert np.allclose(J, np.exp(v.val)*np.sum(v.val) + np.sum(np.exp(v.val))), "error with jacobian"
+
+def test_no_grad():
+    f = lambda x: forward.sin(x)*forward.exp(x/10) + x**2/(1 + x) - forward.logistic(x) + forward.log(x + 2, 10)
+    x = np.linspace(0.0, 1.0, 5)
+    assert forward.is_grad_enabled()
+    with forward.no_grad():
+        assert not forward.is_grad_enabled()
+        y = f(forward.Var(x))
+        z = 2.0 - forward.VarArray(x)[1:]/3 + np.sum(forward.Var(x)**0.5)
+        h = forward.sin(forward.HyperDual(0.3))
+    assert forward.is_grad_enabled()
+    assert y.der is None and np.array_equal(y.val, f(forward.Var(x)).val), "error with no_grad"
+    assert isinstance(z, forward.VarArray) and z.der is None, "error with no_grad"
+    assert np.allclose(z.val, 2.0 - x[1:]/3 + np.sum(np.sqrt(x))), "error with no_grad"
+    assert np.isclose(h.hes[0, 0], -np.sin(0.3)), "error with no_grad"
+    previous = forward.set_grad_enabled(False)
+    assert previous and forward.Var(1.0).der is None
+    forward.set_grad_enabled(previous)
+
+def test_batch_jacobian():
+    f = lambda x: [x[0]*x[1], forward.sin(x[0]) + x[2]**2, 3.0]
+    X = np.linspace(0.1, 2, 12).reshape(4, 3)
+    vals, jacs = forward.batch_jacobian(f, X)
+    assert vals.shape == (4, 3) and jacs.shape == (4, 3, 3), "error with batch_jacobian"
+    for b in range(4):
+        val, jac = forward.jacobian(f, X[b])
+        assert np.allclose(vals[b], val) and np.allclose(jacs[b], jac), "error with batch_jacobian"
+    assert np.allclose(forward.batch_jacobian(f, X, chunk_size=2)[1], jacs), "error with batch_jacobian"
+    vals, grads = forward.batch_jacobian(lambda x: x[0]**2 * x[1], [[1.0, 2.0], [3.0, 4.0]])
+    assert np.array_equal(vals, [2.0, 36.0]) and np.array_equal(grads, [[4.0, 1.0], [24.0, 9.0]]), "error with batch_jacobian"
+
+def test_batch_jvp():
+    f = lambda x: [x[0]*x[1], forward.exp(x[1])]
+    X = np.array([[1.0, 2.0], [3.0, 0.0], [-1.0, 1.0]])
+    jacs = forward.batch_jacobian(f, X)[1]
+    vals, tangents = forward.batch_jvp(f, X, [1.0, -1.0])
+    assert np.allclose(vals, [[2.0, np.exp(2)], [0.0, 1.0], [-1.0, np.e]]), "error with batch_jvp"
+    assert np.allclose(tangents, jacs @ [1.0, -1.0]), "error with batch_jvp"
+    tangents = forward.batch_jvp(f, X, X)[1]
+    assert np.allclose(tangents, np.einsum("bmn,bn->bm", jacs, X)), "error with batch_jvp"
+
+def test_hyperdual():
+    x = forward.HyperDual(2.0)
+    assert x.val == 2.0 and np.array_equal(x.der, [1.0]) and x.tan is x.der and np.array_equal(x.hes, [[0.0]]), "error with HyperDual"
+    y = 3 / x**2 - x*x/4 + (1 - x)
+    assert y.val == 3/4 - 1 - 1, "error with HyperDual"
+    assert np.allclose(y.der, [-6/8 - 1 - 1]) and np.allclose(y.hes, [[18/16 - 0.5]]), "error with HyperDual"
+    for name, d2 in [("sin", -np.sin(0.3)), ("cos", -np.cos(0.3)), ("exp", np.exp(0.3)), ("log", -1/0.09),
+                     ("sqrt", -0.25*0.3**-1.5), ("arctan", -0.6/1.09**2), ("tanh", -2*np.tanh(0.3)/np.cosh(0.3)**2),
+                     ("sinh", np.sinh(0.3)), ("cosh", np.cosh(0.3)), ("logistic", np.exp(-0.3)*(np.exp(-0.3) - 1)/(1 + np.exp(-0.3))**3)]:
+        y = getattr(forward, name)(forward.HyperDual(0.3))
+        assert abs(y.hes[0, 0] - d2) < 1e-10, "error with HyperDual " + name
+    y = forward.HyperDual([1.0, 2.0], np.eye(2))[1]
+    assert y.val == 2.0 and np.array_equal(y.der, [0.0, 1.0]) and y.hes.shape == (2, 2), "error with HyperDual"
+
+def test_hessian():
+    f = lambda x: x[0]**2 * x[1] + forward.sin(x[0]) * forward.exp(x[1]) + forward.log(x[1]) / x[0]
+    a, b = 0.7, 1.3
+    val, grad, hess = forward.hessian(f, [a, b])
+    expected_grad = [2*a*b + np.cos(a)*np.exp(b) - np.log(b)/a**2, a**2 + np.sin(a)*np.exp(b) + 1/(a*b)]
+    expected_hess = [[2*b - np.sin(a)*np.exp(b) + 2*np.log(b)/a**3, 2*a + np.cos(a)*np.exp(b) - 1/(a**2*b)],
+                     [2*a + np.cos(a)*np.exp(b) - 1/(a**2*b), np.sin(a)*np.exp(b) - 1/(a*b**2)]]
+    assert np.isclose(val, a**2*b + np.sin(a)*np.exp(b) + np.log(b)/a), "error with hessian"
+    assert np.allclose(grad, expected_grad) and np.allclose(hess, expected_hess), "error with hessian"
+    val, grad, hess = forward.hessian(lambda x: x * x[0], [2.0, 3.0])
+    assert np.array_equal(val, [4.0, 6.0]) and np.array_equal(grad, [[4.0, 0.0], [3.0, 2.0]]), "error with hessian"
+    assert np.array_equal(hess, [[[2.0, 0.0], [0.0, 0.0]], [[0.0, 1.0], [1.0, 0.0]]]), "error with hessian"
+    # Constant bases and NumPy ufuncs, as accepted by jacobian
+    f = lambda x: 2**x[0] * np.sin(x[1]) + np.exp(x[0]*x[1]) + np.power(np.array([3.0, 4.0]), x)[0] + np.square(x[1])
+    a, b = 0.5, 1.5
+    val, grad, hess = forward.hessian(f, [a, b])
+    assert np.allclose(grad, forward.jacobian(f, [a, b])[1]), "error with hessian"
+    cross = np.log(2)*2**a*np.cos(b) + (1 + a*b)*np.exp(a*b)
+    expected_hess = [[np.log(2)**2*2**a*np.sin(b) + b**2*np.exp(a*b) + np.log(3)**2*3**a, cross],
+                     [cross, -2**a*np.sin(b) + a**2*np.exp(a*b) + 2]]
+    assert np.allclose(hess, expected_hess), "error with hessian"
+
+def test_hvp():
+    f = lambda x: forward.logistic(x[0]*x[1]) + x[2]**3 * forward.cos(x[0]) - forward.sqrt(x[1] + x[2])
+    x = np.array([0.5, 1.5, 2.0])
+    v = np.array([1.0, -2.0, 0.5])
+    val, grad, hess = forward.hessian(f, x)
+    hv_val, hv_grad, hv = forward.hvp(f, x, v)
+    assert val == hv_val and np.allclose(grad, hv_grad), "error with hvp"
+    assert np.allclose(hv, hess @ v), "error with hvp"
@@ -0,0 +1,29 @@
+from GuruDiff.ode import integrate
+import numpy as np
+import pytest
+
+def decay(t, y, p):
+    return -p[0]*y
+
+def lotka_volterra(t, y, p):
+    return [p[0]*y[0] - p[1]*y[0]*y[1], -p[2]*y[1] + p[3]*y[0]*y[1]]
+
+def test_integrate():
+    t = np.linspace(0, 1, 101)
+    Y, dYdp = integrate(decay, [1.0], [0.5], t)
+    assert np.allclose(Y[:, 0], np.exp(-0.5*t)) and np.allclose(dYdp[:, 0, 0], -t*np.exp(-0.5*t)), "error with rk4"
+    Y, dYdp = integrate(decay, [1.0], [0.5], t, method="backward_euler")
+    assert np.allclose(Y[:, 0], np.exp(-0.5*t), atol=5e-3) and np.allclose(dYdp[:, 0, 0], -t*np.exp(-0.5*t), atol=5e-3)
+
+    # Sensitivities are the derivatives of the discrete solution
+    p, y0, t = np.array([1.0, 0.5, 1.0, 0.3]), [2.0, 1.0], np.linspace(0, 5, 101)
+    for method in ["rk4", "backward_euler"]:
+        Y, dYdp = integrate(lotka_volterra, y0, p, t, method=method)
+        assert Y.shape == (101, 2) and dYdp.shape == (101, 2, 4)
+        for i, e in enumerate(np.eye(4)*1e-6):
+            fd = (integrate(lotka_volterra, y0, p + e, t, method=method)[0] 
+                  - integrate(lotka_volterra, y0, p - e, t, method=method)[0])/2e-6
+            assert np.allclose(dYdp[..., i], fd, atol=1e-6), "error with " + method
+
+    with pytest.raises(ValueError):
+        integrate(decay, [1.0], [0.5], t, method="euler")
@@ -0,0 +1,20 @@
+import GuruDiff.reverse as ad
+from GuruDiff.optimize import lbfgs
+import numpy as np
+
+def test_lbfgs():
+    # Rosenbrock function of two variable nodes
+    x, y = ad.Variable("x"), ad.Variable("y")
+    f = 100*(y + -1*x**2)**2 + (1 - x)**2
+    minimum = lbfgs(f, [x, y], [np.array([-1.2]), np.array([1.0])], m=5)
+    assert minimum.converged and np.allclose(minimum.x, 1.0), "error with lbfgs"
+    assert minimum.evaluations < 100 and np.max(np.abs(minimum.grad)) <= 1e-6
+
+    # Least squares, with the data fed as fixed variables
+    rng = np.random.RandomState(0)
+    A_val, b_val = rng.randn(50, 20), rng.randn(50, 1)
+    A, b, w = ad.Variable("A"), ad.Variable("b"), ad.Variable("w")
+    loss = (ad.matmul_op(A, w) + -1*b)**2
+    minimum = lbfgs(loss, [w], [np.zeros((20, 1))], feed_dict={A: A_val, b: b_val}, ftol=0)
+    assert minimum.converged and minimum.x[0].shape == (20, 1)
+    assert np.allclose(minimum.x[0], np.linalg.lstsq(A_val, b_val, rcond=None)[0]), "error with lbfgs"
@@ -0,0 +1,55 @@
+import GuruDiff.forward as forward
+import GuruDiff.precision as precision
+import GuruDiff.reverse as ad
+import numpy as np
+import pytest
+
+def test_set_dtype():
+    assert precision.get_dtype() == np.float64
+    previous = precision.set_dtype("float32")
+    assert previous == np.float64 and precision.get_dtype() == np.float32
+    precision.set_dtype(previous)
+    with pytest.raises(ValueError):
+        precision.set_dtype(np.int32)
+    with precision.precision(np.float32):
+        assert precision.get_dtype() == np.float32
+    assert precision.get_dtype() == np.float64
+
+def test_forward_precision():
+    functions = [forward.sin, forward.cos, forward.tan, forward.arctan, forward.exp, forward.log,
+                 forward.sqrt, forward.sinh, forward.cosh, forward.tanh, forward.logistic,
+                 lambda x: forward.arcsin(x/2), lambda x: forward.arccos(x/2),
+                 lambda x: forward.exp(x, 2), lambda x: forward.log(x, 10),
+                 lambda x: x**3 - 2/x + x*x/3]
+    with precision.precision(np.float32):
+        x = forward.Var(np.linspace(0.1, 0.9, 5))
+        h = forward.HyperDual([0.2, 0.7])
+        p = forward.VarArray([0.3, 0.6])
+    assert x.val.dtype == x.der.dtype == np.float32, "error with float32 Var"
+    for f in functions:
+        y = f(x)
+        assert y.val.dtype == y.der.dtype == np.float32, "error with float32 Var"
+        z = f(h)
+        assert z.val.dtype == z.der.dtype == z.hes.dtype == np.float32, "error with float32 HyperDual"
+        w = f(p)
+        assert w.val.dtype == w.jac.dtype == np.float32, "error with float32 VarArray"
+    y = forward.Var(np.linspace(0.1, 0.9, 5), dtype=np.float32)
+    assert y.val.dtype == np.float32 and forward.Var(1.0).val.dtype == np.float64, "error with per Var dtype"
+    with precision.precision(np.float32):
+        val, J = forward.jacobian(lambda x: forward.sin(x)*x[0], np.ones(3))
+        val, grad, H = forward.hessian(lambda x: x[0]**2*x[1], np.ones(2))
+    assert J.dtype == H.dtype == np.float32, "error with float32 jacobian"
+    assert np.allclose(J, forward.jacobian(lambda x: forward.sin(x)*x[0], np.ones(3))[1], atol=1e-6)
+
+def test_reverse_precision():
+    x = ad.Variable(name="x")
+    y = ad.sin_op(x)*ad.exp_op(x, np.e) + ad.log_op(x, np.e)/x + ad.power_op(x, 3) + ad.arcsin_op(x*0.5)
+    grad_x, = ad.gradients(y, [x])
+    feed = {x: np.linspace(0.1, 0.9, 5)}
+    y32, g32 = ad.Executor([y, grad_x], dtype=np.float32).run(feed)
+    y64, g64 = ad.Executor([y, grad_x]).run(feed)
+    assert y32.dtype == g32.dtype == np.float32 and g64.dtype == np.float64, "error with float32 Executor"
+    assert np.allclose(y32, y64, rtol=1e-5) and np.allclose(g32, g64, rtol=1e-5), "error with float32 Executor"
+    with precision.precision(np.float32):
+        y32, g32 = ad.Executor([y, grad_x]).run(feed)
+    assert y32.dtype == g32.dtype == np.float32, "error with float32 policy"
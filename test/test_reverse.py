@@ -375,4 +375,179 @@ def test_ne_const_node():
 
     y_val = executor.run(feed_dict = {x2 : x2_val})
 
-    assert np.array_equal(y_val[0], x2_val!=2)
\ No newline at end of file
+    assert np.array_equal(y_val[0], x2_val!=2)
+def test_deep_graph():
+    x2 = ad.Variable(name = "x2")
+    y = x2
+    for _ in range(3000):
+        y = y*0.999 + 0.001
+
+    grad_x2, = ad.gradients(y, [x2])
+
+    executor = ad.Executor([y, grad_x2])
+    x2_val = 2 * np.ones(3)
+    y_val, grad_x2_val = executor.run(feed_dict = {x2 : x2_val})
+
+    assert np.allclose(y_val, 1 + 0.999**3000)
+    assert np.allclose(grad_x2_val, 0.999**3000)
+
+def test_cached_schedule(monkeypatch):
+    x2 = ad.Variable(name = "x2")
+    y = ad.sin_op(x2) * x2
+    grad_x2, = ad.gradients(y, [x2])
+
+    sorts = []
+    find_topo_sort = ad.find_topo_sort
+    monkeypatch.setattr(ad, "find_topo_sort", lambda nodes: sorts.append(nodes) or find_topo_sort(nodes))
+    executor = ad.Executor([y])
+    x2_val = 2 * np.ones(3)
+    for _ in range(3):
+        y_val, = executor.run(feed_dict = {x2 : x2_val})
+    assert len(sorts) == 1
+
+    executor.eval_node_list = [y, grad_x2]
+    y_val, grad_x2_val = executor.run(feed_dict = {x2 : x2_val})
+    assert len(sorts) == 2
+    assert np.array_equal(grad_x2_val, np.cos(x2_val)*x2_val + np.sin(x2_val))
+
+    executor.invalidate()
+    executor.run(feed_dict = {x2 : x2_val})
+    assert len(sorts) == 3
+
+def interpret(nodes, feed_dict):
+    """Evaluates nodes by calling Op.compute on each node."""
+    values = dict(feed_dict)
+    for node in ad.find_topo_sort(nodes):
+        if node not in values:
+            values[node] = node.op.compute(node, [values[i] for i in node.inputs])
+    return [values[node] for node in nodes]
+
+class FmaOp(ad.Op):
+    """Op with three inputs, which compiled plans run by the default kernel."""
+    def __call__(self, node_A, node_B, node_C):
+        new_node = ad.Op.__call__(self)
+        new_node.inputs = [node_A, node_B, node_C]
+        new_node.name = "fma(%s,%s,%s)" % (node_A.name, node_B.name, node_C.name)
+        return new_node
+
+    def compute(self, node, input_vals):
+        assert len(input_vals) == 3
+        return input_vals[0] * input_vals[1] + input_vals[2]
+
+def test_compiled_plan():
+    x2 = ad.Variable(name = "x2")
+    x3 = ad.Variable(name = "x3")
+    A = ad.Variable(name = "A")
+    y = (ad.tan_op(x2) + ad.sinh_op(x3) * ad.cosh_op(x2) - ad.tanh_op(x3) / 3 + ad.arcsin_op(x2 / 4)
+         + ad.arccos_op(x3 / 4) + ad.arctan_op(x2) + ad.exp_op(x3, 2) + ad.log_op(x2, 10) + ad.logistic_op(x3)
+         + x2**3 + ad.matmul_op(A, x3, True, False) + ad.matmul_op(A, x3) + ad.oneslike_op(x2) - ad.zeroslike_op(x3))
+    nodes = [y] + ad.gradients(y, [x2, x3])
+    feed_dict = {x2: np.array([[0.5], [1.5]]), x3: np.array([[-0.3], [0.2]]), A: np.array([[1., 2.], [3., 4.]])}
+
+    executor = ad.Executor(nodes)
+    assert len(executor.compile()) == len(executor.schedule()) - 3
+    for value, expected in zip(executor.run(feed_dict), interpret(nodes, feed_dict)):
+        assert np.array_equal(value, expected)
+
+    y = FmaOp()(x2, x3, ad.sin_op(x2))
+    executor = ad.Executor([y])
+    y_val, = executor.run(feed_dict)
+    assert executor.compile().general
+    assert np.array_equal(y_val, feed_dict[x2] * feed_dict[x3] + np.sin(feed_dict[x2]))
+
+def test_memory_plan():
+    x2 = ad.Variable(name = "x2")
+    x3 = ad.Variable(name = "x3")
+    y = x2
+    for _ in range(3):
+        y = ad.tanh_op(ad.logistic_op(y) * ad.log_op(x3, np.e) + ad.tan_op(y)**2 - ad.arcsin_op(ad.logistic_op(y) / 2)**0.5 * 3
+                       + ad.exp_op(ad.cos_op(y), 2)**-1 + y**3 + ad.oneslike_op(y) + ad.sinh_op(y) + ad.arccos_op(y / 2))
+    nodes = [y] + ad.gradients(y, [x2, x3])
+    rng = np.random.RandomState(0)
+    feed_dict = {x2: rng.rand(20000), x3: 1 + rng.rand(20000)}
+
+    executor = ad.Executor(nodes)
+    expected = interpret(nodes, feed_dict)
+    first = executor.run(feed_dict)
+    kept = [value.copy() for value in first]
+    for _ in range(2):
+        for value, expected_value in zip(executor.run(feed_dict), expected):
+            assert np.array_equal(value, expected_value)
+    for value, kept_value in zip(first, kept):
+        assert np.array_equal(value, kept_value)
+
+    retained, planned = executor.compile().peak_bytes
+    assert planned < retained / 4
+
+    # Other shapes are profiled again
+    y_val, _, _ = executor.run({x2: feed_dict[x2][:10], x3: feed_dict[x3][:10]})
+    assert np.array_equal(y_val, expected[0][:10])
+
+def test_common_subexpressions():
+    x2 = ad.Variable(name = "x2")
+    x3 = ad.Variable(name = "x3")
+    y = ad.logistic_op(x2) * ad.tanh_op(x3) + ad.sin_op(x2) * ad.cos_op(x3) + x2 * x3 + x3 * x2
+    grads = ad.gradients(y, [x2, x3])
+    second = ad.gradients(grads[0], [x2, x3])
+    feed_dict = {x2: np.linspace(-1, 1, 5), x3: np.linspace(0, 2, 5)}
+
+    for nodes in [[y] + grads, [y] + grads + second]:
+        inputs = {id(node): list(node.inputs) for node in ad.find_topo_sort(nodes)}
+        stats = {}
+        merged = ad.eliminate_common_subexpressions(nodes, stats)
+        assert stats["cse_eliminated"] > 0
+        assert stats["nodes"] == len(ad.find_topo_sort(nodes)) == stats["cse_nodes"] + stats["cse_eliminated"]
+        assert len(ad.find_topo_sort(merged)) == stats["cse_nodes"]
+        # The original graph is left unchanged
+        assert all(all(a is b for a, b in zip(node.inputs, inputs[id(node)])) for node in ad.find_topo_sort(nodes))
+
+        expected = ad.Executor(nodes).run(feed_dict)
+        for value, exact in zip(ad.Executor(merged).run(feed_dict), expected):
+            assert np.array_equal(value, exact)
+        # Simplification may change the last bits
+        executor = ad.Executor(nodes, optimize=True)
+        for value, exact in zip(executor.run(feed_dict), expected):
+            assert np.allclose(value, exact, rtol=1e-14, atol=1e-14)
+        optimized = {}
+        ad.optimize_graph(nodes, optimized)
+        assert executor.stats == optimized and optimized["simplify_eliminated"] > 0
+
+    # x2 * x3 and x3 * x2 merge, constants that differ in sign or type do not
+    merged = ad.eliminate_common_subexpressions([x2 * x3, x3 * x2, x2 * 0.0, x2 * -0.0, x2 * 2, x2 * 2.0])
+    assert merged[0] is merged[1]
+    assert len({id(node) for node in merged[2:]}) == 4
+
+def test_simplify():
+    x2 = ad.Variable(name = "x2")
+    # A single variable, so that every node is known to have its shape
+    y = ad.sin_op(x2) / ad.cos_op(x2) + ad.exp_op(x2, 2.0)**2 * x2**1 + ((x2 * 2) * 3 + 1) + 2
+    grads = ad.gradients(y, [x2])
+    grads += ad.gradients(grads[0], [x2])
+    feed_dict = {x2: np.linspace(-1, 1, 4)}
+    expected = ad.Executor([y] + grads).run(feed_dict)
+
+    stats = {}
+    simplified = ad.simplify_graph([y] + grads, stats)
+    topo_order = ad.find_topo_sort(simplified)
+    assert stats["nodes"] == stats["simplify_nodes"] + stats["simplify_eliminated"] == len(ad.find_topo_sort([y] + grads))
+    assert len(topo_order) == stats["simplify_nodes"] and stats["simplify_eliminated"] > 0
+    # No identities, reciprocal powers or constant chains are left
+    assert not any(isinstance(node.op, ad.PowerOp) and node.const_attr in (0, 1) for node in topo_order)
+    assert not any(isinstance(node.op, ad.MulOp) and any(isinstance(i.op, ad.PowerOp) and i.const_attr == -1
+                                                         for i in node.inputs) for node in topo_order)
+    assert not any(isinstance(node.op, (ad.MulByConstOp, ad.AddByConstOp)) and type(node.op) is type(node.inputs[0].op)
+                   for node in topo_order)
+    assert not any(isinstance(node.op, ad.MulOp) and any(isinstance(i.op, ad.OnesLikeOp) for i in node.inputs)
+                   for node in topo_order)
+    assert any(isinstance(node.op, ad.DivOp) for node in topo_order)
+    for value, exact in zip(ad.Executor(simplified).run(feed_dict), expected):
+        assert value.shape == exact.shape
+        assert np.allclose(value, exact, rtol=1e-14, atol=1e-14)
+
+    # Ones and zeros that broadcast, or are not floating point, are kept
+    x4 = ad.Variable(name = "x4")
+    z = x4 * ad.oneslike_op(x2) + ad.zeroslike_op(x2)
+    value, = ad.Executor(ad.simplify_graph([z])).run({x2: np.zeros(3), x4: np.ones((2, 1))})
+    assert value.shape == (2, 3)
+    z = ad.oneslike_op(ad.eq_op(x2, x4)) * x2
+    assert len(ad.find_topo_sort(ad.simplify_graph([z]))) == len(ad.find_topo_sort([z]))
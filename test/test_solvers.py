@@ -0,0 +1,39 @@
+import GuruDiff.forward as forward
+from GuruDiff.solvers import solve
+import numpy as np
+import pytest
+
+def circle(x):
+    return [x[0]**2 + x[1]**2 - 4, x[0] - x[1]]
+
+def bratu(u):
+    n = u._val.size
+    L = (np.diag(-2*np.ones(n)) + np.diag(np.ones(n - 1), 1) + np.diag(np.ones(n - 1), -1))*(n + 1)**2
+    return np.dot(L, u) + 2*forward.exp(u)
+
+def test_solve():
+    solution = solve(circle, [1.0, 2.0])
+    assert solution.converged and np.allclose(solution.x, np.sqrt(2)), "error with solve"
+    assert solution.jevals == 1 and solution.fevals == solution.iterations
+
+    # Broyden updates save Jacobian evaluations over Newton's method
+    broyden = solve(bratu, np.zeros(50))
+    newton = solve(bratu, np.zeros(50), broyden=False)
+    assert broyden.converged and newton.converged
+    assert np.allclose(broyden.x, newton.x) and np.max(np.abs(broyden.residual)) <= 1e-10
+    assert broyden.jevals < newton.jevals == newton.iterations
+
+    # A stalled Broyden step triggers a Jacobian evaluation
+    calls = []
+    def jac(x):
+        calls.append(x)
+        return forward.jacobian(circle, x)
+    solution = solve(circle, [1.0, 2.0], jac=jac, stall=1e-3)
+    assert solution.converged and solution.jevals == len(calls) > 1
+
+    with pytest.raises(ValueError):
+        solve(lambda x: [x[0] + x[1]], [1.0, 2.0])
+    with pytest.raises(ValueError):
+        solve(lambda x: [x[0] + x[1], x[0] + x[1]], [1.0, 2.0])
+    with pytest.raises(ValueError):
+        solve(circle, [1.0, 2.0], stall=0)
@@ -0,0 +1,89 @@
+import GuruDiff.forward as forward
+import GuruDiff.reverse as ad
+import GuruDiff.sparse as sparse
+import numpy as np
+
+def banded(x):
+    # Discrete Laplacian plus a nonlinear diagonal term: tridiagonal Jacobian
+    return [x[0]] + [x[i-1] - 2*x[i] + forward.sin(x[i+1]) + x[i]**2 for i in range(1, 19)] + [forward.exp(x[19])]
+
+def test_coo_matrix():
+    A = sparse.COOMatrix([0, 2, 0], [1, 0, 2], [1.0, 2.0, 3.0], (3, 3))
+    assert A.nnz == 3 and repr(A) == "COOMatrix(shape=(3, 3), nnz=3)"
+    assert np.array_equal(A.toarray(), [[0, 1, 3], [0, 0, 0], [2, 0, 0]])
+    data, indices, indptr = A.tocsr()
+    assert np.array_equal(data, [1, 3, 2]) and np.array_equal(indices, [1, 2, 0]) and np.array_equal(indptr, [0, 2, 2, 3])
+
+def test_jacobian_sparsity():
+    x = np.linspace(0, 1, 20)
+    pattern = sparse.jacobian_sparsity(banded, x)
+    assert pattern.shape == (20, 20)
+    expected = np.eye(20, dtype=bool) | np.eye(20, k=1, dtype=bool) | np.eye(20, k=-1, dtype=bool)
+    expected[0, 1] = expected[19, 18] = False
+    assert np.array_equal(pattern, expected)
+    # No accidental zeros: cos(pi/2) = 0 does not hide the dependency
+    pattern = sparse.jacobian_sparsity(lambda x: forward.sin(x[0]) * x[1], [np.pi/2, 0.0])
+    assert np.array_equal(pattern, [[True, True]])
+
+def test_array_function_sparsity():
+    # np.dot, np.stack and np.sum propagate dependencies instead of numbers
+    f = lambda x: [np.dot([1, -1], np.stack([x[0] + x[1], 2*x[0] + x[1]])), x[1],
+                   np.sum(np.stack([x[0], x[2]*x[0]])), np.mean(x[2]*np.array([1.0, 0.0]))]
+    x = [1.0, 2.0, 3.0]
+    _, expected = forward.jacobian(f, x)
+    pattern = sparse.jacobian_sparsity(f, x)
+    assert np.array_equal(pattern, [[True, True, False], [False, True, False], [True, False, True], [False, False, True]])
+    assert not np.any(expected[~pattern])
+    val, jac = sparse.sparse_jacobian(f, x)
+    assert np.allclose(jac.toarray(), expected)
+
+def test_color_columns():
+    pattern = np.eye(6, dtype=bool) | np.eye(6, k=1, dtype=bool) | np.eye(6, k=-1, dtype=bool)
+    colors = sparse.color_columns(pattern)
+    assert colors.max() + 1 == 3
+    for row in pattern:
+        assert np.unique(colors[row]).size == row.sum()
+    assert np.array_equal(sparse.color_columns(np.eye(4, dtype=bool)), np.zeros(4))
+    assert np.array_equal(sparse.color_rows(np.ones((3, 1), dtype=bool)), [0, 1, 2])
+
+def test_sparse_jacobian():
+    x = np.linspace(0, 1, 20)
+    val, jac = sparse.sparse_jacobian(banded, x)
+    expected_val, expected_jac = forward.jacobian(banded, x)
+    assert isinstance(jac, sparse.COOMatrix) and jac.nnz == 56
+    assert np.allclose(val, expected_val) and np.allclose(jac.toarray(), expected_jac)
+
+def test_sparse_jacobian_reverse(monkeypatch):
+    n = 30
+    A = 2*np.eye(n) - np.eye(n, k=1) - np.eye(n, k=-1)
+    x = ad.Variable(name="x")
+    a = ad.Variable(name="A")
+    y = ad.sin_op(ad.matmul_op(a, x)) * x
+    x_val = np.linspace(0, 1, n).reshape(n, 1)
+    feed_dict = {x: x_val, a: A}
+
+    pattern = sparse.graph_sparsity(y, x, feed_dict)
+    assert np.array_equal(pattern, A != 0)
+    assert sparse.color_rows(pattern).max() + 1 == 3
+
+    val, jac = sparse.sparse_jacobian_reverse(y, x, feed_dict)
+    Ax = A @ x_val
+    expected = np.diag(np.ravel(np.cos(Ax) * x_val)) @ A + np.diag(np.ravel(np.sin(Ax)))
+    assert np.allclose(val, np.sin(Ax) * x_val)
+    assert np.allclose(jac.toarray(), expected)
+
+    # One evaluation to detect the pattern, then one sweep per color
+    runs = []
+    run = ad.Executor.run
+    monkeypatch.setattr(ad.Executor, "run", lambda self, *args, **kwargs: runs.append(self) or run(self, *args, **kwargs))
+    val, jac = sparse.sparse_jacobian_reverse(y, x, feed_dict)
+    assert len(runs) == 1 + 3 and np.allclose(val, np.sin(Ax) * x_val)
+    val, jac = sparse.sparse_jacobian_reverse(y, x, feed_dict, pattern)
+    assert np.allclose(val, np.sin(Ax) * x_val) and np.allclose(jac.toarray(), expected)
+
+def test_tangent_jacobian():
+    x = np.linspace(0, 1, 20)
+    val, J = sparse.tangent_jacobian(banded, x)
+    dense_val, dense_J = forward.jacobian(banded, x)
+    assert np.allclose(val, dense_val) and np.allclose(J.toarray(), dense_J)
+    assert J.nnz == np.count_nonzero(sparse.jacobian_sparsity(banded, x))
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import GuruDiff.forward as forward
+from GuruDiff.precision import precision
+from GuruDiff.sweep import sweep
+
+
+def model(x):
+    return [x[0]*forward.sin(x[1]), forward.exp(x[0] - x[1])]
+
+
+def test_sweep():
+    X = np.random.RandomState(0).rand(50, 2)
+    vals, jacs = forward.batch_jacobian(model, X)
+
+    # In this process
+    v, J = sweep(model, X, workers=1, chunk_size=7)
+    assert np.array_equal(v, vals) and np.array_equal(J, jacs)
+
+    # In worker processes, with the results in shared memory
+    done = []
+    def callback(start, stop, v, J):
+        assert np.array_equal(v, vals[start:stop]) and np.array_equal(J, jacs[start:stop])
+        done.append((start, stop))
+    v, J = sweep(model, X, workers=2, chunk_size=16, callback=callback)
+    assert np.array_equal(v, vals) and np.array_equal(J, jacs)
+    assert sorted(done) == [(0, 16), (16, 32), (32, 48), (48, 50)]
+
+    # The precision policy is sent to the workers
+    with precision(np.float32):
+        v, J = sweep(model, X, workers=2)
+    assert v.dtype == np.float32 and J.dtype == np.float32
+    assert np.allclose(J, jacs, rtol=1e-5)
+
+    with pytest.raises(ValueError):
+        sweep(model, X, workers=0)
+    with pytest.raises(ValueError):
+        sweep(model, X, chunk_size=0)
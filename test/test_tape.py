@@ -0,0 +1,54 @@
+import GuruDiff.forward as forward
+import GuruDiff.precision as precision
+import GuruDiff.tape as tape
+import numpy as np
+import pytest
+
+def f(x):
+    return [x[0]*forward.sin(x[1]) + forward.log(x[2]), forward.exp(-x[0]*x[2])/(1 + x[1]**2),
+            forward.logistic(x[1]) - forward.sqrt(x[2]), 3.0]
+
+def g(x):
+    A = np.arange(9.0).reshape(3, 3)
+    return forward.tanh(x/3)*x[0] + np.dot(A, x)**2 - 1/x + forward.arcsin(x/4)
+
+def test_replay():
+    x = np.array([0.5, 1.2, 2.0])
+    t = tape.record(f, x)
+    for point in [x, [0.1, 0.3, 0.7], [1.0, np.pi/2, 1.0]]:
+        val, jac = t(point)
+        expected_val, expected_jac = forward.jacobian(f, point)
+        assert np.array_equal(val, expected_val) and np.array_equal(jac, expected_jac), "error with tape"
+    v = np.array([[1.0, 0.0], [0.5, -1.0], [0.0, 2.0]])
+    t = tape.record(g, x, v)
+    for point in [x, [0.2, -0.4, 0.9]]:
+        val, jv = t(point, v[::-1])
+        expected_val, expected_jv = forward.jvp(g, point, v[::-1])
+        assert np.array_equal(val, expected_val) and np.array_equal(jv, expected_jv), "error with tape"
+    assert t.fallbacks == 0 and len(t) > 0
+    with pytest.raises(ValueError):
+        t([1.0, 2.0], v)
+
+def test_guards():
+    x = np.array([0.5, 1.2, 2.0])
+    t = tape.record(f, x)
+    val, jac = t([0.5, 1.2, 3.0])
+    assert t.fallbacks == 0
+    # Leaves the domain of sqrt: the domain check is replayed, so f is 
+    # evaluated again and raises the same error
+    with pytest.raises(ValueError):
+        t([0.5, 1.2, 0.0])
+    assert t.fallbacks == 1
+    h = lambda x: forward.sin(x) if x[0].val > 0 else forward.cos(x)
+    t = tape.record(h, x)
+    assert np.array_equal(t(-x)[1], forward.jacobian(h, -x)[1]) and t.fallbacks == 1, "error with guards"
+    with forward.rounding("off"):
+        assert np.array_equal(t(x)[0], np.sin(x)) and t.fallbacks == 2, "error with guards"
+    # Precision: a tape recorded in double precision is not replayed in single
+    with precision.precision("float32"):
+        val, jac = t(x)
+    assert val.dtype == jac.dtype == np.float32 and t.fallbacks == 3, "error with guards"
+    assert t(x)[0].dtype == np.float64 and t.fallbacks == 3, "error with guards"
+    # Powers with a variable exponent cannot be recorded
+    with pytest.raises(TypeError):
+        tape.record(lambda x: x[0]**x[1], x)
@@ -0,0 +1,90 @@
+import GuruDiff.forward as forward
+import GuruDiff.taylor as taylor
+import numpy as np
+import pytest
+from math import factorial
+
+ORDER = 8
+
+def series(x0):
+    return taylor.Taylor(x0, 1., ORDER)
+
+def identity(x0):
+    coef = np.zeros(ORDER + 1)
+    coef[0], coef[1] = x0, 1.
+    return coef
+
+def test_taylor():
+    x = series(0.3)
+    assert x.order == ORDER and x.val == 0.3
+    assert np.allclose(x.coef, identity(0.3))
+    assert np.allclose((x*x).coef[:3], [0.09, 0.6, 1.])
+    assert np.allclose((1/(1 - x)).coef, 1/0.7**np.arange(1, ORDER + 2))
+    assert np.allclose((2 - x + 1).coef, -identity(-2.7))
+    assert np.allclose((x**3).coef[:5], [0.027, 0.27, 0.9, 1., 0.])
+    assert np.allclose((x**2.5).coef, taylor.exp(2.5*taylor.log(x)).coef)
+    assert np.allclose((x**x).coef, taylor.exp(x*taylor.log(x)).coef)
+    assert np.allclose((x/x).coef, [1.] + [0.]*ORDER)
+    # Array numerators broadcast against the values, not the orders
+    for size in [ORDER + 1, 4]:
+        c = np.arange(1., size + 1)
+        assert np.allclose((c/x).coef, (1/x).coef[:, None]*c)
+    assert np.allclose((c/taylor.Taylor(np.full(4, 0.3), 1., ORDER)).coef, (1/x).coef[:, None]*c)
+    with pytest.raises(ValueError):
+        taylor.Taylor(0., 1., ORDER)**0.5
+
+def test_elementary_derivatives():
+    x0 = 0.4
+    ks = np.arange(ORDER + 1)
+    assert np.allclose(taylor.exp(series(x0)).derivatives(), np.exp(x0))
+    assert np.allclose(taylor.sin(series(x0)).derivatives(), np.sin(x0 + ks*np.pi/2))
+    assert np.allclose(taylor.cos(series(x0)).derivatives(), np.cos(x0 + ks*np.pi/2))
+    assert np.allclose(taylor.sinh(series(x0)).derivatives(), np.where(ks % 2, np.cosh(x0), np.sinh(x0)))
+    # log(x): (-1)^(k-1) (k-1)! / x^k
+    expected = [np.log(x0)] + [(-1)**(k-1)*factorial(k-1)/x0**k for k in ks[1:]]
+    assert np.allclose(taylor.log(series(x0)).derivatives(), expected)
+    assert np.allclose(taylor.exp(series(x0), 2).coef, (np.log(2)**ks)*2**x0/[factorial(k) for k in ks])
+    assert np.allclose(taylor.log(series(x0), 10).coef, taylor.log(series(x0)).coef/np.log(10))
+
+def test_identities():
+    x = series(0.4)
+    one = np.eye(1, ORDER + 1)[0]
+    assert np.allclose((taylor.sin(x)*taylor.sin(x) + taylor.cos(x)*taylor.cos(x)).coef, one)
+    assert np.allclose(taylor.tan(x).coef, (taylor.sin(x)/taylor.cos(x)).coef)
+    assert np.allclose(taylor.tanh(x).coef, (taylor.sinh(x)/taylor.cosh(x)).coef)
+    assert np.allclose(taylor.logistic(x).coef, (1/(1 + taylor.exp(-x))).coef)
+    assert np.allclose((taylor.sqrt(x)*taylor.sqrt(x)).coef, x.coef)
+    assert np.allclose(taylor.exp(taylor.log(x)).coef, x.coef)
+    assert np.allclose(taylor.arcsin(taylor.sin(x)).coef, x.coef)
+    assert np.allclose(taylor.arctan(taylor.tan(x)).coef, x.coef)
+    assert np.allclose((taylor.arccos(x) + taylor.arcsin(x)).coef, np.pi/2*one)
+    with pytest.raises(ValueError):
+        taylor.arcsin(series(1.))
+    with pytest.raises(ValueError):
+        taylor.log(series(0.))
+    with pytest.raises(ValueError):
+        taylor.sqrt(series(0.))
+    with pytest.raises(ValueError):
+        taylor.tan(series(np.pi/2))
+
+def test_directional_derivatives():
+    def f(x):
+        return [taylor.sin(x[0])*taylor.exp(x[1]), x[0]*x[1]**2]
+    def g(x):
+        return taylor.sin(x[0])*taylor.exp(x[1]) + x[0]*x[1]**2
+    x, v = np.array([0.2, 0.5]), np.array([1., -2.])
+
+    derivs = taylor.directional_derivatives(g, x, v, 4)
+    hess = np.array([[-np.sin(0.2)*np.exp(0.5), np.cos(0.2)*np.exp(0.5) + 1.],
+                     [np.cos(0.2)*np.exp(0.5) + 1., np.sin(0.2)*np.exp(0.5) + 0.4]])
+    val, grad = forward.jvp(lambda x: forward.sin(x[0])*forward.exp(x[1]) + x[0]*x[1]**2, x, v)
+    assert np.isclose(derivs[0], val) and np.isclose(derivs[1], grad)
+    assert np.isclose(derivs[2], v @ hess @ v)
+    # Along this line, g(x + t v) = sin(0.2 + t) exp(0.5 - 2t) + (0.2 + t)(0.5 - 2t)^2
+    t = taylor.Taylor(0., 1., 4)
+    line = taylor.sin(0.2 + t)*taylor.exp(0.5 - 2*t) + (0.2 + t)*(0.5 - 2*t)**2
+    assert np.allclose(derivs, line.derivatives())
+
+    coef = taylor.taylor_coefficients(lambda x: taylor.sin(x)*x, np.array([0.1, 0.7]), np.ones(2), 3)
+    assert coef.shape == (4, 2)
+    assert np.allclose(coef[:, 1], (taylor.sin(series(0.7))*series(0.7)).coef[:4])
@@ -0,0 +1,67 @@
+import GuruDiff.forward as forward
+import GuruDiff.reverse as ad
+import GuruDiff.taylor as taylor
+import GuruDiff.validation as validation
+import numpy as np
+import pytest
+
+def test_set_validation():
+    assert validation.get_validation() == "raise"
+    previous = validation.set_validation("off")
+    assert previous == "raise" and validation.get_validation() == "off"
+    validation.set_validation(previous)
+    with pytest.raises(ValueError):
+        validation.set_validation("ignore")
+    with validation.validation("nan"):
+        assert validation.get_validation() == "nan"
+    assert validation.get_validation() == "raise"
+
+def test_forward_validation():
+    x = forward.Var(np.array([-2.0, 0.5, 4.0]), np.ones(3))
+    with pytest.raises(ValueError):
+        forward.sqrt(x)
+    with validation.validation("nan"):
+        y = forward.sqrt(x)
+        z = forward.arcsin(forward.HyperDual([0.5, 2.0]))
+    assert np.isnan(y.val[0]) and np.isnan(y.der[0]), "error with nan validation"
+    assert np.allclose(y.val[1:], [np.sqrt(0.5), 2.0]) and np.allclose(y.der[1:], [0.5/np.sqrt(0.5), 0.25]), "error with nan validation"
+    assert not np.isnan(z.hes[0, 0, 0]) and np.isnan(z.hes[0, 0, 1]), "error with nan validation"
+    with validation.validation("off"), np.errstate(divide="ignore", invalid="ignore"):
+        y = forward.log(forward.Var(0.0))
+    assert y.val == -np.inf, "error with off validation"
+
+def test_taylor_validation():
+    x = taylor.Taylor(np.array([2.0, 0.5]), 1.0, 3)
+    with pytest.raises(ValueError):
+        taylor.arccos(x)
+    with validation.validation("nan"):
+        y = taylor.arccos(x)
+    assert np.isnan(y.coef[:, 0]).all() and np.allclose(y.coef[:, 1], taylor.arccos(x[1]).coef), "error with nan validation"
+
+def test_taylor_matches_forward():
+    # Both engines reject zero and negative logarithm arguments
+    for value, message in [([0.0, 2.0], "Cannot divide by zero"), ([-1.0, 2.0], "Cannot take the logarithm of a negative value")]:
+        for engine, make in [(forward, forward.Var), (taylor, lambda v: taylor.Taylor(v, 1.0, 2))]:
+            with pytest.raises(ValueError) as e:
+                engine.log(make(np.array(value)))
+            assert str(e.value) == message
+            with validation.validation("nan"):
+                y = engine.log(make(np.array(value)))
+            assert np.isnan(y.val[0]) and y.val[1] == np.log(2.0), "error with nan validation"
+    # Taylor mode arctan accepts any real, as in reverse mode
+    x = np.array([-3.0, 0.5, 3.0])
+    y = taylor.arctan(taylor.Taylor(x, 1.0, 2))
+    assert np.allclose(y.coef[:2], [np.arctan(x), 1/(1 + x**2)]), "error with Taylor arctan"
+
+def test_reverse_validation():
+    x = ad.Variable(name="x")
+    y = ad.arcsin_op(x)
+    grad_x, = ad.gradients(y, [x])
+    executor = ad.Executor([y, grad_x])
+    x_val = np.array([0.5, 1.5])
+    with pytest.raises(ValueError):
+        executor.run(feed_dict={x: x_val})
+    with validation.validation("nan"), np.errstate(invalid="ignore"):
+        y_val, grad_x_val = executor.run(feed_dict={x: x_val})
+    assert y_val[0] == np.arcsin(0.5) and np.isnan(y_val[1])
+    assert np.isclose(grad_x_val[0], 1/np.sqrt(0.75))